@@ -1,12 +1,26 @@
 import os
 import shutil
+import signal
 import sqlite3
-from typing import List, Tuple
+import sys
+import threading
+import time
+from typing import Iterable, List, Optional, TextIO, Tuple
 
+from app.metrics.metrics import Metrics
+from app.processor.async_pipeline import AsyncPipeline
+from app.processor.parallel_processor import ParallelTextProcessor
 from app.processor.text_processor import TextProcessor
+from app.reporting.reporter import Report, Reporter, ShardedReporter, write_report
+from app.search.searcher import SearchCursor, Searcher
 from app.storage.database_client import DatabaseClient
-from app.storage.text_processor_dao import TextProcessorDAO
-from app.utils.constants import OUTPUT_FOLDER, INPUT_FOLDER
+from app.storage.sharded_dao import ShardedTextProcessorDAO
+from app.storage.text_processor_dao import TextProcessorDAO, TextProcessorDAOInterface
+from app.utils.constants import (COMMON_WORDS, COMPRESS_TEXTS, CSV_EXTENSIONS, DATABASE_PROFILE, HEAVY_HITTERS,
+                                 NGRAM_SIZES, NGRAMS, OUTPUT_FOLDER, INPUT_FOLDER, RAW_COUNTS, REBUILD_CHUNK_SIZE,
+                                 REPORT_LIMIT, SEARCH_LIMIT, SHARDS, WORKERS)
+from app.watcher.file_claimer import FileClaimer
+from app.watcher.folder_watcher import FolderWatcher
 
 
 class App:
@@ -14,31 +28,210 @@ class App:
     Main application class for orchestrating CSV processing and database operations.
     """
 
+    def __init__(self, workers: int = WORKERS, metrics: Optional[Metrics] = None,
+                 db_profile: str = DATABASE_PROFILE, async_pipeline: bool = False,
+                 compress_texts: bool = COMPRESS_TEXTS, heavy_hitters: bool = HEAVY_HITTERS,
+                 raw_counts: bool = RAW_COUNTS, ngrams: bool = NGRAMS, shards: int = SHARDS,
+                 worker_id: Optional[str] = None):
+        """
+        Initialize the application.
+
+        Args:
+            workers (int): Number of worker processes used to tokenize entries.
+                A single worker processes the files sequentially in the main process.
+            metrics (Metrics, optional): Metrics of the pipeline, also exported after every file
+                in watch mode. Defaults to disabled metrics.
+            db_profile (str): SQLite connection profile: 'bulk-load', 'durable' or 'read-mostly'.
+            async_pipeline (bool): Overlap reading, tokenizing on `workers` processes and writing
+                in an asyncio pipeline.
+            compress_texts (bool): Store new texts zlib-compressed.
+            heavy_hitters (bool): Also count the words in the fixed-size heavy-hitters sketches.
+            raw_counts (bool): Count every word, stopwords included. Stopwords are then only
+                excluded at query time, so changing them does not require reprocessing.
+            ngrams (bool): Also count the n-grams of NGRAM_SIZES words, pruning the rare ones.
+            shards (int): Number of database files the entries are spread over, each written by
+                its own thread. Every command must then be run with the same number of shards.
+            worker_id (str, optional): Id under which this instance claims the files of the input
+                folder it shares with other instances. Defaults to the host name and process id.
+        """
+        self.workers = workers
+        self.metrics = metrics or Metrics()
+        self.db_profile = db_profile
+        self.async_pipeline = async_pipeline
+        self.compress_texts = compress_texts
+        self.heavy_hitters = heavy_hitters
+        self.raw_counts = raw_counts
+        self.ngrams = ngrams
+        self.shards = shards
+        self.worker_id = worker_id
+
     def start(self) -> None:
         """
         Main function to orchestrate the CSV processing and database operations.
         This function handles the entire process flow, including database setup,
-        file processing, and result display.
+        file processing, and a summary of the database contents.
+
+        Files are claimed one at a time, so several instances can share the input folder.
         """
-        conn = None
+        dao, connections = None, []
         try:
             # Create the database and establish a connection
-            db = DatabaseClient()
-            conn = db.create_database()
-            dao = TextProcessorDAO(conn)
-            text_processor = TextProcessor()
+            # The asyncio pipeline writes from a dedicated thread
+            dao, connections = self._open_database(check_same_thread=not self.async_pipeline)
+            text_processor = self._create_text_processor(dao)
 
             self._setup_output_folder()
-            self._process_csv_files(text_processor, dao)
-            self._display_database_contents(conn)
+            with FileClaimer(INPUT_FOLDER, self.worker_id, metrics=self.metrics) as claimer:
+                claimer.reclaim_expired()
+                self._process_csv_files(text_processor, dao, claimer)
+            self._display_summary(dao)
 
         except Exception as e:
             print(f"An error occurred during processing: {e}")
         finally:
-            if 'conn' in locals():
-                conn.close()
+            self._close_database(dao, connections)
             print("Processing complete.")
 
+    def watch(self) -> None:
+        """
+        Keep processing the CSV files of the input folder as soon as they are completely written,
+        until SIGTERM or SIGINT is received.
+
+        A single database connection is kept open for the whole run. Files are processed one at
+        a time, so files arriving faster than they can be ingested wait in the folder, where
+        other instances may claim them. On SIGTERM the file being processed is finished and
+        committed before exiting.
+        """
+        stop = threading.Event()
+
+        def request_stop(signum, frame):
+            print(f"Received signal {signum}, finishing the current file before exiting.")
+            stop.set()
+
+        previous_handlers = {signum: signal.signal(signum, request_stop) for signum in (signal.SIGTERM, signal.SIGINT)}
+        dao, connections = None, []
+        try:
+            dao, connections = self._open_database()
+            text_processor = self._create_text_processor(dao)
+            self._setup_output_folder()
+
+            with FolderWatcher(INPUT_FOLDER, self._is_csv_file) as watcher, \
+                    FileClaimer(INPUT_FOLDER, self.worker_id, metrics=self.metrics) as claimer:
+                print(f"Watching {watcher.folder} ({'inotify' if watcher.uses_inotify else 'polling'}) "
+                      f"as {claimer.worker_id}")
+                for claimed_path in claimer.claimed_files():
+                    self._process_csv_file(text_processor, dao, claimed_path)
+                last_reclaim = float('-inf')
+                while not stop.is_set():
+                    # Reclaimed files are renamed back into the folder, where the watcher sees them
+                    if time.monotonic() - last_reclaim >= claimer.heartbeat_interval:
+                        claimer.reclaim_expired()
+                        last_reclaim = time.monotonic()
+                    for file_path in watcher.wait_ready():
+                        if stop.is_set():
+                            break
+                        claimed_path = claimer.claim(file_path)
+                        if claimed_path:
+                            self._process_csv_file(text_processor, dao, claimed_path)
+                            self.metrics.export()
+                        watcher.mark_done(file_path)
+
+        except Exception as e:
+            print(f"An error occurred during processing: {e}")
+        finally:
+            for signum, handler in previous_handlers.items():
+                signal.signal(signum, handler)
+            self._close_database(dao, connections)
+            print("Processing complete.")
+
+    def set_stopwords(self, file_path: str, chunk_size: int = REBUILD_CHUNK_SIZE) -> None:
+        """
+        Make the words of a file, one per line, the active stopwords and rebuild the aggregates
+        depending on them.
+
+        Args:
+            file_path (str): Path of the stopwords file.
+            chunk_size (int): Number of entries rebuilt per transaction.
+        """
+        dao, connections = None, []
+        try:
+            with open(file_path, 'r', encoding='utf-8') as file:
+                words = [line.strip() for line in file if line.strip()]
+            dao, connections = self._open_database()
+            version = dao.add_stopwords_version(words)
+            print(f"Stopwords version {version}: {len(set(word.lower() for word in words))} words")
+            rebuilt = dao.rebuild_filtered_aggregates(chunk_size)
+            print(f"Rebuilt the word counts of {rebuilt} entries")
+        except (OSError, sqlite3.Error) as e:
+            print(f"An error occurred while updating the stopwords: {e}")
+        finally:
+            self._close_database(dao, connections)
+
+    def rebuild_aggregates(self, chunk_size: int = REBUILD_CHUNK_SIZE) -> None:
+        """
+        Rebuild the aggregates computed with an older stopwords version, for instance after an
+        interrupted stopwords update.
+
+        Args:
+            chunk_size (int): Number of entries rebuilt per transaction.
+        """
+        dao, connections = None, []
+        try:
+            dao, connections = self._open_database()
+            rebuilt = dao.rebuild_filtered_aggregates(chunk_size)
+            print(f"Rebuilt the word counts of {rebuilt} entries")
+        except sqlite3.Error as e:
+            print(f"An error occurred while rebuilding the aggregates: {e}")
+        finally:
+            self._close_database(dao, connections)
+
+    def _open_database(self, check_same_thread: bool = True) -> Tuple[TextProcessorDAOInterface,
+                                                                         List[sqlite3.Connection]]:
+        """
+        Create or migrate the database, or its shards, and connect a DAO to it.
+
+        Args:
+            check_same_thread (bool): Whether the connection may only be used by its thread.
+                Shards are always written from their own threads.
+
+        Returns:
+            Tuple[TextProcessorDAOInterface, List[sqlite3.Connection]]: The DAO and its connections.
+        """
+        if self.shards == 1:
+            conn = DatabaseClient(profile=self.db_profile, check_same_thread=check_same_thread).create_database()
+            return TextProcessorDAO(conn, self.metrics, self.compress_texts, self.heavy_hitters), [conn]
+        connections = DatabaseClient(profile=self.db_profile, check_same_thread=False).create_shards(self.shards)
+        return ShardedTextProcessorDAO(connections, self.metrics, self.compress_texts, self.heavy_hitters), connections
+
+    @staticmethod
+    def _close_database(dao: Optional[TextProcessorDAOInterface], connections: List[sqlite3.Connection]) -> None:
+        """
+        Stop the writer threads of a sharded DAO, if any, and close the connections.
+        """
+        if isinstance(dao, ShardedTextProcessorDAO):
+            dao.close()
+        for conn in connections:
+            conn.close()
+
+    def _create_text_processor(self, dao: TextProcessorDAOInterface) -> TextProcessor:
+        """
+        Create the text processor, which keeps the stopwords unless raw counts are stored.
+
+        With raw counts, n-grams are still split on the active stopwords of the database: storing
+        the ones spanning a stopword would only fill the n-gram tables with rows no query returns.
+
+        Args:
+            dao (TextProcessorDAOInterface): Data Access Object of the database being written.
+
+        Returns:
+            TextProcessor: Text processor reporting to the application metrics.
+        """
+        ngram_sizes = NGRAM_SIZES if self.ngrams else ()
+        if self.raw_counts:
+            return TextProcessor(metrics=self.metrics, stopwords=(), ngram_sizes=ngram_sizes,
+                                 ngram_stopwords=dao.get_stopwords().words)
+        return TextProcessor(metrics=self.metrics, stopwords=COMMON_WORDS, ngram_sizes=ngram_sizes)
+
     def _setup_output_folder(self) -> None:
         """
         Create the output folder if it doesn't exist.
@@ -50,68 +243,189 @@ class App:
             print(f"Error creating output folder: {e}")
             raise
 
-    def _process_csv_files(self, text_processor: TextProcessor, dao: TextProcessorDAO) -> None:
+    def _process_csv_files(self, text_processor: TextProcessor, dao: TextProcessorDAO, claimer: FileClaimer) -> None:
         """
         Process each CSV file in the input folder and move processed files to the output folder.
 
+        Files are claimed lazily, as the pipeline reaches them, and moved once committed.
+
         Args:
             text_processor (TextProcessor): Instance of TextProcessor for processing CSV files.
             dao (TextProcessorDAO): Data Access Object for database operations.
+            claimer (FileClaimer): Claimer of the files of the input folder.
         """
-        for filename in os.listdir(os.path.abspath(INPUT_FOLDER)):
-            if filename.endswith('.csv'):
-                file_path = os.path.join(os.path.abspath(INPUT_FOLDER), filename)
-                try:
-                    text_processor.process_csv_file(file_path, dao)
-                    # Move processed file to the output folder
-                    shutil.move(file_path, os.path.join(os.path.abspath(OUTPUT_FOLDER), filename))
-                except Exception as e:
-                    print(f"Error processing file {filename}: {e}")
+        file_paths = claimer.claim_files(self._list_csv_files())
+        if self.async_pipeline:
+            AsyncPipeline(text_processor, self.workers).process_csv_files(
+                file_paths, dao, self._move_to_output_folder)
+            return
+        if self.workers > 1:
+            self._process_csv_files_parallel(text_processor, dao, file_paths)
+            return
+
+        for file_path in file_paths:
+            self._process_csv_file(text_processor, dao, file_path)
 
-    def _display_database_contents(self, conn: sqlite3.Connection) -> None:
+    def _process_csv_file(self, text_processor: TextProcessor, dao: TextProcessorDAO, file_path: str) -> None:
         """
-        Display the contents of all tables in the database.
+        Process a CSV file and move it to the output folder.
 
         Args:
-            conn (sqlite3.Connection): Database connection object.
+            text_processor (TextProcessor): Instance of TextProcessor for processing CSV files.
+            dao (TextProcessorDAO): Data Access Object for database operations.
+            file_path (str): Path of the CSV file.
         """
         try:
-            cursor = conn.cursor()
-            tables = self._get_table_names(cursor)
+            text_processor.process_csv_file(file_path, dao)
+            self._move_to_output_folder(file_path)
+        except Exception as e:
+            print(f"Error processing file {os.path.basename(file_path)}: {e}")
 
-            for table_name in tables:
-                print(f"Items in table '{table_name}':")
-                rows = self._get_table_contents(cursor, table_name)
-                for row in rows:
-                    print(row)
-                print()  # Empty line for separation between tables
+    def _process_csv_files_parallel(self, text_processor: TextProcessor, dao: TextProcessorDAO,
+                                    file_paths: Iterable[str]) -> None:
+        """
+        Process CSV files on a pool of worker processes.
 
-        except sqlite3.Error as e:
-            print(f"SQLite error: {e}")
+        Each file is moved to the output folder as soon as all of its entries are committed.
 
-    def _get_table_names(self, cursor: sqlite3.Cursor) -> List[str]:
+        Args:
+            text_processor (TextProcessor): Instance of TextProcessor for reading CSV files.
+            dao (TextProcessorDAO): Data Access Object for database operations.
+            file_paths (Iterable[str]): Paths of the CSV files.
         """
-        Get names of all tables in the database.
+        parallel_processor = ParallelTextProcessor(text_processor, self.workers)
+        for file_path in parallel_processor.process_csv_files(file_paths, dao):
+            try:
+                self._move_to_output_folder(file_path)
+            except Exception as e:
+                print(f"Error processing file {os.path.basename(file_path)}: {e}")
 
-        Args:
-            cursor (sqlite3.Cursor): Database cursor object.
+    def _list_csv_files(self) -> List[str]:
+        """
+        List the CSV files waiting in the input folder.
 
         Returns:
-            List[str]: List of table names.
+            List[str]: Absolute paths of the CSV files.
         """
-        cursor.execute("SELECT name FROM sqlite_master WHERE type='table';")
-        return [table[0] for table in cursor.fetchall()]
+        input_folder = os.path.abspath(INPUT_FOLDER)
+        return [os.path.join(input_folder, filename) for filename in sorted(os.listdir(input_folder))
+                if self._is_csv_file(filename)]
 
-    def _get_table_contents(self, cursor: sqlite3.Cursor, table_name: str) -> List[Tuple]:
+    @staticmethod
+    def _is_csv_file(filename: str) -> bool:
         """
-        Get all rows from a specified table.
+        Whether a file of the input folder should be processed.
 
         Args:
-            cursor (sqlite3.Cursor): Database cursor object.
-            table_name (str): Name of the table to query.
+            filename (str): Name of the file.
 
         Returns:
-            List[Tuple]: List of rows in the table.
+            bool: True for CSV files, compressed or not.
+        """
+        return filename.lower().endswith(CSV_EXTENSIONS)
+
+    def _move_to_output_folder(self, file_path: str) -> None:
         """
-        cursor.execute(f"SELECT * FROM {table_name};")
-        return cursor.fetchall()
+        Move a processed file to the output folder.
+
+        Args:
+            file_path (str): Path of the processed file.
+        """
+        shutil.move(file_path, os.path.join(os.path.abspath(OUTPUT_FOLDER), os.path.basename(file_path)))
+
+    def report(self, view: str, output_format: str = 'text', limit: int = REPORT_LIMIT,
+               table_name: Optional[str] = None, stream: TextIO = sys.stdout) -> None:
+        """
+        Stream a report of the database contents without ingesting any file.
+
+        Reports use a read-only connection, so they can run while files are being ingested. Sharded
+        databases only have the 'summary', 'top-words', 'top-ngrams' and 'heavy-hitters' views,
+        merged from every shard.
+
+        Args:
+            view (str): One of 'summary', 'top-words', 'top-ngrams', 'heavy-hitters', 'sources' or 'table'.
+            output_format (str): One of 'text', 'jsonl' or 'csv'.
+            limit (int): Maximum number of rows of the 'top-words', 'top-ngrams' and 'heavy-hitters' views.
+            table_name (str, optional): Table to be dumped by the 'table' view.
+            stream (TextIO): Destination of the report.
+        """
+        connections = []
+        dao = None
+        try:
+            if self.shards == 1:
+                connections = [DatabaseClient(profile=self.db_profile).connect_read_only()]
+                reporter = Reporter(connections[0])
+            else:
+                connections = DatabaseClient(profile=self.db_profile,
+                                             check_same_thread=False).connect_shards_read_only(self.shards)
+                dao = ShardedTextProcessorDAO(connections, self.metrics)
+                reporter = ShardedReporter(connections, dao)
+            if view == 'summary':
+                report = reporter.summary()
+            elif view == 'top-words':
+                report = reporter.top_words(limit)
+            elif view == 'top-ngrams':
+                report = reporter.top_ngrams(limit)
+            elif view == 'heavy-hitters':
+                report = reporter.heavy_hitters(limit)
+            elif view in ('sources', 'table') and isinstance(reporter, ShardedReporter):
+                raise ValueError(f"Report not available on sharded databases: {view}")
+            elif view == 'sources':
+                report = reporter.source_stats()
+            elif view == 'table':
+                report = reporter.table(table_name)
+            else:
+                raise ValueError(f"Unknown report: {view}")
+            write_report(report, output_format, stream)
+        except (sqlite3.Error, ValueError) as e:
+            print(f"An error occurred during reporting: {e}")
+        finally:
+            self._close_database(dao, connections)
+
+    def search(self, query: str, operator: str = 'and', limit: int = SEARCH_LIMIT, after: Optional[str] = None,
+               output_format: str = 'text', stream: TextIO = sys.stdout) -> None:
+        """
+        Print a page of the entries matching a search, best first, through a read-only connection.
+
+        The cursor of the next page, if any, is printed to stderr so the output stays parsable.
+        Sharded databases cannot be searched, as scores depend on corpus-wide document counts.
+
+        Args:
+            query (str): Words to search for.
+            operator (str): 'and' to require every word, 'or' to require any.
+            limit (int): Number of hits of the page.
+            after (str, optional): Encoded cursor of the previous page.
+            output_format (str): One of 'text', 'jsonl' or 'csv'.
+            stream (TextIO): Destination of the hits.
+        """
+        conn = None
+        try:
+            if self.shards != 1:
+                raise ValueError("Search is not available on sharded databases")
+            conn = DatabaseClient(profile=self.db_profile).connect_read_only()
+            page = Searcher(conn).search(query, operator, limit, SearchCursor.decode(after) if after else None)
+            write_report(Report(('entry_id', 'score'), iter(page.hits)), output_format, stream)
+            if page.next_cursor:
+                print(f"Next page: --after '{page.next_cursor.encode()}'", file=sys.stderr)
+        except (sqlite3.Error, ValueError) as e:
+            print(f"An error occurred during search: {e}")
+        finally:
+            if conn:
+                conn.close()
+
+    @staticmethod
+    def _display_summary(dao: TextProcessorDAOInterface) -> None:
+        """
+        Display the number of entries and ingested files of the database, summed over its shards.
+
+        Both are read from counts maintained on ingestion, so the summary costs the same whatever
+        the size of the database; the row count of every table is the 'summary' report.
+
+        Args:
+            dao (TextProcessorDAOInterface): Data Access Object of the database.
+        """
+        try:
+            print(f"Database: {dao.get_entry_count()} entries from {dao.count_completed_files()} files "
+                  "(--report summary for the row count of every table)")
+        except sqlite3.Error as e:
+            print(f"SQLite error: {e}")
@@ -0,0 +1,279 @@
+import cProfile
+import json
+import os
+import threading
+import time
+import tracemalloc
+from bisect import bisect_left
+from contextlib import contextmanager, nullcontext
+from typing import Any, ContextManager, Dict, Iterator, List, Optional, Sequence
+
+# Prefix of every exported Prometheus metric
+METRIC_PREFIX = 'word_frequency'
+
+# Upper bounds of the histogram buckets; values above the last bound only count in +Inf
+HISTOGRAM_BUCKETS: Dict[str, Sequence[float]] = {
+    'entry_chars': (64, 128, 256, 512, 1024, 2048, 4096, 16384, 65536),
+    'entry_words': (1, 5, 10, 25, 50, 100, 250, 500, 1000),
+}
+DEFAULT_BUCKETS = (0.001, 0.01, 0.1, 1, 10, 100, 1000)
+
+# Number of allocation sites reported by tracemalloc
+TRACEMALLOC_TOP = 10
+
+# Shared by every disabled timer, so timing a disabled stage allocates nothing
+_NULL_TIMER = nullcontext()
+
+
+class Histogram:
+    """
+        Distribution of observed values over fixed buckets, as exported by Prometheus.
+    """
+    def __init__(self, buckets: Sequence[float]):
+        self.buckets = tuple(sorted(buckets))
+        # One count per bucket, plus the +Inf bucket; counts are not cumulative
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative_counts(self) -> List[int]:
+        """
+            Returns:
+                List[int]: Number of values lower than or equal to each bound, +Inf last.
+        """
+        cumulative = []
+        total = 0
+        for count in self.counts:
+            total += count
+            cumulative.append(total)
+        return cumulative
+
+
+class _Timer:
+    """Context manager adding the time spent in its block to a stage of the metrics."""
+    __slots__ = ('metrics', 'stage', 'started')
+
+    def __init__(self, metrics: 'Metrics', stage: str):
+        self.metrics = metrics
+        self.stage = stage
+
+    def __enter__(self) -> '_Timer':
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.metrics.add_time(self.stage, time.perf_counter() - self.started)
+
+
+class Metrics:
+    """
+        Timers, counters, gauges and histograms of the ingest pipeline.
+
+        A disabled instance records nothing: its timers are a shared no-op context manager and
+        its other methods return right away, so instrumented code costs a method call per batch.
+        Per-entry observations should be guarded by `enabled`.
+    """
+    def __init__(self, enabled: bool = False, json_path: Optional[str] = None,
+                 textfile_path: Optional[str] = None):
+        """
+            Initialize the metrics.
+
+            Args:
+                enabled (bool): Whether anything is recorded.
+                json_path (str, optional): File the metrics are exported to as JSON, '-' for stdout.
+                textfile_path (str, optional): File the metrics are exported to in the Prometheus
+                    text format, e.g. for the node exporter textfile collector.
+        """
+        self.enabled = enabled
+        self.json_path = json_path
+        self.textfile_path = textfile_path
+        # Stage -> [calls, seconds, slowest call in seconds]
+        self.timers: Dict[str, List[float]] = {}
+        self.counters: Dict[str, int] = {}
+        self.gauges: Dict[str, float] = {}
+        self.histograms: Dict[str, Histogram] = {}
+        # Metrics are also recorded by other threads, e.g. the shard threads of sharded databases
+        # and the heartbeat thread of the file claimer
+        self._lock = threading.Lock()
+
+    def timer(self, stage: str) -> ContextManager:
+        """
+            Time a block of code.
+
+            Args:
+                stage (str): Name of the pipeline stage the time is added to.
+
+            Returns:
+                ContextManager: Context manager timing its block.
+        """
+        return _Timer(self, stage) if self.enabled else _NULL_TIMER
+
+    def add_time(self, stage: str, seconds: float) -> None:
+        """
+            Add the time of one call to a stage.
+
+            Args:
+                stage (str): Name of the pipeline stage.
+                seconds (float): Duration of the call.
+        """
+        if not self.enabled:
+            return
+        with self._lock:
+            timer = self.timers.get(stage)
+            if timer is None:
+                self.timers[stage] = [1, seconds, seconds]
+            else:
+                timer[0] += 1
+                timer[1] += seconds
+                timer[2] = max(timer[2], seconds)
+
+    def increment(self, counter: str, value: int = 1) -> None:
+        if self.enabled:
+            with self._lock:
+                self.counters[counter] = self.counters.get(counter, 0) + value
+
+    def set_gauge(self, gauge: str, value: float) -> None:
+        if self.enabled:
+            with self._lock:
+                self.gauges[gauge] = value
+
+    def observe(self, histogram: str, value: float) -> None:
+        """
+            Record a value in a histogram, created with the buckets of HISTOGRAM_BUCKETS.
+
+            Args:
+                histogram (str): Name of the histogram.
+                value (float): Observed value.
+        """
+        if not self.enabled:
+            return
+        with self._lock:
+            if histogram not in self.histograms:
+                self.histograms[histogram] = Histogram(HISTOGRAM_BUCKETS.get(histogram, DEFAULT_BUCKETS))
+            self.histograms[histogram].observe(value)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """
+            Get every metric recorded so far.
+
+            Returns:
+                Dict[str, Any]: JSON serializable timers, counters, gauges and histograms.
+        """
+        with self._lock:
+            return self._snapshot()
+
+    def _snapshot(self) -> Dict[str, Any]:
+        return {
+            'timers': {stage: {'calls': calls, 'seconds': round(seconds, 6), 'max_seconds': round(slowest, 6)}
+                       for stage, (calls, seconds, slowest) in sorted(self.timers.items())},
+            'counters': dict(sorted(self.counters.items())),
+            'gauges': dict(sorted(self.gauges.items())),
+            'histograms': {
+                name: {'buckets': dict(zip([*map(str, histogram.buckets), '+Inf'], histogram.cumulative_counts())),
+                       'sum': histogram.sum, 'count': histogram.count}
+                for name, histogram in sorted(self.histograms.items())},
+        }
+
+    def to_prometheus(self) -> str:
+        """
+            Render every metric in the Prometheus text exposition format.
+
+            Returns:
+                str: The metrics, one sample per line.
+        """
+        with self._lock:
+            return self._to_prometheus()
+
+    def _to_prometheus(self) -> str:
+        lines = []
+        if self.timers:
+            name = f'{METRIC_PREFIX}_stage_seconds_total'
+            lines += [f'# HELP {name} Time spent in each stage of the pipeline.', f'# TYPE {name} counter']
+            lines += [f'{name}{{stage="{stage}"}} {seconds!r}'
+                      for stage, (_, seconds, _) in sorted(self.timers.items())]
+            name = f'{METRIC_PREFIX}_stage_calls_total'
+            lines += [f'# HELP {name} Number of timed calls of each stage of the pipeline.', f'# TYPE {name} counter']
+            lines += [f'{name}{{stage="{stage}"}} {calls}' for stage, (calls, _, _) in sorted(self.timers.items())]
+        for counter, value in sorted(self.counters.items()):
+            lines += [f'# TYPE {METRIC_PREFIX}_{counter}_total counter', f'{METRIC_PREFIX}_{counter}_total {value}']
+        for gauge, value in sorted(self.gauges.items()):
+            lines += [f'# TYPE {METRIC_PREFIX}_{gauge} gauge', f'{METRIC_PREFIX}_{gauge} {value!r}']
+        for name, histogram in sorted(self.histograms.items()):
+            name = f'{METRIC_PREFIX}_{name}'
+            lines.append(f'# TYPE {name} histogram')
+            bounds = [*map(str, histogram.buckets), '+Inf']
+            lines += [f'{name}_bucket{{le="{bound}"}} {count}'
+                      for bound, count in zip(bounds, histogram.cumulative_counts())]
+            lines += [f'{name}_sum {histogram.sum!r}', f'{name}_count {histogram.count}']
+        return '\n'.join(lines) + '\n' if lines else ''
+
+    def export(self) -> None:
+        """
+            Write the metrics to the configured JSON and Prometheus textfile destinations.
+
+            Files are replaced atomically, so a collector never reads a partly written file.
+        """
+        if not self.enabled:
+            return
+        if self.json_path == '-':
+            print(json.dumps({'metrics': self.snapshot()}))
+        elif self.json_path:
+            _write_atomically(self.json_path, json.dumps(self.snapshot(), indent=2) + '\n')
+        if self.textfile_path:
+            _write_atomically(self.textfile_path, self.to_prometheus())
+
+
+def _write_atomically(file_path: str, content: str) -> None:
+    """
+        Write a file through a temporary file renamed over it.
+
+        Args:
+            file_path (str): Path of the file.
+            content (str): Content of the file.
+    """
+    temporary_path = f'{file_path}.{os.getpid()}.tmp'
+    with open(temporary_path, 'w', encoding='utf-8') as file:
+        file.write(content)
+    os.replace(temporary_path, file_path)
+
+
+@contextmanager
+def profiling(metrics: Metrics, cprofile_path: Optional[str] = None, trace_memory: bool = False) -> Iterator[None]:
+    """
+        Profile a block of code with cProfile and trace its allocations with tracemalloc.
+
+        Both are off by default and cost nothing then. The cProfile statistics are dumped to a file
+        readable with `python -m pstats`, and the tracemalloc peak is recorded as a gauge along with
+        a print of the top allocation sites.
+
+        Args:
+            metrics (Metrics): Metrics receiving the tracemalloc gauges.
+            cprofile_path (str, optional): File the cProfile statistics are dumped to.
+            trace_memory (bool): Whether allocations are traced.
+    """
+    profiler = cProfile.Profile() if cprofile_path else None
+    if trace_memory:
+        tracemalloc.start()
+    if profiler:
+        profiler.enable()
+    try:
+        yield
+    finally:
+        if profiler:
+            profiler.disable()
+            profiler.dump_stats(cprofile_path)
+            print(f"cProfile statistics written to {cprofile_path}")
+        if trace_memory:
+            snapshot = tracemalloc.take_snapshot()
+            current, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            metrics.set_gauge('tracemalloc_current_bytes', current)
+            metrics.set_gauge('tracemalloc_peak_bytes', peak)
+            print(f"tracemalloc: {current} bytes allocated, peak {peak} bytes. Top allocation sites:")
+            for statistic in snapshot.statistics('lineno')[:TRACEMALLOC_TOP]:
+                print(f"  {statistic}")
@@ -0,0 +1,194 @@
+import asyncio
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Callable, Iterable, Iterator, List, Optional, Tuple
+
+from app.processor.parallel_processor import FileProgress, build_batch, count_texts, init_worker
+from app.processor.text_processor import TextProcessor
+from app.storage.text_processor_dao import TextProcessorDAO
+from app.utils.constants import PIPELINE_QUEUE_SIZE, WORKERS
+
+# Chunk of a file moving through the pipeline: records, byte offset following them and entries read
+Chunk = Tuple[List[Tuple[str, str, str]], int, int]
+
+
+class AsyncPipeline:
+    """
+        Process CSV files in three asyncio stages connected by bounded queues.
+
+        1. The reader walks the files and streams their batches, running the blocking file I/O,
+           including the iteration of the file paths, in threads.
+        2. The tokenizer hands each batch to a pool of worker processes.
+        3. The writer is the single SQLite writer: every DAO call, including the manifest lookups of
+           the reader, runs on one dedicated thread, so the connection is never used concurrently
+           and the event loop keeps reading and tokenizing while a batch commits.
+
+        When the database is slower than reading, the queues fill up and the reader waits, so the
+        memory used is capped by the queue sizes, not by the input size. A file is handed to
+        `on_file_done` only after its last batch is committed.
+    """
+    def __init__(self, text_processor: TextProcessor, workers: int = WORKERS,
+                 queue_size: int = PIPELINE_QUEUE_SIZE):
+        """
+            Initialize the pipeline.
+
+            Args:
+                text_processor (TextProcessor): Processor used to read and parse the CSV files.
+                    Its batch size is the number of entries moving through the stages at once.
+                workers (int): Number of worker processes tokenizing the batches.
+                queue_size (int): Number of batches buffered between two stages.
+        """
+        if workers < 1:
+            raise ValueError(f"Number of workers must be positive: {workers}")
+        if queue_size < 1:
+            raise ValueError(f"Queue size must be positive: {queue_size}")
+        self.text_processor = text_processor
+        self.workers = workers
+        self.queue_size = queue_size
+
+    def process_csv_files(self, file_paths: Iterable[str], db_dao: TextProcessorDAO,
+                          on_file_done: Callable[[str], None]) -> None:
+        """
+            Process CSV files and store their content in the database.
+
+            The connection of the DAO is used from the writer thread while this method runs, so it
+            must allow it (`check_same_thread=False`) and must not be used by anything else meanwhile.
+            Errors are isolated per file like TextProcessor.process_csv_file: they are reported and
+            the file is still considered done, unless a batch cannot be saved. The file is then
+            neither completed nor handed to `on_file_done`, so that it is resumed from its last
+            committed batch.
+
+            Args:
+                file_paths (Iterable[str]): Paths of the CSV files, consumed lazily off the event loop.
+                db_dao (TextProcessorDAO): Data Access Object for database operations.
+                on_file_done (Callable[[str], None]): Called with the path of each file once all of
+                    its entries are committed, e.g. to move it away. Runs on the writer thread.
+        """
+        with ProcessPoolExecutor(max_workers=self.workers, initializer=init_worker,
+                                 initargs=(self.text_processor.tokenizer.stopwords,
+                                           self.text_processor.ngram_sizes,
+                                           self.text_processor.tokenizer.ngram_stopwords)) as tokenizers, \
+                ThreadPoolExecutor(max_workers=1, thread_name_prefix='sqlite-writer') as writer:
+            asyncio.run(self._run(iter(file_paths), db_dao, on_file_done, tokenizers, writer))
+
+    async def _run(self, file_paths: Iterator[str], db_dao: TextProcessorDAO, on_file_done: Callable[[str], None],
+                   tokenizers: Executor, writer: Executor) -> None:
+        """
+            Run the three stages until every file is written, stopping them all if one fails.
+        """
+        read_queue: asyncio.Queue = asyncio.Queue(self.queue_size)
+        write_queue: asyncio.Queue = asyncio.Queue(self.queue_size)
+        stages = [
+            asyncio.create_task(self._read(file_paths, db_dao, writer, read_queue)),
+            asyncio.create_task(self._tokenize(tokenizers, read_queue, write_queue)),
+            asyncio.create_task(self._write(db_dao, on_file_done, writer, write_queue)),
+        ]
+        done, pending = await asyncio.wait(stages, return_when=asyncio.FIRST_EXCEPTION)
+        for stage in pending:
+            stage.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+        for stage in done:
+            stage.result()
+
+    async def _read(self, file_paths: Iterator[str], db_dao: TextProcessorDAO, writer: Executor,
+                    read_queue: asyncio.Queue) -> None:
+        """
+            Stage 1: walk the files and stream their batches into the read queue.
+
+            Each file ends with a (progress, None) marker, and the stage ends with a None.
+        """
+        loop = asyncio.get_running_loop()
+        while True:
+            file_path = await asyncio.to_thread(next, file_paths, None)
+            if file_path is None:
+                break
+            progress = FileProgress(file_path)
+            try:
+                # The file is hashed off the event loop, the manifest is read by the writer
+                fingerprint = await asyncio.to_thread(self.text_processor.fingerprint, file_path)
+                progress.checkpoint = await loop.run_in_executor(
+                    writer, self.text_processor.resume_point, file_path, db_dao, fingerprint)
+                if progress.checkpoint is None:
+                    self.text_processor.metrics.increment('files_skipped')
+                else:
+                    batches = self.text_processor.iter_record_batches(file_path, progress.checkpoint.offset)
+                    while True:
+                        chunk: Optional[Chunk] = await asyncio.to_thread(next, batches, None)
+                        if chunk is None or progress.aborted:
+                            break
+                        progress.total_entries += chunk[2]
+                        await read_queue.put((progress, chunk))
+            except (FileNotFoundError, IOError) as e:
+                print(f"Error accessing file: {e}")
+                progress.failed = True
+            except Exception as e:
+                print(f"Unexpected error during CSV processing: {e}")
+                progress.failed = True
+            await read_queue.put((progress, None))
+        await read_queue.put(None)
+
+    async def _tokenize(self, tokenizers: Executor, read_queue: asyncio.Queue, write_queue: asyncio.Queue) -> None:
+        """
+            Stage 2: submit each batch to the worker processes, keeping the order of the batches.
+
+            The write queue holds the pending results, so it also bounds the batches in flight.
+        """
+        loop = asyncio.get_running_loop()
+        while True:
+            item = await read_queue.get()
+            if item is None:
+                await write_queue.put(None)
+                return
+            progress, chunk = item
+            future = None
+            if chunk is not None:
+                future = loop.run_in_executor(tokenizers, count_texts, [text for _, _, text in chunk[0]])
+            await write_queue.put((progress, chunk, future))
+
+    async def _write(self, db_dao: TextProcessorDAO, on_file_done: Callable[[str], None], writer: Executor,
+                     write_queue: asyncio.Queue) -> None:
+        """
+            Stage 3: write each tokenized batch in its own transaction, and complete each file.
+        """
+        loop = asyncio.get_running_loop()
+        metrics = self.text_processor.metrics
+        while True:
+            item = await write_queue.get()
+            if item is None:
+                return
+            progress, chunk, future = item
+
+            if progress.aborted:
+                if chunk is None:
+                    print(f"Leaving {progress.file_path} to be resumed from its last committed batch")
+                else:
+                    future.cancel()
+                continue
+            if chunk is None:
+                if not progress.failed and progress.checkpoint is not None:
+                    try:
+                        await loop.run_in_executor(writer, db_dao.complete_file, progress.checkpoint.content_hash)
+                        metrics.increment('files_completed')
+                        print(f"Successfully processed {progress.processed_entries} out of "
+                              f"{progress.total_entries} entries.")
+                    except Exception as e:
+                        print(f"Unexpected error during CSV processing: {e}")
+                try:
+                    await loop.run_in_executor(writer, on_file_done, progress.file_path)
+                except Exception as e:
+                    print(f"Error processing file {progress.file_path}: {e}")
+                continue
+
+            records, end_offset, entries = chunk
+            try:
+                with metrics.timer('tokenize_wait'):
+                    batch = build_batch(records, await future)
+                self.text_processor.record_batch_metrics(batch, entries)
+                await loop.run_in_executor(writer, db_dao.save_batch, batch,
+                                           progress.checkpoint._replace(offset=end_offset))
+                progress.processed_entries += len(batch)
+                metrics.increment('entries_saved', len(batch))
+            except Exception as e:
+                # Later batches would move the checkpoint past the failed one
+                print(f"Error processing entries, stopping the file: {e}")
+                metrics.increment('batches_failed')
+                progress.aborted = True
@@ -0,0 +1,205 @@
+from collections import Counter, deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Deque, FrozenSet, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from app.processor.text_processor import TextProcessor
+from app.storage.text_processor_dao import EntryRecord, FileCheckpoint, TextProcessorDAO
+from app.utils.constants import WORKERS
+
+
+# Text processor of the current worker process, whose cache lives as long as the worker
+_worker_processor: Optional[TextProcessor] = None
+
+
+def init_worker(stopwords: FrozenSet[str], ngram_sizes: Sequence[int] = (),
+                ngram_stopwords: Optional[FrozenSet[str]] = None) -> None:
+    """
+        Create the text processor of a worker process, with the settings of the parent's.
+
+        Args:
+            stopwords (FrozenSet[str]): Words left out of the counts.
+            ngram_sizes (Sequence[int]): Number of words of the n-grams counted, if any.
+            ngram_stopwords (FrozenSet[str], optional): Words n-grams never span. Defaults to the stopwords.
+    """
+    global _worker_processor
+    _worker_processor = TextProcessor(stopwords=stopwords, ngram_sizes=ngram_sizes, ngram_stopwords=ngram_stopwords)
+
+
+def count_texts(texts: List[str]) -> List[Tuple[Counter, Optional[Counter], bytes]]:
+    """
+        Compute the word and n-gram frequencies of a chunk of texts inside a worker process.
+
+        Texts repeated within the chunks handled by the same worker are counted once.
+
+        Args:
+            texts (List[str]): Texts to process.
+
+        Returns:
+            List[Tuple[Counter, Optional[Counter], bytes]]: Word frequencies of each text, in the
+            same order, with its n-gram frequencies in n-gram mode and its content hash.
+    """
+    global _worker_processor
+    if _worker_processor is None:
+        _worker_processor = TextProcessor()
+    process_text_with_digest = _worker_processor.process_text_with_digest
+    process_ngrams = _worker_processor.process_ngrams
+    results = []
+    for text in texts:
+        word_freq, digest = process_text_with_digest(text)
+        results.append((word_freq, process_ngrams(text), digest))
+    return results
+
+
+def build_batch(records: List[Tuple[str, str, str]],
+                counts: List[Tuple[Counter, Optional[Counter], bytes]]) -> List[EntryRecord]:
+    """
+        Pair parsed records with the frequencies computed by a worker.
+
+        Args:
+            records (List[Tuple[str, str, str]]): The id, source and text of each entry.
+            counts (List[Tuple[Counter, Optional[Counter], bytes]]): Result of count_texts for their texts.
+
+        Returns:
+            List[EntryRecord]: Entries to be saved.
+    """
+    return [EntryRecord(entry_id, source, text, word_freq, ngram_freq, digest)
+            for (entry_id, source, text), (word_freq, ngram_freq, digest) in zip(records, counts)]
+
+
+class FileProgress:
+    """Bookkeeping of a file whose chunks are being processed by the pool."""
+    def __init__(self, file_path: str):
+        self.file_path = file_path
+        self.checkpoint: Optional[FileCheckpoint] = None
+        self.total_entries = 0
+        self.processed_entries = 0
+        self.failed = False
+        # A batch could not be saved: the rest of the file is skipped, to be resumed from the last committed batch
+        self.aborted = False
+
+
+class ParallelTextProcessor:
+    """
+        Process CSV files on a pool of worker processes.
+
+        The parent process streams the entries of each file and hands chunks of texts to the
+        workers, which only tokenize and count them. The resulting counters are written back by
+        the parent, which is the single SQLite writer. Chunks of the next files are submitted
+        while the current file is still being written, so the pool is shared both across files
+        and across the entries of one large file.
+    """
+    def __init__(self, text_processor: TextProcessor, workers: int = WORKERS):
+        """
+            Initialize the parallel processor.
+
+            Args:
+                text_processor (TextProcessor): Processor used to read and parse the CSV files.
+                    Its batch size is the number of entries sent to a worker at once.
+                workers (int): Number of worker processes.
+        """
+        if workers < 1:
+            raise ValueError(f"Number of workers must be positive: {workers}")
+        self.text_processor = text_processor
+        self.workers = workers
+        # Bound the number of chunks in flight so memory does not grow with the input size
+        self.max_pending = workers * 2
+
+    def process_csv_files(self, file_paths: Iterable[str], db_dao: TextProcessorDAO) -> Iterator[str]:
+        """
+            Process CSV files in parallel and store their content in the database.
+
+            Errors are isolated per file exactly like TextProcessor.process_csv_file: they are
+            reported and the file is still considered done, unless a batch cannot be saved. The
+            file is then neither completed nor yielded, so that it is resumed from its last
+            committed batch. The ingestion manifest is honored the same way: processed files are
+            skipped and partly processed ones are resumed.
+
+            Args:
+                file_paths (Iterable[str]): Paths of the CSV files to process.
+                db_dao (TextProcessorDAO): Data Access Object for database operations.
+
+            Yields:
+                str: Path of each file, once all of its entries have been committed.
+        """
+        # (file, (records, end offset, entries read) or None at the end of the file, worker result)
+        pending: Deque[Tuple[FileProgress, Optional[Tuple[List[Tuple[str, str, str]], int, int]],
+                             Optional[Future]]] = deque()
+        with ProcessPoolExecutor(max_workers=self.workers, initializer=init_worker,
+                                 initargs=(self.text_processor.tokenizer.stopwords,
+                                           self.text_processor.ngram_sizes,
+                                           self.text_processor.tokenizer.ngram_stopwords)) as executor:
+            for file_path in file_paths:
+                progress = FileProgress(file_path)
+                try:
+                    progress.checkpoint = self.text_processor.resume_point(file_path, db_dao)
+                    if progress.checkpoint is None:
+                        self.text_processor.metrics.increment('files_skipped')
+                    # Already processed files go straight to the end-of-file marker
+                    chunks = [] if progress.checkpoint is None else self.text_processor.iter_record_batches(
+                        file_path, progress.checkpoint.offset)
+                    for records, end_offset, entries in chunks:
+                        if progress.aborted:
+                            break
+                        progress.total_entries += entries
+                        future = executor.submit(count_texts, [text for _, _, text in records])
+                        pending.append((progress, (records, end_offset, entries), future))
+                        while len(pending) > self.max_pending:
+                            yield from self._write_next(pending, db_dao)
+                except (FileNotFoundError, IOError) as e:
+                    print(f"Error accessing file: {e}")
+                    progress.failed = True
+                except Exception as e:
+                    print(f"Unexpected error during CSV processing: {e}")
+                    progress.failed = True
+
+                # Marks the end of the file in the queue
+                pending.append((progress, None, None))
+
+            while pending:
+                yield from self._write_next(pending, db_dao)
+
+    def _write_next(self, pending: Deque, db_dao: TextProcessorDAO) -> Iterator[str]:
+        """
+            Write the oldest pending chunk, waiting for its worker if needed.
+
+            Args:
+                pending (Deque): Queue of submitted chunks and end-of-file markers.
+                db_dao (TextProcessorDAO): Data Access Object for database operations.
+
+            Yields:
+                str: Path of the file, if the oldest item marked the end of a file.
+        """
+        progress, chunk, future = pending.popleft()
+        if progress.aborted:
+            if chunk is None:
+                print(f"Leaving {progress.file_path} to be resumed from its last committed batch")
+            else:
+                future.cancel()
+            return
+        if chunk is None:
+            if not progress.failed and progress.checkpoint is not None:
+                try:
+                    db_dao.complete_file(progress.checkpoint.content_hash)
+                    self.text_processor.metrics.increment('files_completed')
+                    print(f"Successfully processed {progress.processed_entries} out of "
+                          f"{progress.total_entries} entries.")
+                except Exception as e:
+                    print(f"Unexpected error during CSV processing: {e}")
+            yield progress.file_path
+            return
+
+        records, end_offset, entries = chunk
+        metrics = self.text_processor.metrics
+        try:
+            # Workers tokenize concurrently, so only the time the writer waits for them is measured
+            with metrics.timer('tokenize_wait'):
+                batch = build_batch(records, future.result())
+            self.text_processor.record_batch_metrics(batch, entries)
+            db_dao.save_batch(batch, progress.checkpoint._replace(offset=end_offset))
+            progress.processed_entries += len(batch)
+            metrics.increment('entries_saved', len(batch))
+        except Exception as e:
+            # Later batches would move the checkpoint past the failed one
+            print(f"Error processing entries, stopping the file: {e}")
+            metrics.increment('batches_failed')
+            progress.aborted = True
@@ -1,9 +1,45 @@
 from abc import ABC, abstractmethod
-from collections import Counter
-from sqlite3 import Connection
+from collections import Counter, OrderedDict
+from sqlite3 import Connection, Error as SQLiteError
+import bz2
+import gzip
+import hashlib
+import lzma
+import os
 import re
-from app.storage.text_processor_dao import TextProcessorDAO
-from app.utils.constants import COMMON_WORDS
+import time
+import zlib
+from typing import IO, Iterable, Iterator, List, NamedTuple, Optional, Sequence, Tuple
+from app.metrics.metrics import Metrics
+from app.processor.tokenizer import Tokenizer
+from app.storage.text_processor_dao import EntryRecord, FileCheckpoint, TextProcessorDAO
+from app.utils.constants import BATCH_SIZE, COMMON_WORDS, TEXT_CACHE_SIZE
+from app.utils.text_hash import text_digest
+
+# A new entry starts on every line beginning with a 7-digit id followed by a comma
+ENTRY_START = re.compile(r'\d{7},')
+
+# A line of a binary file, ending with '\n', '\r\n' or a bare '\r' as in universal newlines mode
+RAW_LINE = re.compile(rb'[^\r\n]*(?:\r\n?|\n)|[^\r\n]+')
+
+# Size of the blocks read when hashing a file
+HASH_BLOCK_SIZE = 1024 * 1024
+
+# Compressed inputs are decompressed while they are read, never to disk
+DECOMPRESSORS = {'.gz': gzip.open, '.bz2': bz2.open, '.xz': lzma.open}
+
+# Errors raised by the decompressors on corrupted or truncated files
+DECOMPRESSION_ERRORS = (EOFError, zlib.error, lzma.LZMAError)
+
+
+class CacheInfo(NamedTuple):
+    """
+        Statistics of the word frequency cache of a text processor.
+    """
+    hits: int
+    misses: int
+    size: int
+    max_size: int
 
 
 class TextProcessorInterface(ABC):
@@ -12,6 +48,10 @@ class TextProcessorInterface(ABC):
     def retrieve_csv_content(self, file_path: str) -> str:
         pass
 
+    @abstractmethod
+    def iter_csv_entries(self, file_path: str) -> Iterator[str]:
+        pass
+
     @abstractmethod
     def process_text(self, text: str) -> Counter:
         pass
@@ -23,6 +63,38 @@ class TextProcessorInterface(ABC):
 
 class TextProcessor(TextProcessorInterface):
     """Concrete implementation of TextProcessorInterface."""
+    def __init__(self, batch_size: int = BATCH_SIZE, metrics: Optional[Metrics] = None,
+                 cache_size: int = TEXT_CACHE_SIZE, stopwords: Iterable[str] = COMMON_WORDS,
+                 ngram_sizes: Sequence[int] = (), ngram_stopwords: Optional[Iterable[str]] = None):
+        """
+            Initialize the processor.
+
+            Args:
+                batch_size (int): Number of entries written to the database per transaction.
+                metrics (Metrics, optional): Metrics of the pipeline. Defaults to disabled metrics.
+                cache_size (int): Number of distinct texts whose word frequencies are kept, least
+                    recently used first out. 0 disables the cache.
+                stopwords (Iterable[str]): Words left out of the counts. Empty to count every word
+                    and apply the stopwords at query time.
+                ngram_sizes (Sequence[int]): Number of words of the n-grams counted next to the
+                    words, e.g. (2, 3). Empty to count words only.
+                ngram_stopwords (Iterable[str], optional): Words n-grams never span. Defaults to
+                    the stopwords; the active stopwords when those are applied at query time.
+        """
+        if cache_size < 0:
+            raise ValueError(f"Cache size must not be negative: {cache_size}")
+        if any(n < 2 for n in ngram_sizes):
+            raise ValueError(f"N-grams must have at least 2 words: {tuple(ngram_sizes)}")
+        self.batch_size = batch_size
+        self.tokenizer = Tokenizer(stopwords, ngram_stopwords=ngram_stopwords)
+        self.ngram_sizes = tuple(sorted(set(ngram_sizes)))
+        self.metrics = metrics or Metrics()
+        self.cache_size = cache_size
+        # Content hash of a text -> its word frequencies, the most recently used last
+        self._counts: OrderedDict = OrderedDict()
+        self._cache_hits = 0
+        self._cache_misses = 0
+
     def retrieve_csv_content(self, file_path: str) -> str:
         """
             Retrieve content from a CSV file.
@@ -38,36 +110,286 @@ class TextProcessor(TextProcessorInterface):
                 IOError: If there's an error reading the file.
         """
         try:
-            with open(file_path, 'r', encoding='utf-8', errors='replace') as file:
+            with self.metrics.timer('read'), \
+                    self.open_csv_file(file_path, 'rt', encoding='utf-8', errors='replace') as file:
                 return file.read()
         except FileNotFoundError:
             raise FileNotFoundError(f"CSV file not found: {file_path}")
+        except (IOError, *DECOMPRESSION_ERRORS) as e:
+            raise IOError(f"Error reading CSV file: {e}")
+
+    @staticmethod
+    def open_csv_file(file_path: str, mode: str = 'rb', **kwargs) -> IO:
+        """
+            Open a CSV file for reading, decompressing `.gz`, `.bz2` and `.xz` files on the fly.
+
+            Args:
+                file_path (str): Path to the CSV file.
+                mode (str): 'rb' or 'rt'.
+                **kwargs: Arguments of text mode, like `encoding` and `errors`.
+
+            Returns:
+                IO: The uncompressed content of the file.
+
+            Raises:
+                FileNotFoundError: If the file is not found.
+        """
+        decompressor = DECOMPRESSORS.get(os.path.splitext(file_path)[1].lower())
+        return (decompressor or open)(file_path, mode, **kwargs)
+
+    def iter_csv_entries(self, file_path: str) -> Iterator[str]:
+        """
+            Stream the raw entries of a CSV file one at a time.
+
+            An entry spans every line up to the next line starting with a 7-digit id, so only
+            the entry being assembled is held in memory, regardless of the file size.
+
+            Args:
+                file_path (str): Path to the CSV file.
+
+            Yields:
+                str: Raw entry, with the surrounding whitespace of the file removed.
+
+            Raises:
+                FileNotFoundError: If the file is not found.
+                IOError: If there's an error reading the file.
+        """
+        for entry, _ in self.iter_csv_entry_spans(file_path):
+            yield entry
+
+    def iter_csv_entry_spans(self, file_path: str, start_offset: int = 0) -> Iterator[Tuple[str, int]]:
+        """
+            Stream the raw entries of a CSV file along with the byte offset following each one.
+
+            The offset following an entry is where the next entry starts, so reading can be
+            resumed from it. Offsets of compressed files are offsets in their uncompressed content.
+
+            Args:
+                file_path (str): Path to the CSV file.
+                start_offset (int): Byte offset of the first entry to be read.
+
+            Yields:
+                Tuple[str, int]: Raw entry and the byte offset right after it.
+
+            Raises:
+                FileNotFoundError: If the file is not found.
+                IOError: If there's an error reading the file.
+        """
+        try:
+            with self.open_csv_file(file_path) as file:
+                file.seek(start_offset)
+                offset = start_offset
+                lines = []
+                first_entry = True
+                for raw_line in self._iter_raw_lines(file):
+                    # Lines are decoded one by one: a newline byte is never part of a UTF-8 character
+                    line = raw_line.decode('utf-8', errors='replace').replace('\r\n', '\n').replace('\r', '\n')
+                    if lines and ENTRY_START.match(line):
+                        entry = ''.join(lines)[:-1]
+                        if first_entry:
+                            entry = entry.lstrip()
+                        # Leading blank lines of the file are not an entry
+                        if entry or not first_entry:
+                            yield entry, offset
+                            first_entry = False
+                        lines = []
+                    lines.append(line)
+                    offset += len(raw_line)
+
+                entry = ''.join(lines).strip() if first_entry else ''.join(lines).rstrip()
+                if entry or not first_entry:
+                    yield entry, offset
+        except FileNotFoundError:
+            raise FileNotFoundError(f"CSV file not found: {file_path}")
+        except (IOError, *DECOMPRESSION_ERRORS) as e:
+            raise IOError(f"Error reading CSV file: {e}")
+
+    @staticmethod
+    def _iter_raw_lines(file: IO[bytes]) -> Iterator[bytes]:
+        """
+            Split a binary file into lines ending with '\n', '\r\n' or a bare '\r', each with its
+            line break, so that the offsets of the lines add up.
+
+            Binary files only split on '\n': the few lines holding another '\r' are split again.
+
+            Args:
+                file (IO[bytes]): File opened in binary mode.
+
+            Yields:
+                bytes: Lines of the file, in order.
+        """
+        for raw_line in file:
+            carriage_return = raw_line.find(b'\r')
+            if carriage_return == -1 or (carriage_return == len(raw_line) - 2 and raw_line.endswith(b'\n')):
+                yield raw_line
+            else:
+                yield from RAW_LINE.findall(raw_line)
+
+    @staticmethod
+    def fingerprint(file_path: str) -> Tuple[str, int]:
+        """
+            Compute the content hash and size of a file, reading it in fixed-size blocks.
+
+            Compressed files are hashed as they are stored, without decompressing them.
+
+            Args:
+                file_path (str): Path to the file.
+
+            Returns:
+                Tuple[str, int]: SHA-256 hex digest of the content and size in bytes.
+
+            Raises:
+                FileNotFoundError: If the file is not found.
+                IOError: If there's an error reading the file.
+        """
+        content_hash = hashlib.sha256()
+        size = 0
+        try:
+            with open(file_path, 'rb') as file:
+                for block in iter(lambda: file.read(HASH_BLOCK_SIZE), b''):
+                    content_hash.update(block)
+                    size += len(block)
+        except FileNotFoundError:
+            raise FileNotFoundError(f"CSV file not found: {file_path}")
         except IOError as e:
             raise IOError(f"Error reading CSV file: {e}")
+        return content_hash.hexdigest(), size
+
+    def iter_csv_records(self, file_path: str) -> Iterator[Tuple[str, str, str]]:
+        """
+            Stream the parsed records of a CSV file one at a time, skipping invalid entries.
+
+            Args:
+                file_path (str): Path to the CSV file.
+
+            Yields:
+                Tuple[str, str, str]: The id, source and text of each entry.
+
+            Raises:
+                FileNotFoundError: If the file is not found.
+                IOError: If there's an error reading the file.
+        """
+        for entry in self.iter_csv_entries(file_path):
+            try:
+                yield self.parse_entry(entry)
+            except ValueError as e:
+                print(f"Skipping invalid entry: {e}")
+
+    @staticmethod
+    def parse_entry(entry: str) -> Tuple[str, str, str]:
+        """
+            Split a raw entry into its id, source and text.
+
+            Args:
+                entry (str): Raw entry in the `id, "source", "text"` format.
+
+            Returns:
+                Tuple[str, str, str]: The id, source and text, without extra whitespace and quotes.
+
+            Raises:
+                ValueError: If the entry does not have three comma-separated parts.
+        """
+        # Split each entry into its components: id, source, and text
+        parts = entry.split(',', 2)
+        if len(parts) != 3:
+            raise ValueError(f"Invalid entry format: {entry}")
+
+        entry_id, source, text = parts
+
+        # Remove extra whitespace and quotes
+        return entry_id.strip(), source.strip().strip('"'), text.strip().strip('"')
 
     def process_text(self, text: str) -> Counter:
         """
             Process text to count word frequencies, excluding common words.
 
+            Texts repeated under other ids, even with different whitespace, are served from the
+            cache, so the returned Counter may be shared and must not be modified.
+
             Args:
                 text (str): Text to process.
 
             Returns:
                 Counter: Word frequencies.
         """
-        # Remove numbers and emojis using regex
-        text = re.sub(r'\d+(?:\.\d+)?', '', text)
-        text = re.sub(r'[\U0001F600-\U0001F64F\U0001F300-\U0001F5FF\U0001F680-\U0001F6FF\U0001F1E0-\U0001F1FF]', '',
-                      text)
+        if not self.cache_size:
+            # Remove numbers and emojis, tokenize the text into words and count frequencies,
+            # excluding common words
+            return self.tokenizer.count(text)
+        return self._count_cached(text, text_digest(text))
+
+    def process_text_with_digest(self, text: str) -> Tuple[Counter, bytes]:
+        """
+            Process text like `process_text`, also returning its content hash, so that the DAO
+            does not hash the text again when storing it.
+
+            Args:
+                text (str): Text to process.
+
+            Returns:
+                Tuple[Counter, bytes]: Word frequencies and content hash (text_digest) of the text.
+        """
+        digest = text_digest(text)
+        if not self.cache_size:
+            return self.tokenizer.count(text), digest
+        return self._count_cached(text, digest), digest
+
+    def _count_cached(self, text: str, key: bytes) -> Counter:
+        """
+            Count the word frequencies of a text through the cache.
+
+            Args:
+                text (str): Text to process.
+                key (bytes): Content hash of the text.
+
+            Returns:
+                Counter: Word frequencies, possibly shared.
+        """
+        counts = self._counts.get(key)
+        if counts is not None:
+            self._counts.move_to_end(key)
+            self._cache_hits += 1
+            return counts
+
+        self._cache_misses += 1
+        counts = self._counts[key] = self.tokenizer.count(text)
+        if len(self._counts) > self.cache_size:
+            self._counts.popitem(last=False)
+        return counts
+
+    def process_ngrams(self, text: str) -> Optional[Counter]:
+        """
+            Process text to count n-gram frequencies, when n-grams are counted.
 
-        # Tokenize the text into words and count frequencies, excluding common words
-        words = re.findall(r'\b\w+\b', text.lower())
-        return Counter(word for word in words if word not in COMMON_WORDS)
+            Unlike the word frequencies, n-gram frequencies are not cached: they are larger and
+            only computed in n-gram mode.
+
+            Args:
+                text (str): Text to process.
+
+            Returns:
+                Optional[Counter]: N-gram frequencies, or None if no n-gram size is configured.
+        """
+        if not self.ngram_sizes:
+            return None
+        return self.tokenizer.count_ngrams(text, self.ngram_sizes)
+
+    def cache_info(self) -> CacheInfo:
+        """
+            Get the statistics of the word frequency cache.
+
+            Returns:
+                CacheInfo: Hits, misses, current and maximum number of cached texts.
+        """
+        return CacheInfo(self._cache_hits, self._cache_misses, len(self._counts), self.cache_size)
 
     def process_csv_file(self, file_path: str, db_dao: TextProcessorDAO) -> None:
         """
             Process a CSV file and store its content in the database.
 
+            Files already in the ingestion manifest are skipped, and partly processed files are
+            resumed from their last committed batch.
+
             Args:
                 file_path (str): Path to the CSV file.
                 db_dao (TextProcessorDAO): Data Access Object for database operations.
@@ -76,46 +398,138 @@ class TextProcessor(TextProcessorInterface):
                 FileNotFoundError: If the file is not found.
                 IOError: If there's an error reading the file.
                 ValueError: If there's an error processing the file content.
+                SQLiteError: If a batch cannot be saved. The file is then left incomplete, so that
+                    it is resumed from its last committed batch rather than skipping the entries of
+                    the failed one.
         """
         try:
-            content = self.retrieve_csv_content(file_path)
-
-            # Split the content into individual entries
-            entries = re.split(r'\n(?=\d{7},)', content.strip())
+            checkpoint = self.resume_point(file_path, db_dao)
+            if checkpoint is None:
+                self.metrics.increment('files_skipped')
+                return
 
+            # Entries are streamed from the file, parsed lazily and written in batches, one
+            # transaction per batch, which also records how far into the file it got
+            total_entries = 0
             processed_entries = 0
-            for entry in entries:
+            for records, end_offset, entries in self.iter_record_batches(file_path, checkpoint.offset):
+                total_entries += entries
+                batch = []
+                cache_hits, cache_misses = self._cache_hits, self._cache_misses
+                with self.metrics.timer('tokenize'):
+                    for entry_id, source, text in records:
+                        try:
+                            # Process the text and get word frequencies
+                            word_freq, digest = self.process_text_with_digest(text)
+                            batch.append(EntryRecord(entry_id, source, text, word_freq, self.process_ngrams(text),
+                                                     digest))
+                        except Exception as e:
+                            print(f"Error processing entry: {e}")
+                self.record_batch_metrics(batch, entries)
+                self.metrics.increment('text_cache_hits', self._cache_hits - cache_hits)
+                self.metrics.increment('text_cache_misses', self._cache_misses - cache_misses)
                 try:
-                    # Split each entry into its components: id, source, and text
-                    parts = entry.split(',', 2)
-                    if len(parts) != 3:
-                        raise ValueError(f"Invalid entry format: {entry}")
+                    db_dao.save_batch(batch, checkpoint._replace(offset=end_offset))
+                    processed_entries += len(batch)
+                    self.metrics.increment('entries_saved', len(batch))
+                except SQLiteError as e:
+                    # Later batches would move the checkpoint past the failed one
+                    self.metrics.increment('batches_failed')
+                    raise SQLiteError(f"Error saving batch of {len(batch)} entries, "
+                                      f"stopping after {processed_entries} entries: {e}")
+
+            db_dao.complete_file(checkpoint.content_hash)
+            self.metrics.increment('files_completed')
+            print(f"Successfully processed {processed_entries} out of {total_entries} entries.")
+        except SQLiteError:
+            raise
+        except (FileNotFoundError, IOError) as e:
+            print(f"Error accessing file: {e}")
+        except Exception as e:
+            print(f"Unexpected error during CSV processing: {e}")
+
+    def record_batch_metrics(self, batch: List[EntryRecord], entries_read: int) -> None:
+        """
+            Record the size and word count of each entry of a batch, when metrics are enabled.
 
-                    entry_id, source, text = parts
+            Args:
+                batch (List[EntryRecord]): Processed entries of the batch.
+                entries_read (int): Number of entries read for the batch, including invalid ones.
+        """
+        metrics = self.metrics
+        if not metrics.enabled:
+            return
+        metrics.increment('entries_read', entries_read)
+        for record in batch:
+            metrics.observe('entry_chars', len(record.text))
+            metrics.observe('entry_words', sum(record.word_freq.values()))
 
-                    # Remove extra whitespace and quotes
-                    entry_id = entry_id.strip()
-                    source = source.strip().strip('"')
-                    text = text.strip().strip('"')
+    def resume_point(self, file_path: str, db_dao: TextProcessorDAO,
+                     fingerprint: Optional[Tuple[str, int]] = None) -> Optional[FileCheckpoint]:
+        """
+            Look up a file in the ingestion manifest to know where its processing should start.
 
-                    # Process the text and get word frequencies
-                    word_freq = self.process_text(text)
+            Files are identified by their content hash, so a renamed copy of a processed file is
+            still recognized. New files are registered in the manifest.
 
-                    # Insert or replace the entry in the 'entries' table
-                    db_dao.save_entry(entry_id, source, text)
+            Args:
+                file_path (str): Path to the CSV file.
+                db_dao (TextProcessorDAO): Data Access Object for database operations.
+                fingerprint (Tuple[str, int], optional): Content hash and size of the file, if
+                    already computed. Defaults to hashing the file.
 
-                    # Insert word frequencies into the 'word_frequencies' table
-                    db_dao.save_words_frequency(entry_id, word_freq)
+            Returns:
+                Optional[FileCheckpoint]: Content hash and byte offset to start from, or None if
+                the file was already fully processed.
+        """
+        content_hash, size = fingerprint or self.fingerprint(file_path)
+        file_name = os.path.basename(file_path)
+        manifest = db_dao.get_file_manifest(content_hash)
+        if manifest is None:
+            db_dao.start_file(content_hash, file_name, size)
+            return FileCheckpoint(content_hash, 0)
+        if manifest.completed:
+            print(f"Skipping already processed file: {file_name}")
+            return None
+        print(f"Resuming {file_name} from byte {manifest.checkpoint_offset}")
+        return FileCheckpoint(content_hash, manifest.checkpoint_offset)
 
-                    processed_entries += 1
-                except ValueError as e:
-                    print(f"Skipping invalid entry: {e}")
-                except Exception as e:
-                    print(f"Error processing entry: {e}")
+    def iter_record_batches(self, file_path: str, start_offset: int = 0) \
+            -> Iterator[Tuple[List[Tuple[str, str, str]], int, int]]:
+        """
+            Stream the valid records of a CSV file in batches, skipping invalid entries.
 
-            print(f"Successfully processed {processed_entries} out of {len(entries)} entries.")
-        except (FileNotFoundError, IOError) as e:
-            print(f"Error accessing file: {e}")
-        except Exception as e:
-            print(f"Unexpected error during CSV processing: {e}")
+            Args:
+                file_path (str): Path to the CSV file.
+                start_offset (int): Byte offset of the first entry to be read.
 
+            Yields:
+                Tuple[List[Tuple[str, str, str]], int, int]: Up to `batch_size` (id, source, text)
+                records, the byte offset following the last entry read and the number of entries
+                read for this batch, including invalid ones.
+
+            Raises:
+                FileNotFoundError: If the file is not found.
+                IOError: If there's an error reading the file.
+        """
+        records = []
+        entries = 0
+        end_offset = start_offset
+        # Time spent reading, splitting and parsing, excluding the time the consumer holds each batch
+        started = time.perf_counter()
+        for entry, end_offset in self.iter_csv_entry_spans(file_path, start_offset):
+            entries += 1
+            try:
+                records.append(self.parse_entry(entry))
+            except ValueError as e:
+                print(f"Skipping invalid entry: {e}")
+                continue
+            if len(records) >= self.batch_size:
+                self.metrics.add_time('read_split', time.perf_counter() - started)
+                yield records, end_offset, entries
+                started = time.perf_counter()
+                records = []
+                entries = 0
+        if entries:
+            self.metrics.add_time('read_split', time.perf_counter() - started)
+            yield records, end_offset, entries
@@ -0,0 +1,131 @@
+import re
+from collections import Counter
+from itertools import chain, filterfalse, groupby
+from typing import Iterable, Iterator, List, Optional, Sequence
+
+from app.utils.constants import COMMON_WORDS, TEXT_WINDOW_SIZE
+from app.utils.text_windows import text_windows
+
+# Numbers in numeric form (e.g. "100", "1.250")
+NUMBER_PATTERN = re.compile(r'\d+(?:\.\d+)?')
+# Emojis: emoticons, symbols & pictographs, transport & map symbols and flags
+EMOJI_PATTERN = re.compile(r'[\U0001F600-\U0001F64F\U0001F300-\U0001F5FF\U0001F680-\U0001F6FF\U0001F1E0-\U0001F1FF]')
+# Words are maximal runs of word characters
+WORD_PATTERN = re.compile(r'\w+')
+
+
+class Tokenizer:
+    """
+        Turn texts into word frequencies, ignoring numbers, emojis and stopwords.
+
+        All patterns are compiled once, the emoji scan is skipped for ASCII-only texts and the
+        stopword filter runs at C level, so the Python interpreter never loops over the tokens.
+        Texts longer than a window are tokenized window by window, so that their peak memory is
+        proportional to the window rather than to several copies of the text.
+    """
+    def __init__(self, stopwords: Iterable[str] = COMMON_WORDS, window_size: int = TEXT_WINDOW_SIZE,
+                 ngram_stopwords: Optional[Iterable[str]] = None):
+        """
+            Initialize the tokenizer.
+
+            Args:
+                stopwords (Iterable[str]): Words to be ignored in the counts.
+                window_size (int): Number of characters above which texts are tokenized in windows.
+                ngram_stopwords (Iterable[str], optional): Words ending a phrase in the n-gram counts.
+                    Defaults to the stopwords; set when the stopwords are counted and only left out
+                    at query time, since n-grams are not filtered then.
+
+            Raises:
+                ValueError: If the window size is not positive.
+        """
+        if window_size < 1:
+            raise ValueError(f"Window size must be positive: {window_size}")
+        self.stopwords = frozenset(stopwords)
+        self._is_stopword = self.stopwords.__contains__
+        self.ngram_stopwords = self.stopwords if ngram_stopwords is None else frozenset(ngram_stopwords)
+        self._ends_phrase = self.ngram_stopwords.__contains__
+        self.window_size = window_size
+
+    def words(self, text: str) -> List[str]:
+        """
+            Split a text into its lowercased words, numbers and emojis removed, stopwords included.
+
+            Args:
+                text (str): Text to process.
+
+            Returns:
+                List[str]: Words of the text, in order.
+        """
+        text = NUMBER_PATTERN.sub('', text)
+        # Emojis are never ASCII, so there's nothing to strip from ASCII texts
+        if not text.isascii():
+            text = EMOJI_PATTERN.sub('', text)
+        return WORD_PATTERN.findall(text.lower())
+
+    def iter_words(self, text: str) -> Iterator[str]:
+        """
+            Stream the words of a text like `words`, splitting only a window of it at a time.
+
+            Args:
+                text (str): Text to process.
+
+            Returns:
+                Iterator[str]: Words of the text, in order.
+        """
+        if len(text) <= self.window_size:
+            return iter(self.words(text))
+        return chain.from_iterable(map(self.words, text_windows(text, self.window_size)))
+
+    def count(self, text: str) -> Counter:
+        """
+            Count the word frequencies of a text, window by window for long texts.
+
+            Args:
+                text (str): Text to process.
+
+            Returns:
+                Counter: Word frequencies.
+        """
+        if len(text) <= self.window_size:
+            return Counter(filterfalse(self._is_stopword, self.words(text)))
+        counts = Counter()
+        for window in text_windows(text, self.window_size):
+            counts.update(filterfalse(self._is_stopword, self.words(window)))
+        return counts
+
+    def count_ngrams(self, text: str, sizes: Sequence[int]) -> Counter:
+        """
+            Count the n-gram frequencies of a text, its words being split as in `count`.
+
+            N-gram stopwords end a phrase: n-grams are taken within the runs of words between
+            them, so they never contain a word the word counts leave out.
+
+            Args:
+                text (str): Text to process.
+                sizes (Sequence[int]): Number of words of the n-grams, e.g. (2, 3).
+
+            Returns:
+                Counter: Frequencies of the n-grams, their words separated by single spaces.
+        """
+        counts = Counter()
+        for is_stopword, run in groupby(self.iter_words(text), self._ends_phrase):
+            if is_stopword:
+                continue
+            run = list(run)
+            for n in sizes:
+                if len(run) >= n:
+                    counts.update(map(' '.join, zip(*(run[i:] for i in range(n)))))
+        return counts
+
+    def count_many(self, texts: Iterable[str]) -> List[Counter]:
+        """
+            Count the word frequencies of many texts.
+
+            Args:
+                texts (Iterable[str]): Texts to process.
+
+            Returns:
+                List[Counter]: Word frequencies of each text, in the same order.
+        """
+        count = self.count
+        return [count(text) for text in texts]
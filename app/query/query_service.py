@@ -0,0 +1,231 @@
+import threading
+import time
+from collections import Counter
+from sqlite3 import Connection
+from typing import Callable, NamedTuple, Optional, Sequence, Tuple
+
+from app.query.result_cache import ResultCache
+from app.storage.database_client import shard_index
+from app.storage.sharded_dao import ShardedTextProcessorDAO
+from app.storage.text_processor_dao import ACTIVE_STOPWORD_IDS
+from app.utils.constants import QUERY_CACHE_SIZE, QUERY_CACHE_TTL, QUERY_DATA_VERSION_INTERVAL, REPORT_LIMIT
+
+
+class WordCount(NamedTuple):
+    """
+        A word and its number of occurrences.
+    """
+    word: str
+    count: int
+
+
+class WordStats(NamedTuple):
+    """
+        Corpus-wide statistics of a word.
+    """
+    word: str
+    total_count: int
+    document_count: int
+
+
+class DataVersion:
+    """
+        Ingest generation of databases written by other connections, possibly in other processes:
+        the sum of SQLite's data_version of a connection to each database, which changes whenever
+        another connection commits.
+
+        The data_version is only read again once `interval` seconds have passed since the last
+        read, so that queries served from a cache do not query SQLite each time; a commit is then
+        seen after `interval` seconds at most. Safe to share between threads.
+    """
+    def __init__(self, connections: Sequence[Connection], interval: float = QUERY_DATA_VERSION_INTERVAL,
+                 clock: Callable[[], float] = time.monotonic):
+        """
+            Initialize the generation.
+
+            Args:
+                connections (Sequence[Connection]): Connection to each database, e.g. to each shard.
+                interval (float): Seconds between two reads of the data_version, 0 to read it every time.
+                clock (Callable[[], float]): Source of the current time, in seconds.
+        """
+        self.__connections = list(connections)
+        self.interval = interval
+        self._clock = clock
+        self._generation = 0
+        self._next_read = None
+        self._lock = threading.Lock()
+
+    def __call__(self) -> int:
+        now = self._clock()
+        with self._lock:
+            if self._next_read is None or now >= self._next_read:
+                self._generation = sum(conn.execute("PRAGMA data_version").fetchone()[0]
+                                       for conn in self.__connections)
+                self._next_read = now + self.interval
+            return self._generation
+
+
+class QueryService:
+    """
+        Typed read queries over the word frequencies, for callers asking the same questions over
+        and over, e.g. an API.
+
+        Results are cached by query in a ResultCache. A cached result is served until it expires
+        or the ingest generation changes: by default the generation is the DataVersion of the
+        connection, which sees the commits of every other connection, in any process, within
+        QUERY_DATA_VERSION_INTERVAL seconds. A service reading through the connection a DAO writes
+        to should use the DAO's generation instead, bumped on each of its commits and read without
+        querying SQLite at all.
+
+        Like every query, results exclude the active stopwords. They are shared between callers
+        and immutable.
+    """
+    def __init__(self, conn: Connection, generation: Optional[Callable[[], int]] = None,
+                 cache_size: int = QUERY_CACHE_SIZE, cache_ttl: float = QUERY_CACHE_TTL):
+        """
+            Initialize the service.
+
+            Args:
+                conn (Connection): SQLite database connection object, usually read-only.
+                generation (Callable[[], int], optional): Current ingest generation, e.g.
+                    TextProcessorDAO.get_generation. Defaults to the DataVersion of the connection.
+                cache_size (int): Maximum number of cached results. 0 disables the cache.
+                cache_ttl (float): Seconds a result is cached at most.
+        """
+        self.__conn = conn
+        self.__generation = generation or DataVersion([conn])
+        self.cache = ResultCache(cache_size, cache_ttl)
+
+    def entry_frequencies(self, entry_id: str) -> Tuple[WordCount, ...]:
+        """
+            Get the word frequencies of an entry.
+
+            Args:
+                entry_id (str): Unique identifier for the entry.
+
+            Returns:
+                Tuple[WordCount, ...]: Words of the entry and their frequencies, most frequent
+                first, ties by word. Empty if the entry does not exist.
+
+            Raises:
+                sqlite3.Error: If there's an error in database operations.
+        """
+        return self.cache.get(('entry_frequencies', entry_id), self.__generation(),
+                              lambda: self._entry_frequencies(entry_id))
+
+    def _entry_frequencies(self, entry_id: str) -> Tuple[WordCount, ...]:
+        return tuple(WordCount(*row) for row in self.__conn.execute(
+            "SELECT w.word, f.frequency FROM word_frequencies f JOIN words w ON w.id = f.word_id "
+            f"WHERE f.entry_id = ? AND f.word_id NOT IN ({ACTIVE_STOPWORD_IDS}) "
+            "ORDER BY f.frequency DESC, w.word", (entry_id,)))
+
+    def top_words(self, limit: int = REPORT_LIMIT, source: Optional[str] = None) -> Tuple[WordCount, ...]:
+        """
+            Get the most frequent words of the corpus or of a single source.
+
+            The corpus-wide ones are read from the precomputed totals; the ones of a source are
+            summed over its entries, found through the source index.
+
+            Args:
+                limit (int): Maximum number of words.
+                source (str, optional): Source of the entries. Defaults to every source.
+
+            Returns:
+                Tuple[WordCount, ...]: Words and their total counts, most frequent first.
+
+            Raises:
+                ValueError: If the limit is not positive.
+                sqlite3.Error: If there's an error in database operations.
+        """
+        if limit < 1:
+            raise ValueError(f"Limit must be positive: {limit}")
+        return self.cache.get(('top_words', limit, source), self.__generation(),
+                              lambda: self._top_words(limit, source))
+
+    def _top_words(self, limit: Optional[int], source: Optional[str]) -> Tuple[WordCount, ...]:
+        # No limit (-1 in SQLite) returns every word
+        limit = -1 if limit is None else limit
+        if source is None:
+            sql = ("SELECT w.word, t.total_count FROM word_totals t JOIN words w ON w.id = t.word_id "
+                   f"WHERE t.total_count > 0 AND t.word_id NOT IN ({ACTIVE_STOPWORD_IDS}) "
+                   "ORDER BY t.total_count DESC, t.word_id LIMIT ?")
+            parameters = (limit,)
+        else:
+            sql = ("SELECT w.word, SUM(f.frequency) AS total_count FROM entries e "
+                   "JOIN word_frequencies f ON f.entry_id = e.id JOIN words w ON w.id = f.word_id "
+                   f"WHERE e.source = ? AND f.word_id NOT IN ({ACTIVE_STOPWORD_IDS}) "
+                   "GROUP BY f.word_id ORDER BY total_count DESC, f.word_id LIMIT ?")
+            parameters = (source, limit)
+        return tuple(WordCount(*row) for row in self.__conn.execute(sql, parameters))
+
+    def word_stats(self, word: str) -> WordStats:
+        """
+            Get the total count and document count of a word, matched lowercased like the counted words.
+
+            Args:
+                word (str): Word to look up.
+
+            Returns:
+                WordStats: Statistics of the word, zero if it never occurred or is an active stopword.
+
+            Raises:
+                sqlite3.Error: If there's an error in database operations.
+        """
+        word = word.lower()
+        return self.cache.get(('word_stats', word), self.__generation(), lambda: self._word_stats(word))
+
+    def _word_stats(self, word: str) -> WordStats:
+        row = self.__conn.execute(
+            "SELECT t.total_count, t.document_count FROM word_totals t JOIN words w ON w.id = t.word_id "
+            f"WHERE w.word = ? AND t.word_id NOT IN ({ACTIVE_STOPWORD_IDS})", (word,)).fetchone()
+        return WordStats(word, *(row or (0, 0)))
+
+
+class ShardedQueryService(QueryService):
+    """
+        QueryService over sharded databases, each query being answered by the shard of the entry
+        or merged exactly from every shard.
+
+        The corpus-wide top words are merged by the DAO from the top words of each shard; the top
+        words of a source are summed from every word of the source on each shard, which each shard
+        aggregates anyway before keeping the top ones.
+
+        The other queries run on the caller's thread, so they need their own connection to each
+        shard, e.g. from DatabaseClient.connect_shards_read_only: the DAO uses its connections
+        from its shard threads, where a query could interleave with an open write transaction.
+    """
+    def __init__(self, connections: Sequence[Connection], dao: ShardedTextProcessorDAO,
+                 generation: Optional[Callable[[], int]] = None,
+                 cache_size: int = QUERY_CACHE_SIZE, cache_ttl: float = QUERY_CACHE_TTL):
+        """
+            Initialize the service.
+
+            Args:
+                connections (Sequence[Connection]): Connection to each shard, by shard index, other
+                    than the connections of the DAO.
+                dao (ShardedTextProcessorDAO): DAO over the same shards, merging the top words on its
+                    shard threads.
+                generation (Callable[[], int], optional): Current ingest generation, e.g.
+                    ShardedTextProcessorDAO.get_generation. Defaults to the DataVersion of the shards.
+                cache_size (int): Maximum number of cached results. 0 disables the cache.
+                cache_ttl (float): Seconds a result is cached at most.
+        """
+        super().__init__(connections[0], generation or DataVersion(connections), cache_size, cache_ttl)
+        # Uncached, the results being cached once merged
+        self.__shards = [QueryService(conn, generation=lambda: 0, cache_size=0) for conn in connections]
+        self.__dao = dao
+
+    def _entry_frequencies(self, entry_id: str) -> Tuple[WordCount, ...]:
+        return self.__shards[shard_index(entry_id, len(self.__shards))]._entry_frequencies(entry_id)
+
+    def _top_words(self, limit: Optional[int], source: Optional[str]) -> Tuple[WordCount, ...]:
+        if source is None:
+            return tuple(WordCount(*row) for row in self.__dao.get_top_words(limit))
+        totals: Counter = Counter()
+        for shard in self.__shards:
+            totals.update(dict(shard._top_words(None, source)))
+        return tuple(WordCount(*row) for row in sorted(totals.items(), key=lambda item: (-item[1], item[0]))[:limit])
+
+    def _word_stats(self, word: str) -> WordStats:
+        stats = [shard._word_stats(word) for shard in self.__shards]
+        return WordStats(word, sum(s.total_count for s in stats), sum(s.document_count for s in stats))
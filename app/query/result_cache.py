@@ -0,0 +1,93 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Hashable, Tuple, TypeVar
+
+from app.utils.constants import QUERY_CACHE_SIZE, QUERY_CACHE_TTL
+
+T = TypeVar('T')
+
+
+class ResultCache:
+    """
+        Bounded cache of query results, least recently used first out, each result expiring after
+        a time to live.
+
+        Results are tagged with the ingest generation they were computed at: as soon as a query
+        sees another generation, every cached result is dropped. Safe to share between threads.
+    """
+    def __init__(self, max_entries: int = QUERY_CACHE_SIZE, ttl_seconds: float = QUERY_CACHE_TTL,
+                 clock: Callable[[], float] = time.monotonic):
+        """
+            Initialize the cache.
+
+            Args:
+                max_entries (int): Maximum number of results kept. 0 disables the cache.
+                ttl_seconds (float): Seconds a result is served at most, bounding its staleness
+                    when the generation cannot see every writer.
+                clock (Callable[[], float]): Source of the current time, in seconds.
+
+            Raises:
+                ValueError: If the size is negative or the time to live is not positive.
+        """
+        if max_entries < 0:
+            raise ValueError(f"Cache size must not be negative: {max_entries}")
+        if ttl_seconds <= 0:
+            raise ValueError(f"Time to live must be positive: {ttl_seconds}")
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._clock = clock
+        # Query key -> (expiry time, result), the most recently used last
+        self._results: OrderedDict = OrderedDict()
+        self._generation = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._results)
+
+    def get(self, key: Hashable, generation: int, compute: Callable[[], T]) -> T:
+        """
+            Get the result of a query, computing it on a miss.
+
+            The result is computed without holding the lock, so concurrent misses may compute it
+            more than once; it is only stored if the generation did not change meanwhile.
+
+            Args:
+                key (Hashable): Key of the query, e.g. its name and arguments.
+                generation (int): Current ingest generation.
+                compute (Callable[[], T]): Computes the result.
+
+            Returns:
+                T: The result, shared with other callers.
+        """
+        now = self._clock()
+        with self._lock:
+            if generation != self._generation:
+                self._results.clear()
+                self._generation = generation
+            cached: Tuple[float, T] = self._results.get(key)
+            if cached is not None and cached[0] > now:
+                self._results.move_to_end(key)
+                self.hits += 1
+                return cached[1]
+            self.misses += 1
+
+        result = compute()
+        if not self.max_entries:
+            return result
+        with self._lock:
+            if generation == self._generation:
+                self._results[key] = (now + self.ttl_seconds, result)
+                self._results.move_to_end(key)
+                if len(self._results) > self.max_entries:
+                    self._results.popitem(last=False)
+        return result
+
+    def clear(self) -> None:
+        """
+            Drop every cached result.
+        """
+        with self._lock:
+            self._results.clear()
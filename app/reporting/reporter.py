@@ -0,0 +1,318 @@
+import csv
+import json
+from itertools import islice
+from sqlite3 import Connection
+from typing import Any, Dict, Iterator, List, NamedTuple, Sequence, TextIO, Tuple
+
+from app.sketch.sketches import HeavyHitters
+from app.storage.sharded_dao import ShardedTextProcessorDAO
+from app.storage.text_codec import decompress_text
+from app.storage.text_processor_dao import ACTIVE_STOPWORD_IDS, ACTIVE_STOPWORDS, contains_stopword
+from app.utils.constants import REPORT_PAGE_SIZE
+
+REPORT_FORMATS = ('text', 'jsonl', 'csv')
+
+# Columns that may hold compressed texts, shown decompressed
+COMPRESSED_COLUMNS = ('original_text',)
+
+
+class Report(NamedTuple):
+    """
+        A report: its column names and a lazy iterator over its rows.
+    """
+    columns: Sequence[str]
+    rows: Iterator[Tuple]
+
+
+class Reporter:
+    """
+        Read-only reports over the database, streamed page by page.
+
+        Rows are never loaded all at once: tables are walked with keyset pagination on their
+        primary key, and aggregated views are read by iterating the cursor.
+    """
+    def __init__(self, conn: Connection, page_size: int = REPORT_PAGE_SIZE):
+        """
+            Initialize the reporter.
+
+            Args:
+                conn (Connection): SQLite database connection object.
+                page_size (int): Number of rows fetched per query when walking a table.
+        """
+        if page_size < 1:
+            raise ValueError(f"Page size must be positive: {page_size}")
+        self.__conn = conn
+        self.page_size = page_size
+
+    def table_names(self) -> List[str]:
+        """
+            Get the names of the tables of the database.
+
+            Returns:
+                List[str]: Table names, in alphabetical order.
+        """
+        return [row[0] for row in self.__conn.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%' ORDER BY name")]
+
+    def summary(self) -> Report:
+        """
+            Row count of every table.
+
+            Returns:
+                Report: One (table, rows) row per table.
+        """
+        def rows() -> Iterator[Tuple]:
+            for table_name in self.table_names():
+                yield table_name, self.__conn.execute(f'SELECT COUNT(*) FROM "{table_name}"').fetchone()[0]
+        return Report(('table', 'rows'), rows())
+
+    def top_words(self, limit: int) -> Report:
+        """
+            Most frequent words of the corpus, read from the precomputed totals, excluding the
+            active stopwords.
+
+            Args:
+                limit (int): Maximum number of words.
+
+            Returns:
+                Report: (word, total_count, document_count) rows, most frequent first.
+        """
+        cursor = self.__conn.execute(
+            "SELECT w.word, t.total_count, t.document_count FROM word_totals t JOIN words w ON w.id = t.word_id "
+            f"WHERE t.total_count > 0 AND t.word_id NOT IN ({ACTIVE_STOPWORD_IDS}) "
+            "ORDER BY t.total_count DESC, t.word_id LIMIT ?", (limit,))
+        return Report(('word', 'total_count', 'document_count'), iter(cursor))
+
+    def top_ngrams(self, limit: int) -> Report:
+        """
+            Most frequent n-grams of the n-gram mode, read from the pruned totals, excluding the
+            ones containing an active stopword.
+
+            Args:
+                limit (int): Maximum number of n-grams.
+
+            Returns:
+                Report: (ngram, n, total_count, document_count) rows, most frequent first.
+        """
+        stopwords = frozenset(row[0] for row in self.__conn.execute(ACTIVE_STOPWORDS))
+        cursor = self.__conn.execute(
+            "SELECT g.ngram, g.n, t.total_count, t.document_count FROM ngram_totals t "
+            "JOIN ngrams g ON g.id = t.ngram_id WHERE t.total_count > 0 "
+            "ORDER BY t.total_count DESC, t.ngram_id")
+        rows = (row for row in cursor if not contains_stopword(row[0], stopwords))
+        return Report(('ngram', 'n', 'total_count', 'document_count'), islice(rows, limit))
+
+    def heavy_hitters(self, limit: int) -> Report:
+        """
+            Most frequent words estimated by the sketches of the heavy-hitters mode, excluding the
+            active stopwords.
+
+            Args:
+                limit (int): Maximum number of words.
+
+            Returns:
+                Report: (word, estimate, lower_bound) rows, most frequent first; each word occurred
+                between lower_bound and estimate times.
+        """
+        heavy_hitters = HeavyHitters.from_blobs(dict(self.__conn.execute("SELECT name, data FROM sketches")))
+        stopwords = {row[0] for row in self.__conn.execute(ACTIVE_STOPWORDS)}
+        rows = (hitter for hitter in heavy_hitters.top() if hitter.word not in stopwords)
+        return Report(('word', 'estimate', 'lower_bound'), islice(rows, limit))
+
+    def source_stats(self) -> Report:
+        """
+            Number of entries, words and distinct words of each source, excluding the active stopwords.
+
+            Returns:
+                Report: (source, entries, words, distinct_words) rows, ordered by source.
+        """
+        cursor = self.__conn.execute(
+            "SELECT e.source, COUNT(DISTINCT e.id), COALESCE(SUM(f.frequency), 0), COUNT(DISTINCT f.word_id) "
+            "FROM entries e LEFT JOIN word_frequencies f ON f.entry_id = e.id "
+            f"AND f.word_id NOT IN ({ACTIVE_STOPWORD_IDS}) "
+            "GROUP BY e.source ORDER BY e.source")
+        return Report(('source', 'entries', 'words', 'distinct_words'), iter(cursor))
+
+    def table(self, table_name: str) -> Report:
+        """
+            Every row of a table, walked in primary key order with keyset pagination.
+
+            Args:
+                table_name (str): Name of the table.
+
+            Returns:
+                Report: The columns and rows of the table.
+
+            Raises:
+                ValueError: If the table does not exist.
+        """
+        if table_name not in self.table_names():
+            raise ValueError(f"Unknown table: {table_name}")
+
+        table_info = self.__conn.execute(f'PRAGMA table_info("{table_name}")').fetchall()
+        columns = [column[1] for column in table_info]
+        key_columns = [column[1] for column in sorted(table_info, key=lambda column: column[5]) if column[5]]
+        rows = self._iter_pages(table_name, columns, key_columns)
+        compressed = [index for index, column in enumerate(columns) if column in COMPRESSED_COLUMNS]
+        if compressed:
+            rows = (tuple(decompress_text(value) if index in compressed else value for index, value in enumerate(row))
+                    for row in rows)
+        return Report(columns, rows)
+
+    def _iter_pages(self, table_name: str, columns: List[str], key_columns: List[str]) -> Iterator[Tuple]:
+        """
+            Walk a table page by page, resuming each page after the key of the previous one.
+
+            Tables without a primary key are walked by rowid.
+
+            Args:
+                table_name (str): Name of the table.
+                columns (List[str]): Columns to be returned.
+                key_columns (List[str]): Primary key columns of the table.
+
+            Yields:
+                Tuple: Rows of the table.
+        """
+        selected = ', '.join(f'"{column}"' for column in columns)
+        if not key_columns:
+            key_columns = ['rowid']
+            selected = f'{selected}, rowid'
+        key = ', '.join(f'"{column}"' if column != 'rowid' else column for column in key_columns)
+        key_size = len(key_columns)
+        key_indexes = [(columns + ['rowid']).index(column) for column in key_columns]
+
+        query = f'SELECT {selected} FROM "{table_name}" ORDER BY {key} LIMIT ?'
+        page = self.__conn.execute(query, (self.page_size,)).fetchall()
+        while page:
+            for row in page:
+                yield row[:len(columns)]
+            last_key = [page[-1][index] for index in key_indexes]
+            page = self.__conn.execute(
+                f'SELECT {selected} FROM "{table_name}" WHERE ({key}) > ({", ".join("?" * key_size)}) '
+                f'ORDER BY {key} LIMIT ?', (*last_key, self.page_size)).fetchall()
+
+
+class ShardedReporter:
+    """
+        Reports over sharded databases, merged from every shard.
+
+        Only the views that can be merged exactly are available: row counts, top words and
+        n-grams, and the heavy hitters of the merged sketches.
+    """
+    def __init__(self, connections: Sequence[Connection], dao: ShardedTextProcessorDAO):
+        """
+            Initialize the reporter.
+
+            Args:
+                connections (Sequence[Connection]): Connection to each shard, by shard index.
+                dao (ShardedTextProcessorDAO): DAO over the same connections, fanning the reads out.
+        """
+        self.__reporters = [Reporter(conn) for conn in connections]
+        self.__dao = dao
+
+    def summary(self) -> Report:
+        """
+            Row count of every table, summed over the shards.
+
+            Returns:
+                Report: One (table, rows) row per table.
+        """
+        totals: Dict[str, int] = {}
+        for reporter in self.__reporters:
+            for table_name, rows in reporter.summary().rows:
+                totals[table_name] = totals.get(table_name, 0) + rows
+        return Report(('table', 'rows'), iter(totals.items()))
+
+    def top_words(self, limit: int) -> Report:
+        """
+            Most frequent words over every shard, excluding the active stopwords.
+
+            Args:
+                limit (int): Maximum number of words.
+
+            Returns:
+                Report: (word, total_count, document_count) rows, most frequent first.
+        """
+        rows = [(word, total_count, self.__dao.get_document_frequency(word))
+                for word, total_count in self.__dao.get_top_words(limit)]
+        return Report(('word', 'total_count', 'document_count'), iter(rows))
+
+    def top_ngrams(self, limit: int) -> Report:
+        """
+            Most frequent n-grams over every shard, each shard having pruned its own.
+
+            Args:
+                limit (int): Maximum number of n-grams.
+
+            Returns:
+                Report: (ngram, n, total_count, document_count) rows, most frequent first.
+        """
+        rows = [(ngram, ngram.count(' ') + 1, total_count, self.__dao.get_ngram_document_frequency(ngram))
+                for ngram, total_count in self.__dao.get_top_ngrams(limit)]
+        return Report(('ngram', 'n', 'total_count', 'document_count'), iter(rows))
+
+    def heavy_hitters(self, limit: int) -> Report:
+        """
+            Most frequent words estimated by the merged sketches of every shard, excluding the
+            active stopwords.
+
+            Args:
+                limit (int): Maximum number of words.
+
+            Returns:
+                Report: (word, estimate, lower_bound) rows, most frequent first.
+        """
+        stopwords = self.__dao.get_stopwords().words
+        rows = (hitter for hitter in self.__dao.get_heavy_hitters().top() if hitter.word not in stopwords)
+        return Report(('word', 'estimate', 'lower_bound'), islice(rows, limit))
+
+
+def write_report(report: Report, output_format: str, stream: TextIO) -> int:
+    """
+        Write a report to a stream, one row at a time.
+
+        Args:
+            report (Report): Report to be written.
+            output_format (str): One of 'text', 'jsonl' or 'csv'.
+            stream (TextIO): Destination of the report.
+
+        Returns:
+            int: Number of rows written.
+
+        Raises:
+            ValueError: If the output format is not supported.
+    """
+    if output_format not in REPORT_FORMATS:
+        raise ValueError(f"Unsupported report format: {output_format}")
+
+    written = 0
+    if output_format == 'csv':
+        writer = csv.writer(stream)
+        writer.writerow(report.columns)
+        for row in report.rows:
+            writer.writerow(row)
+            written += 1
+    elif output_format == 'jsonl':
+        for row in report.rows:
+            stream.write(json.dumps(dict(zip(report.columns, map(_to_json, row))), ensure_ascii=False) + '\n')
+            written += 1
+    else:
+        stream.write('\t'.join(report.columns) + '\n')
+        for row in report.rows:
+            stream.write('\t'.join(str(value) for value in row) + '\n')
+            written += 1
+    return written
+
+
+def _to_json(value: Any) -> Any:
+    """
+        Convert a SQLite value to a JSON serializable one.
+
+        Args:
+            value (Any): Value read from SQLite.
+
+        Returns:
+            Any: The value, with BLOBs as hexadecimal strings.
+    """
+    return value.hex() if isinstance(value, bytes) else value
+
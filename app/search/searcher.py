@@ -0,0 +1,277 @@
+import heapq
+import math
+from sqlite3 import Connection
+from typing import Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+from app.processor.tokenizer import Tokenizer
+from app.storage.text_processor_dao import ACTIVE_STOPWORDS, ENTRY_COUNT
+from app.utils.constants import SEARCH_LIMIT
+
+SEARCH_OPERATORS = ('and', 'or')
+
+
+class SearchHit(NamedTuple):
+    """
+        An entry matching a search, with its relevance score.
+    """
+    entry_id: str
+    score: float
+
+
+class SearchCursor(NamedTuple):
+    """
+        Position after the last hit of a page, from which the next page starts.
+    """
+    score: float
+    entry_id: str
+
+    def encode(self) -> str:
+        """
+            Encode the cursor as an opaque string, e.g. for the command line.
+
+            Returns:
+                str: The score, exactly as computed, and the entry id.
+        """
+        return f"{self.score!r}:{self.entry_id}"
+
+    @staticmethod
+    def decode(cursor: str) -> 'SearchCursor':
+        """
+            Decode a cursor encoded by `encode`.
+
+            Args:
+                cursor (str): Encoded cursor.
+
+            Returns:
+                SearchCursor: The decoded cursor.
+
+            Raises:
+                ValueError: If the cursor is malformed.
+        """
+        score, separator, entry_id = cursor.partition(':')
+        if not separator:
+            raise ValueError(f"Invalid search cursor: {cursor}")
+        return SearchCursor(float(score), entry_id)
+
+
+class SearchPage(NamedTuple):
+    """
+        A page of search results, best first, and the cursor of the next page if there is one.
+    """
+    hits: List[SearchHit]
+    next_cursor: Optional[SearchCursor]
+
+
+class _Term(NamedTuple):
+    word_id: int
+    weight: float
+
+
+class Searcher:
+    """
+        Ranked AND/OR term search over the ingested entries.
+
+        The index is 'word_frequencies' itself: its (word_id, frequency) index, maintained by the
+        DAO in the same transactions as the entries, is a posting list of each word sorted by
+        frequency. An entry scores the sum over the query terms of their frequency in the entry
+        weighted by their inverse document frequency, read from 'word_totals'.
+
+        The best entries are found with the threshold algorithm: the posting lists are read
+        from the highest frequency down, each newly seen entry is scored with primary key
+        lookups of its other frequencies, and reading stops as soon as no unseen entry can make
+        it into the page. Pages are a handful of queries on common words, whatever the size of
+        the corpus.
+    """
+    def __init__(self, conn: Connection):
+        """
+            Initialize the searcher.
+
+            Args:
+                conn (Connection): SQLite database connection object, usually read-only.
+        """
+        self.__conn = conn
+        # Query terms are split like the texts, stopwords being dropped at query time
+        self.__tokenizer = Tokenizer(stopwords=())
+        # Number of entries, read once for the inverse document frequencies
+        self.__entry_count: Optional[int] = None
+
+    def search(self, query: str, operator: str = 'and', limit: int = SEARCH_LIMIT,
+               after: Optional[SearchCursor] = None) -> SearchPage:
+        """
+            Find the entries containing all ('and') or any ('or') of the words of a query.
+
+            Numbers, emojis and the active stopwords of the query are ignored, like in the counts.
+
+            Args:
+                query (str): Words to search for.
+                operator (str): 'and' or 'or'.
+                limit (int): Maximum number of hits of the page.
+                after (SearchCursor, optional): Cursor of the previous page. Defaults to the first page.
+
+            Returns:
+                SearchPage: Hits ranked by decreasing score, ties by decreasing entry id.
+
+            Raises:
+                ValueError: If the operator or the limit is invalid.
+        """
+        if operator not in SEARCH_OPERATORS:
+            raise ValueError(f"Unknown search operator: {operator}")
+        if limit < 1:
+            raise ValueError(f"Limit must be positive: {limit}")
+        words = list(dict.fromkeys(self.__tokenizer.words(query)))
+        stopwords = {row[0] for row in self.__conn.execute(ACTIVE_STOPWORDS)}
+        words = [word for word in words if word not in stopwords]
+        terms = self._resolve_terms(words)
+        if not terms or (operator == 'and' and len(terms) < len(words)):
+            return SearchPage([], None)
+
+        # One more hit than the page tells whether there is a next page
+        hits = self._top_hits(terms, operator == 'and', limit + 1, after)
+        if len(hits) <= limit:
+            return SearchPage(hits, None)
+        hits = hits[:limit]
+        return SearchPage(hits, SearchCursor(hits[-1].score, hits[-1].entry_id))
+
+    def _resolve_terms(self, words: List[str]) -> List[_Term]:
+        """
+            Look up the ids and weights of the query words that occur in the corpus.
+
+            Args:
+                words (List[str]): Distinct words of the query.
+
+            Returns:
+                List[_Term]: Id and inverse document frequency of each word found, in query order.
+        """
+        if not words:
+            return []
+        rows: Dict[str, Tuple[int, int]] = {
+            word: (word_id, document_count) for word, word_id, document_count in self.__conn.execute(
+                "SELECT w.word, w.id, t.document_count FROM words w JOIN word_totals t ON t.word_id = w.id "
+                f"WHERE t.document_count > 0 AND w.word IN ({', '.join('?' * len(words))})", words)}
+        entries = self._entry_count()
+        # BM25's inverse document frequency, positive even for words in every entry
+        return [_Term(rows[word][0], math.log(1 + (entries - rows[word][1] + 0.5) / (rows[word][1] + 0.5)))
+                for word in words if word in rows]
+
+    def _entry_count(self) -> int:
+        """
+            Get the number of entries, read once per searcher from the count maintained on ingestion.
+
+            Returns:
+                int: Number of entries.
+        """
+        if self.__entry_count is None:
+            self.__entry_count = self.__conn.execute(ENTRY_COUNT).fetchone()[0]
+        return self.__entry_count
+
+    def _postings(self, word_id: int) -> Iterator[Tuple[str, int]]:
+        """
+            Stream the posting list of a word, highest frequency first, ties by decreasing entry id.
+
+            Args:
+                word_id (int): Id of the word.
+
+            Yields:
+                Tuple[str, int]: Entry id and frequency of the word in the entry.
+        """
+        # The index is read backwards: no sorting, whatever the length of the list
+        yield from self.__conn.execute(
+            "SELECT entry_id, frequency FROM word_frequencies INDEXED BY idx_word_frequencies_word "
+            "WHERE word_id = ? ORDER BY frequency DESC, entry_id DESC", (word_id,))
+
+    def _frequency(self, entry_id: str, word_id: int) -> int:
+        """
+            Look up the frequency of a word in an entry through the primary key.
+
+            Returns:
+                int: Frequency, 0 if the entry does not contain the word.
+        """
+        row = self.__conn.execute("SELECT frequency FROM word_frequencies WHERE entry_id = ? AND word_id = ?",
+                                  (entry_id, word_id)).fetchone()
+        return row[0] if row else 0
+
+    def _top_hits(self, terms: List[_Term], match_all: bool, limit: int,
+                  after: Optional[SearchCursor]) -> List[SearchHit]:
+        """
+            Run the threshold algorithm over the posting lists of the terms.
+
+            Hits are ordered by (score, entry id), both decreasing. Scores are always summed in
+            term order, so an entry and the threshold it is compared with add up the same floats.
+
+            Args:
+                terms (List[_Term]): Query terms.
+                match_all (bool): Whether hits must contain every term.
+                limit (int): Maximum number of hits.
+                after (SearchCursor, optional): Only hits ranked after this cursor are returned.
+
+            Returns:
+                List[SearchHit]: Best hits, best first.
+        """
+        bound = (after.score, after.entry_id) if after else None
+        postings: List[Optional[Iterator[Tuple[str, int]]]] = [self._postings(term.word_id) for term in terms]
+        # Frequency and entry id last read from each list, i.e. the best an unseen entry can have there
+        levels: List[Optional[Tuple[int, str]]] = [None] * len(terms)
+        seen = set()
+        # Min-heap of the best (score, entry id) found so far
+        best: List[Tuple[float, str]] = []
+
+        while any(postings):
+            for index, posting in enumerate(postings):
+                if posting is None:
+                    continue
+                row = next(posting, None)
+                if row is None:
+                    postings[index] = None
+                    levels[index] = None
+                    continue
+                entry_id, frequency = row
+                levels[index] = (frequency, entry_id)
+                if entry_id in seen:
+                    continue
+                seen.add(entry_id)
+                key = self._score(terms, index, entry_id, frequency, match_all)
+                if key is None or (bound and key >= bound):
+                    continue
+                if len(best) < limit:
+                    heapq.heappush(best, key)
+                elif key > best[0]:
+                    heapq.heapreplace(best, key)
+
+            # Every entry of an exhausted list was seen, so no unseen entry contains all the terms
+            if match_all and not all(postings):
+                break
+            if len(best) == limit and best[0] >= self._threshold(terms, levels):
+                break
+
+        return [SearchHit(entry_id, score) for score, entry_id in sorted(best, reverse=True)]
+
+    def _score(self, terms: List[_Term], index: int, entry_id: str, frequency: int,
+               match_all: bool) -> Optional[Tuple[float, str]]:
+        """
+            Score an entry read from the posting list of one term, looking up its other terms.
+
+            Returns:
+                Optional[Tuple[float, str]]: Score and entry id, or None if the entry lacks a term
+                and every term is required.
+        """
+        score = 0.0
+        for other, term in enumerate(terms):
+            term_frequency = frequency if other == index else self._frequency(entry_id, term.word_id)
+            if not term_frequency and match_all:
+                return None
+            score += term.weight * term_frequency
+        return score, entry_id
+
+    @staticmethod
+    def _threshold(terms: List[_Term], levels: List[Optional[Tuple[int, str]]]) -> Tuple[float, str]:
+        """
+            Best (score, entry id) an entry not seen yet could have.
+
+            Such an entry is at or below the current level of every list. It can only reach the
+            threshold score by sitting at the current frequency of every list not exhausted, and
+            then comes after the entry last read there, so its id is smaller than theirs.
+        """
+        score = 0.0
+        for term, level in zip(terms, levels):
+            score += term.weight * (level[0] if level else 0)
+        return score, min((level[1] for level in levels if level), default='')
@@ -0,0 +1,518 @@
+import hashlib
+import heapq
+import math
+import struct
+import sys
+from array import array
+from operator import add
+from typing import Dict, List, Mapping, NamedTuple, Optional, Tuple
+
+from app.utils.constants import TOP_WORDS_EPSILON, WORD_COUNTS_DELTA, WORD_COUNTS_EPSILON
+
+# Serialized sketches start with a magic number identifying their type and a format version
+SPACE_SAVING_MAGIC = b'WFSS'
+COUNT_MIN_MAGIC = b'WFCM'
+FORMAT_VERSION = 1
+
+# Magic, version, capacity, total and number of counters, followed by the counters
+_SPACE_SAVING_HEADER = struct.Struct('<4sBIQI')
+# Count, error and length of the UTF-8 encoded word, followed by the word
+_SPACE_SAVING_COUNTER = struct.Struct('<QQI')
+# Magic, version, width, depth and total, followed by the little-endian 64-bit counters, row by row
+_COUNT_MIN_HEADER = struct.Struct('<4sBIIQ')
+
+# Names of the sketches of HeavyHitters in the 'sketches' table
+TOP_WORDS_SKETCH = 'top_words'
+WORD_COUNTS_SKETCH = 'word_counts'
+
+
+class HeavyHitter(NamedTuple):
+    """
+        An approximate word count: the word occurred between `lower_bound` and `estimate` times.
+    """
+    word: str
+    estimate: int
+    lower_bound: int
+
+
+class SpaceSaving:
+    """
+        Space-Saving summary of the most frequent words of a stream, in fixed memory.
+
+        At most `capacity` words are counted. A word that is not counted yet replaces the least
+        frequent one and inherits its count as error, so counts are overestimated by at most
+        total / capacity, and every word occurring more often than that is counted.
+    """
+    def __init__(self, capacity: int):
+        """
+            Initialize an empty summary.
+
+            Args:
+                capacity (int): Maximum number of words counted.
+        """
+        if capacity < 1:
+            raise ValueError(f"Capacity must be positive: {capacity}")
+        self.capacity = capacity
+        self.total = 0
+        self._counts: Dict[str, int] = {}
+        self._errors: Dict[str, int] = {}
+        # One (count, word) entry per counted word, whose count may be lower than the current one
+        self._heap: List[Tuple[int, str]] = []
+
+    @classmethod
+    def from_error(cls, epsilon: float) -> 'SpaceSaving':
+        """
+            Create a summary overestimating counts by at most `epsilon` times the total.
+
+            Args:
+                epsilon (float): Relative error bound, between 0 and 1.
+
+            Returns:
+                SpaceSaving: Empty summary.
+        """
+        if not 0 < epsilon < 1:
+            raise ValueError(f"Error bound must be between 0 and 1: {epsilon}")
+        return cls(math.ceil(1 / epsilon))
+
+    def update(self, word: str, count: int = 1) -> None:
+        """
+            Count occurrences of a word.
+
+            Args:
+                word (str): Word.
+                count (int): Number of occurrences, ignored if not positive.
+        """
+        self.update_counts({word: count})
+
+    def update_counts(self, counts: Mapping[str, int]) -> None:
+        """
+            Count the occurrences of several words, e.g. the word frequencies of a batch.
+
+            Args:
+                counts (Mapping[str, int]): Number of occurrences of each word, ignored if not positive.
+        """
+        tracked = self._counts
+        errors = self._errors
+        heap = self._heap
+        for word, count in counts.items():
+            if count <= 0:
+                continue
+            self.total += count
+            if word in tracked:
+                tracked[word] += count
+            elif len(tracked) < self.capacity:
+                tracked[word] = count
+                errors[word] = 0
+                heapq.heappush(heap, (count, word))
+            else:
+                minimum, evicted = self._minimum()
+                del tracked[evicted], errors[evicted]
+                tracked[word] = minimum + count
+                errors[word] = minimum
+                heapq.heapreplace(heap, (minimum + count, word))
+
+    def _minimum(self) -> Tuple[int, str]:
+        """
+            Find the least frequent word, refreshing the outdated heap entries on the way.
+
+            Returns:
+                Tuple[int, str]: Its count and the word, left at the top of the heap.
+        """
+        heap = self._heap
+        while True:
+            count, word = heap[0]
+            current = self._counts[word]
+            if current == count:
+                return count, word
+            heapq.heapreplace(heap, (current, word))
+
+    def _floor(self) -> int:
+        """
+            Returns:
+                int: Upper bound of the count of any word not counted by the summary.
+        """
+        return min(self._counts.values()) if len(self._counts) >= self.capacity else 0
+
+    def estimate(self, word: str) -> int:
+        """
+            Get an upper bound of the number of occurrences of a word.
+
+            Args:
+                word (str): Word.
+
+            Returns:
+                int: Estimated count, never lower than the actual one.
+        """
+        return self._counts.get(word, self._floor())
+
+    def top(self, limit: Optional[int] = None) -> List[HeavyHitter]:
+        """
+            Get the most frequent words.
+
+            Args:
+                limit (int, optional): Maximum number of words. Defaults to every counted word.
+
+            Returns:
+                List[HeavyHitter]: Words with the bounds of their counts, most frequent first.
+        """
+        words = sorted(self._counts.items(), key=lambda item: (-item[1], item[0]))[:limit]
+        return [HeavyHitter(word, count, count - self._errors[word]) for word, count in words]
+
+    def merge(self, other: 'SpaceSaving') -> 'SpaceSaving':
+        """
+            Add the words counted by another summary, e.g. of another process or run.
+
+            A word counted by only one of the summaries gets the floor of the other as count and
+            error, then the `capacity` most frequent words are kept, so the merged summary has the
+            same error bound as one summary of both streams.
+
+            Args:
+                other (SpaceSaving): Summary to be added, left unchanged.
+
+            Returns:
+                SpaceSaving: This summary.
+        """
+        own_floor, other_floor = self._floor(), other._floor()
+        counts = {}
+        errors = {}
+        for word in self._counts.keys() | other._counts.keys():
+            counts[word] = self._counts.get(word, own_floor) + other._counts.get(word, other_floor)
+            errors[word] = self._errors.get(word, own_floor) + other._errors.get(word, other_floor)
+        kept = heapq.nlargest(self.capacity, counts, key=lambda word: (counts[word], word))
+        self._counts = {word: counts[word] for word in kept}
+        self._errors = {word: errors[word] for word in kept}
+        self._heap = [(count, word) for word, count in self._counts.items()]
+        heapq.heapify(self._heap)
+        self.total += other.total
+        return self
+
+    def to_bytes(self) -> bytes:
+        """
+            Serialize the summary, e.g. to be stored as a BLOB.
+
+            Returns:
+                bytes: The summary, read back by from_bytes.
+        """
+        parts = [_SPACE_SAVING_HEADER.pack(SPACE_SAVING_MAGIC, FORMAT_VERSION, self.capacity, self.total,
+                                           len(self._counts))]
+        for word, count in self._counts.items():
+            encoded = word.encode('utf-8')
+            parts += [_SPACE_SAVING_COUNTER.pack(count, self._errors[word], len(encoded)), encoded]
+        return b''.join(parts)
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> 'SpaceSaving':
+        """
+            Deserialize a summary written by to_bytes.
+
+            Args:
+                data (bytes): Serialized summary.
+
+            Returns:
+                SpaceSaving: The summary.
+
+            Raises:
+                ValueError: If the data is not a serialized summary.
+        """
+        try:
+            _, _, capacity, total, size = _unpack_header(data, _SPACE_SAVING_HEADER, SPACE_SAVING_MAGIC)
+            summary = cls(capacity)
+            summary.total = total
+            offset = _SPACE_SAVING_HEADER.size
+            for _ in range(size):
+                count, error, length = _SPACE_SAVING_COUNTER.unpack_from(data, offset)
+                offset += _SPACE_SAVING_COUNTER.size
+                word = data[offset:offset + length].decode('utf-8')
+                offset += length
+                summary._counts[word] = count
+                summary._errors[word] = error
+        except (struct.error, UnicodeDecodeError) as e:
+            raise ValueError(f"Invalid Space-Saving summary: {e}")
+        summary._heap = [(count, word) for word, count in summary._counts.items()]
+        heapq.heapify(summary._heap)
+        return summary
+
+
+class CountMinSketch:
+    """
+        Count-Min sketch of word counts, in fixed memory.
+
+        Each word is counted in one cell of each of the `depth` rows of `width` counters, and its
+        estimate is its smallest cell. Estimates are never too low, and are too high by more than
+        e / width times the total with a probability of at most exp(-depth).
+    """
+    def __init__(self, width: int, depth: int):
+        """
+            Initialize an empty sketch.
+
+            Args:
+                width (int): Number of counters per row.
+                depth (int): Number of rows.
+        """
+        if width < 1 or depth < 1:
+            raise ValueError(f"Width and depth must be positive: {width}, {depth}")
+        self.width = width
+        self.depth = depth
+        self.total = 0
+        self._table = array('Q', bytes(8 * width * depth))
+
+    @classmethod
+    def from_error(cls, epsilon: float, delta: float) -> 'CountMinSketch':
+        """
+            Create a sketch overestimating counts by at most `epsilon` times the total, with a
+            probability of at least 1 - `delta`.
+
+            Args:
+                epsilon (float): Relative error bound, between 0 and 1.
+                delta (float): Probability of exceeding the error bound, between 0 and 1.
+
+            Returns:
+                CountMinSketch: Empty sketch.
+        """
+        if not 0 < epsilon < 1 or not 0 < delta < 1:
+            raise ValueError(f"Error bound and probability must be between 0 and 1: {epsilon}, {delta}")
+        return cls(math.ceil(math.e / epsilon), math.ceil(math.log(1 / delta)))
+
+    def _cells(self, word: str) -> List[int]:
+        """
+            Indexes of the cells of a word, one per row.
+
+            The word is hashed once, with a hash that is the same in every process, and the index
+            of each row is derived from the two halves of the hash: the first one is the index in
+            the first row, the second one the step between rows, between 1 and width - 1 so that
+            the word is never counted in the same column of every row.
+        """
+        digest = hashlib.blake2b(word.encode('utf-8'), digest_size=16).digest()
+        width = self.width
+        index = int.from_bytes(digest[:8], 'little') % width
+        step = int.from_bytes(digest[8:], 'little') % (width - 1) + 1 if width > 1 else 0
+        cells = []
+        for offset in range(0, width * self.depth, width):
+            cells.append(offset + index)
+            index = (index + step) % width
+        return cells
+
+    def update(self, word: str, count: int = 1) -> None:
+        """
+            Count occurrences of a word.
+
+            Args:
+                word (str): Word.
+                count (int): Number of occurrences, ignored if not positive.
+        """
+        self.update_counts({word: count})
+
+    def update_counts(self, counts: Mapping[str, int]) -> None:
+        """
+            Count the occurrences of several words, e.g. the word frequencies of a batch.
+
+            Args:
+                counts (Mapping[str, int]): Number of occurrences of each word, ignored if not positive.
+        """
+        table = self._table
+        cells = self._cells
+        for word, count in counts.items():
+            if count > 0:
+                self.total += count
+                for cell in cells(word):
+                    table[cell] += count
+
+    def estimate(self, word: str) -> int:
+        """
+            Get an upper bound of the number of occurrences of a word.
+
+            Args:
+                word (str): Word.
+
+            Returns:
+                int: Estimated count, never lower than the actual one.
+        """
+        table = self._table
+        return min(table[cell] for cell in self._cells(word))
+
+    def error_bound(self) -> int:
+        """
+            Returns:
+                int: Overestimation of a count not exceeded with a probability of 1 - exp(-depth).
+        """
+        return math.ceil(math.e / self.width * self.total)
+
+    def merge(self, other: 'CountMinSketch') -> 'CountMinSketch':
+        """
+            Add the words counted by another sketch of the same dimensions, e.g. of another process or run.
+
+            Args:
+                other (CountMinSketch): Sketch to be added, left unchanged.
+
+            Returns:
+                CountMinSketch: This sketch.
+
+            Raises:
+                ValueError: If the dimensions of the sketches differ.
+        """
+        if (self.width, self.depth) != (other.width, other.depth):
+            raise ValueError(f"Cannot merge a {other.width}x{other.depth} sketch into a "
+                             f"{self.width}x{self.depth} sketch")
+        self._table = array('Q', map(add, self._table, other._table))
+        self.total += other.total
+        return self
+
+    def to_bytes(self) -> bytes:
+        """
+            Serialize the sketch, e.g. to be stored as a BLOB.
+
+            Returns:
+                bytes: The sketch, read back by from_bytes.
+        """
+        table = self._table
+        if sys.byteorder == 'big':
+            table = array('Q', table)
+            table.byteswap()
+        return _COUNT_MIN_HEADER.pack(COUNT_MIN_MAGIC, FORMAT_VERSION, self.width, self.depth,
+                                      self.total) + table.tobytes()
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> 'CountMinSketch':
+        """
+            Deserialize a sketch written by to_bytes.
+
+            Args:
+                data (bytes): Serialized sketch.
+
+            Returns:
+                CountMinSketch: The sketch.
+
+            Raises:
+                ValueError: If the data is not a serialized sketch.
+        """
+        try:
+            _, _, width, depth, total = _unpack_header(data, _COUNT_MIN_HEADER, COUNT_MIN_MAGIC)
+        except struct.error as e:
+            raise ValueError(f"Invalid Count-Min sketch: {e}")
+        counters = data[_COUNT_MIN_HEADER.size:]
+        if len(counters) != 8 * width * depth:
+            raise ValueError(f"Invalid Count-Min sketch: {len(counters)} bytes of counters for {width}x{depth}")
+        sketch = cls(width, depth)
+        sketch.total = total
+        sketch._table = array('Q', counters)
+        if sys.byteorder == 'big':
+            sketch._table.byteswap()
+        return sketch
+
+
+class HeavyHitters:
+    """
+        Approximate corpus-wide word counts in fixed memory: a Space-Saving summary of the top
+        words and a Count-Min sketch answering point queries about any word.
+
+        Both are mergeable, so the sketches of several processes, runs or databases add up.
+    """
+    def __init__(self, top_words: Optional[SpaceSaving] = None, word_counts: Optional[CountMinSketch] = None):
+        """
+            Initialize the sketches.
+
+            Args:
+                top_words (SpaceSaving, optional): Summary of the top words. Defaults to an empty one
+                    with the error bound TOP_WORDS_EPSILON.
+                word_counts (CountMinSketch, optional): Sketch of every word count. Defaults to an
+                    empty one with the error bound WORD_COUNTS_EPSILON and WORD_COUNTS_DELTA.
+        """
+        self.top_words = top_words or SpaceSaving.from_error(TOP_WORDS_EPSILON)
+        self.word_counts = word_counts or CountMinSketch.from_error(WORD_COUNTS_EPSILON, WORD_COUNTS_DELTA)
+
+    def update_counts(self, counts: Mapping[str, int]) -> None:
+        """
+            Count the occurrences of several words, e.g. the word frequencies of a batch.
+
+            Args:
+                counts (Mapping[str, int]): Number of occurrences of each word.
+        """
+        self.top_words.update_counts(counts)
+        self.word_counts.update_counts(counts)
+
+    def estimate(self, word: str) -> int:
+        """
+            Get an upper bound of the number of occurrences of a word, the lowest of both sketches.
+
+            Args:
+                word (str): Word.
+
+            Returns:
+                int: Estimated count, never lower than the actual one.
+        """
+        return min(self.top_words.estimate(word), self.word_counts.estimate(word))
+
+    def top(self, limit: Optional[int] = None) -> List[HeavyHitter]:
+        """
+            Get the most frequent words, their estimates tightened by the Count-Min sketch.
+
+            Args:
+                limit (int, optional): Maximum number of words. Defaults to every counted word.
+
+            Returns:
+                List[HeavyHitter]: Words with the bounds of their counts, most frequent first.
+        """
+        return [hitter._replace(estimate=min(hitter.estimate, self.word_counts.estimate(hitter.word)))
+                for hitter in self.top_words.top(limit)]
+
+    def merge(self, other: 'HeavyHitters') -> 'HeavyHitters':
+        """
+            Add the words counted by other sketches.
+
+            Args:
+                other (HeavyHitters): Sketches to be added, left unchanged.
+
+            Returns:
+                HeavyHitters: These sketches.
+
+            Raises:
+                ValueError: If the dimensions of the Count-Min sketches differ.
+        """
+        # The Count-Min sketches are merged first, as they are the ones that may not match
+        self.word_counts.merge(other.word_counts)
+        self.top_words.merge(other.top_words)
+        return self
+
+    def to_blobs(self) -> Dict[str, bytes]:
+        """
+            Serialize the sketches.
+
+            Returns:
+                Dict[str, bytes]: Serialized sketch by name.
+        """
+        return {TOP_WORDS_SKETCH: self.top_words.to_bytes(), WORD_COUNTS_SKETCH: self.word_counts.to_bytes()}
+
+    @classmethod
+    def from_blobs(cls, blobs: Mapping[str, bytes]) -> 'HeavyHitters':
+        """
+            Deserialize sketches written by to_blobs. Missing sketches are created empty.
+
+            Args:
+                blobs (Mapping[str, bytes]): Serialized sketch by name.
+
+            Returns:
+                HeavyHitters: The sketches.
+
+            Raises:
+                ValueError: If a blob is not a serialized sketch.
+        """
+        top_words = blobs.get(TOP_WORDS_SKETCH)
+        word_counts = blobs.get(WORD_COUNTS_SKETCH)
+        return cls(SpaceSaving.from_bytes(top_words) if top_words else None,
+                   CountMinSketch.from_bytes(word_counts) if word_counts else None)
+
+
+def _unpack_header(data: bytes, header: struct.Struct, magic: bytes) -> Tuple:
+    """
+        Read the header of a serialized sketch and check its magic number and version.
+
+        Raises:
+            ValueError: If the magic number or the version is not the expected one.
+            struct.error: If the data is shorter than the header.
+    """
+    fields = header.unpack_from(data)
+    if fields[0] != magic:
+        raise ValueError(f"Not a serialized sketch of this type: {bytes(data[:4])!r}")
+    if fields[1] != FORMAT_VERSION:
+        raise ValueError(f"Unsupported sketch format version: {fields[1]}")
+    return fields
@@ -1,7 +1,86 @@
+import os
 import sqlite3
+import zlib
 from abc import abstractmethod, ABC
-from sqlite3 import Connection
-from app.utils.constants import DATABASE_NAME
+from pathlib import Path
+from sqlite3 import Connection, Cursor
+from typing import Dict, List, NamedTuple, Optional, Union
+from app.storage.text_codec import decompress_text
+from app.utils.constants import COMMON_WORDS, DATABASE_NAME, DATABASE_PROFILE
+from app.utils.text_hash import text_digest
+
+
+class ConnectionProfile(NamedTuple):
+    """
+        SQLite settings applied to every connection, see https://www.sqlite.org/pragma.html.
+
+        Negative cache sizes are in KiB. The page size only applies to new databases: an existing
+        file keeps the page size it was created with.
+    """
+    journal_mode: str
+    synchronous: str
+    cache_size: int
+    mmap_size: int
+    temp_store: str
+    page_size: int
+
+
+PROFILES: Dict[str, ConnectionProfile] = {
+    # Large ingests: commits skip the fsync of every transaction, a crash of the OS may lose the last
+    # batches (which the ingestion manifest then resumes) but never corrupts the database
+    'bulk-load': ConnectionProfile('wal', 'normal', -262144, 268435456, 'memory', 16384),
+    # Every committed batch survives a power loss
+    'durable': ConnectionProfile('wal', 'full', -65536, 0, 'default', 4096),
+    # Reports and queries: the file is memory-mapped and readers never block the writer
+    'read-mostly': ConnectionProfile('wal', 'normal', -131072, 1073741824, 'memory', 4096),
+}
+
+# Settings that can be changed on a read-only connection
+READ_ONLY_SETTINGS = ('cache_size', 'mmap_size', 'temp_store')
+
+# Names of the values SQLite reports as numbers
+SETTING_NAMES = {
+    'synchronous': ('off', 'normal', 'full', 'extra'),
+    'temp_store': ('default', 'file', 'memory'),
+}
+
+
+IN_MEMORY_DATABASE = ':memory:'
+
+
+def shard_path(database_name: str, index: int, shards: int) -> str:
+    """
+        Path of a shard file, e.g. 'word_frequency.shard2of4.db' for the second of four shards.
+
+        The shard count is part of the name, so changing it starts a new set of shards instead of
+        routing entries to the shards of another count.
+
+        Args:
+            database_name (str): Path of the unsharded database.
+            index (int): Index of the shard, from 0.
+            shards (int): Number of shards.
+
+        Returns:
+            str: Path of the shard file.
+    """
+    if database_name == IN_MEMORY_DATABASE:
+        return IN_MEMORY_DATABASE
+    root, extension = os.path.splitext(database_name)
+    return f"{root}.shard{index + 1}of{shards}{extension}"
+
+
+def shard_index(entry_id: str, shards: int) -> int:
+    """
+        Shard an entry is stored in, by CRC-32 of its id, stable across runs and processes.
+
+        Args:
+            entry_id (str): Unique identifier for the entry.
+            shards (int): Number of shards.
+
+        Returns:
+            int: Index of the shard, from 0.
+    """
+    return zlib.crc32(entry_id.encode('utf-8')) % shards
 
 
 # Abstract base class defining the interface for database operations
@@ -10,13 +89,50 @@ class DatabaseClientInterface(ABC):
     def create_database(self) -> Connection:
         pass
 
+    @abstractmethod
+    def connect_read_only(self) -> Connection:
+        pass
+
+    @abstractmethod
+    def create_shards(self, shards: int) -> List[Connection]:
+        pass
+
+    @abstractmethod
+    def connect_shards_read_only(self, shards: int) -> List[Connection]:
+        pass
+
 
 class DatabaseClient(DatabaseClientInterface):
     """ Concrete implementation of the DatabaseClientInterface """
+    def __init__(self, database_name: str = DATABASE_NAME, profile: str = DATABASE_PROFILE,
+                 check_same_thread: bool = True):
+        """
+            Initialize the client.
+
+            Args:
+                database_name (str): Path of the SQLite database file.
+                profile (str): Name of the connection profile, one of PROFILES.
+                check_same_thread (bool): Whether connections may only be used by the thread that
+                    opened them. Disable it to hand a connection to a single writer thread.
+
+            Raises:
+                ValueError: If the profile does not exist.
+        """
+        if profile not in PROFILES:
+            raise ValueError(f"Unknown database profile: {profile}")
+        self.database_name = database_name
+        self.profile = profile
+        self.check_same_thread = check_same_thread
+        # Settings read back from SQLite after applying the profile to the last connection
+        self.applied_settings: Dict[str, Optional[Union[int, str]]] = {}
+
     def create_database(self) -> Connection:
         """
             Create and set up the SQLite database with necessary tables.
 
+            Databases created by older versions are migrated to the current schema. The settings
+            of the connection profile are applied first and the ones SQLite actually used are logged.
+
             Returns:
             sqlite3.Connection: A connection object to the created database.
 
@@ -26,32 +142,422 @@ class DatabaseClient(DatabaseClientInterface):
         conn = None
         try:
             # Establish a connection to the SQLite database
-            conn = sqlite3.connect(DATABASE_NAME)
+            conn = sqlite3.connect(self.database_name, check_same_thread=self.check_same_thread)
+            self._register_functions(conn)
+            self._apply_profile(conn, read_only=False)
+            print(f"SQLite profile '{self.profile}': "
+                  + ', '.join(f"{name}={value}" for name, value in self.applied_settings.items()))
 
             # Create a cursor object to execute SQL commands
             c = conn.cursor()
 
-            # Create 'entries' table to store original text entries
-            # This table will have the following columns:
-            # - id: TEXT, primary key for unique identification
-            # - source: TEXT, to store the source of the entry
-            # - original_text: TEXT, to store the original text content
-            c.execute('''CREATE TABLE IF NOT EXISTS entries
-                             (id TEXT PRIMARY KEY, source TEXT, original_text TEXT)''')
-
-            # Create 'word_frequencies' table to store word frequency data
-            # This table will have the following columns:
-            # - id: TEXT, foreign key referencing entries(id)
-            # - word: TEXT, to store individual words
-            # - frequency: INTEGER, to store the frequency count of each word
-            c.execute('''CREATE TABLE IF NOT EXISTS word_frequencies
-                             (id TEXT, word TEXT, frequency INTEGER)''')
-
-            # Commit the changes to the database and return the database connection
-            conn.commit()
+            # Bring the schema up to date and return the database connection
+            self._migrate(conn, c)
             return conn
 
         except sqlite3.Error as e:
             if conn:
                 conn.rollback()
             raise sqlite3.Error(f"An error occurred: {e}")
+
+    def connect_read_only(self) -> Connection:
+        """
+            Open a read-only connection to an existing database, e.g. for reports.
+
+            In WAL mode, read-only connections read the last committed state while a writer
+            keeps ingesting. The schema is neither created nor migrated.
+
+            Returns:
+            sqlite3.Connection: A read-only connection to the database.
+
+            Raises:
+            sqlite3.Error: If the database does not exist or cannot be opened.
+        """
+        conn = None
+        try:
+            # The path is percent-encoded, so '?', '#' and '%' in it are not read as URI syntax
+            uri = f"{Path(self.database_name).resolve().as_uri()}?mode=ro"
+            conn = sqlite3.connect(uri, uri=True, check_same_thread=self.check_same_thread)
+            self._register_functions(conn)
+            self._apply_profile(conn, read_only=True)
+            return conn
+        except sqlite3.Error as e:
+            if conn:
+                conn.close()
+            raise sqlite3.Error(f"An error occurred: {e}")
+
+    def create_shards(self, shards: int) -> List[Connection]:
+        """
+            Create or migrate the shard databases and connect to each one, with this client's profile.
+
+            Args:
+                shards (int): Number of shards.
+
+            Returns:
+                List[Connection]: Connection to each shard, by shard index.
+
+            Raises:
+                ValueError: If the shard count is not positive.
+                sqlite3.Error: If there's an error in database operations.
+        """
+        return self._open_shards(shards, DatabaseClient.create_database)
+
+    def connect_shards_read_only(self, shards: int) -> List[Connection]:
+        """
+            Open a read-only connection to each existing shard database.
+
+            Args:
+                shards (int): Number of shards.
+
+            Returns:
+                List[Connection]: Read-only connection to each shard, by shard index.
+
+            Raises:
+                ValueError: If the shard count is not positive.
+                sqlite3.Error: If a shard does not exist or cannot be opened.
+        """
+        return self._open_shards(shards, DatabaseClient.connect_read_only)
+
+    def _open_shards(self, shards: int, connect) -> List[Connection]:
+        """
+            Open every shard with `connect`, closing the ones already open if one fails.
+        """
+        if shards < 1:
+            raise ValueError(f"Number of shards must be positive: {shards}")
+        connections = []
+        try:
+            for index in range(shards):
+                client = DatabaseClient(shard_path(self.database_name, index, shards), self.profile,
+                                        self.check_same_thread)
+                connections.append(connect(client))
+            return connections
+        except sqlite3.Error:
+            for conn in connections:
+                conn.close()
+            raise
+
+    @staticmethod
+    def _register_functions(conn: Connection) -> None:
+        """
+            Register the SQL functions of the application on a connection.
+
+            Args:
+                conn (Connection): Database connection.
+        """
+        # decompress_text(original_text) reads a text whether it was stored compressed or not
+        conn.create_function('decompress_text', 1, decompress_text, deterministic=True)
+
+    def _apply_profile(self, conn: Connection, read_only: bool) -> None:
+        """
+            Apply the settings of the connection profile and read back the ones SQLite used.
+
+            Args:
+                conn (Connection): Database connection.
+                read_only (bool): Whether the connection is read-only, in which case the journal
+                    mode, synchronous flag and page size are left to the writer.
+        """
+        settings = PROFILES[self.profile]._asdict()
+        if read_only:
+            settings = {name: settings[name] for name in READ_ONLY_SETTINGS}
+        else:
+            # The page size must be set before the journal mode and the first table
+            settings = {'page_size': settings.pop('page_size'), **settings}
+
+        self.applied_settings = {}
+        for name, value in settings.items():
+            conn.execute(f"PRAGMA {name} = {value}")
+            # Settings the database does not support, like mmap_size in memory, read back no row
+            row = conn.execute(f"PRAGMA {name}").fetchone()
+            applied = row[0] if row else None
+            if name in SETTING_NAMES and isinstance(applied, int) and applied < len(SETTING_NAMES[name]):
+                applied = SETTING_NAMES[name][applied]
+            self.applied_settings[name] = applied
+
+    def _migrate(self, conn: Connection, c: Cursor) -> None:
+        """
+            Apply the pending schema migrations, each one in its own transaction.
+
+            The schema version is tracked in SQLite's `user_version` pragma. It is read again once
+            the write lock is held, so instances started together migrate a database only once.
+
+            Args:
+                conn (Connection): Database connection.
+                c (Cursor): Cursor used to run the migrations.
+        """
+        c.execute("PRAGMA user_version")
+        version = c.fetchone()[0]
+
+        migrations = [self._create_base_schema, self._normalize_word_frequencies, self._create_word_totals,
+                      self._create_ingest_manifest, self._deduplicate_texts, self._create_sketches,
+                      self._create_stopwords, self._create_ngrams, self._index_entry_sources,
+                      self._create_corpus_totals]
+        for target_version, migration in enumerate(migrations, start=1):
+            if version >= target_version:
+                continue
+            c.execute("BEGIN IMMEDIATE")
+            c.execute("PRAGMA user_version")
+            version = c.fetchone()[0]
+            if version < target_version:
+                migration(c)
+                c.execute(f"PRAGMA user_version = {target_version}")
+            conn.commit()
+
+    @staticmethod
+    def _create_base_schema(c: Cursor) -> None:
+        """
+            Version 1: the original schema.
+
+            Args:
+                c (Cursor): Cursor used to run the migration.
+        """
+        # Create 'entries' table to store original text entries
+        # This table will have the following columns:
+        # - id: TEXT, primary key for unique identification
+        # - source: TEXT, to store the source of the entry
+        # - original_text: TEXT, to store the original text content
+        c.execute('''CREATE TABLE IF NOT EXISTS entries
+                         (id TEXT PRIMARY KEY, source TEXT, original_text TEXT)''')
+
+        # Create 'word_frequencies' table to store word frequency data
+        # This table will have the following columns:
+        # - id: TEXT, foreign key referencing entries(id)
+        # - word: TEXT, to store individual words
+        # - frequency: INTEGER, to store the frequency count of each word
+        c.execute('''CREATE TABLE IF NOT EXISTS word_frequencies
+                         (id TEXT, word TEXT, frequency INTEGER)''')
+
+    @staticmethod
+    def _normalize_word_frequencies(c: Cursor) -> None:
+        """
+            Version 2: store each word once in a 'words' vocabulary table and key
+            'word_frequencies' by (entry_id, word_id).
+
+            Duplicated rows left by re-processed entries keep their most recent frequency.
+
+            Args:
+                c (Cursor): Cursor used to run the migration.
+        """
+        # Create 'words' table to store each distinct word once
+        # - id: INTEGER, primary key referenced by word_frequencies(word_id)
+        # - word: TEXT, unique word
+        c.execute('''CREATE TABLE words
+                         (id INTEGER PRIMARY KEY, word TEXT NOT NULL UNIQUE)''')
+
+        c.execute('''ALTER TABLE word_frequencies RENAME TO word_frequencies_v1''')
+
+        # Re-create 'word_frequencies' clustered by its primary key
+        # - entry_id: TEXT, foreign key referencing entries(id)
+        # - word_id: INTEGER, foreign key referencing words(id)
+        # - frequency: INTEGER, frequency count of the word in the entry
+        c.execute('''CREATE TABLE word_frequencies
+                         (entry_id TEXT NOT NULL, word_id INTEGER NOT NULL, frequency INTEGER NOT NULL,
+                          PRIMARY KEY (entry_id, word_id)) WITHOUT ROWID''')
+
+        c.execute('''INSERT INTO words (word)
+                         SELECT DISTINCT word FROM word_frequencies_v1 WHERE word IS NOT NULL''')
+        c.execute('''INSERT INTO word_frequencies
+                         SELECT f.id, w.id, f.frequency
+                         FROM word_frequencies_v1 f JOIN words w ON w.word = f.word
+                         WHERE f.frequency IS NOT NULL
+                           AND f.rowid IN (SELECT MAX(rowid) FROM word_frequencies_v1
+                                           WHERE id IS NOT NULL AND word IS NOT NULL
+                                           GROUP BY id, word)''')
+        c.execute('''DROP TABLE word_frequencies_v1''')
+
+        # Word-based lookups (entries containing a word, ranked by frequency)
+        c.execute('''CREATE INDEX idx_word_frequencies_word ON word_frequencies (word_id, frequency)''')
+
+    @staticmethod
+    def _create_word_totals(c: Cursor) -> None:
+        """
+            Version 3: corpus-wide totals of each word, maintained incrementally on ingestion.
+
+            Args:
+                c (Cursor): Cursor used to run the migration.
+        """
+        # Create 'word_totals' table
+        # - word_id: INTEGER, primary key referencing words(id)
+        # - total_count: INTEGER, occurrences of the word in all entries
+        # - document_count: INTEGER, number of entries containing the word
+        c.execute('''CREATE TABLE word_totals
+                         (word_id INTEGER PRIMARY KEY, total_count INTEGER NOT NULL,
+                          document_count INTEGER NOT NULL)''')
+        c.execute('''INSERT INTO word_totals
+                         SELECT word_id, SUM(frequency), COUNT(*) FROM word_frequencies GROUP BY word_id''')
+
+        # Top-N queries
+        c.execute('''CREATE INDEX idx_word_totals_total_count ON word_totals (total_count DESC, word_id)''')
+
+    @staticmethod
+    def _create_ingest_manifest(c: Cursor) -> None:
+        """
+            Version 4: manifest of the ingested files, with the checkpoint of each one.
+
+            Args:
+                c (Cursor): Cursor used to run the migration.
+        """
+        # Create 'ingest_manifest' table
+        # - content_hash: TEXT, primary key, SHA-256 of the file content
+        # - file_name: TEXT, name of the file when it was first seen
+        # - size: INTEGER, size of the file in bytes
+        # - checkpoint_offset: INTEGER, byte offset following the last committed entry
+        # - completed: INTEGER, 1 once the whole file is committed
+        # - updated_at: TEXT, time of the last checkpoint
+        c.execute('''CREATE TABLE ingest_manifest
+                         (content_hash TEXT PRIMARY KEY, file_name TEXT NOT NULL, size INTEGER NOT NULL,
+                          checkpoint_offset INTEGER NOT NULL DEFAULT 0, completed INTEGER NOT NULL DEFAULT 0,
+                          updated_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP)''')
+
+    @staticmethod
+    def _deduplicate_texts(c: Cursor) -> None:
+        """
+            Version 5: store each distinct text once, in 'texts', and have entries reference it.
+
+            Args:
+                c (Cursor): Cursor used to run the migration.
+        """
+        # Create 'texts' table
+        # - id: INTEGER, primary key
+        # - content_hash: BLOB, unique SHA-256 of the text with its whitespace normalized
+        # - original_text: TEXT, the text as first received
+        c.execute('''CREATE TABLE texts
+                         (id INTEGER PRIMARY KEY, content_hash BLOB NOT NULL UNIQUE, original_text TEXT NOT NULL)''')
+
+        # Hash the existing texts in SQL, keeping the first copy of each one
+        c.connection.create_function('text_digest', 1, text_digest, deterministic=True)
+        c.execute("INSERT OR IGNORE INTO texts (content_hash, original_text) "
+                  "SELECT text_digest(COALESCE(original_text, '')), COALESCE(original_text, '') FROM entries "
+                  "ORDER BY rowid")
+
+        # Replace 'entries' with a table referencing the texts
+        # - id: TEXT, primary key
+        # - source: TEXT, the source of the entry
+        # - text_id: INTEGER, id of the text in 'texts'
+        c.execute('''CREATE TABLE entries_v5
+                         (id TEXT PRIMARY KEY, source TEXT, text_id INTEGER NOT NULL REFERENCES texts (id))''')
+        c.execute("INSERT INTO entries_v5 (id, source, text_id) "
+                  "SELECT e.id, e.source, t.id FROM entries e "
+                  "JOIN texts t ON t.content_hash = text_digest(COALESCE(e.original_text, ''))")
+        c.execute("DROP TABLE entries")
+        c.execute("ALTER TABLE entries_v5 RENAME TO entries")
+        # Finds whether a text is still referenced when an entry is replaced
+        c.execute("CREATE INDEX idx_entries_text ON entries (text_id)")
+
+    @staticmethod
+    def _create_sketches(c: Cursor) -> None:
+        """
+            Version 6: serialized sketches of the heavy-hitters mode.
+
+            Args:
+                c (Cursor): Cursor used to run the migration.
+        """
+        # Create 'sketches' table
+        # - name: TEXT, primary key, name of the sketch
+        # - data: BLOB, the serialized sketch
+        # - updated_at: TEXT, time of the last update
+        c.execute('''CREATE TABLE sketches
+                         (name TEXT PRIMARY KEY, data BLOB NOT NULL,
+                          updated_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP)''')
+
+    @staticmethod
+    def _create_stopwords(c: Cursor) -> None:
+        """
+            Version 7: versioned stopword lists applied at query time, and the per-entry word
+            counts that depend on them.
+
+            The first version is COMMON_WORDS, which was applied at ingest time until then.
+
+            Args:
+                c (Cursor): Cursor used to run the migration.
+        """
+        # Create 'stopword_versions' table, the latest version being the active one
+        # - version: INTEGER, primary key
+        # - created_at: TEXT, time the version was added
+        c.execute('''CREATE TABLE stopword_versions
+                         (version INTEGER PRIMARY KEY, created_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP)''')
+
+        # Create 'stopwords' table
+        # - version: INTEGER, foreign key referencing stopword_versions(version)
+        # - word: TEXT, stopword of the version
+        c.execute('''CREATE TABLE stopwords
+                         (version INTEGER NOT NULL REFERENCES stopword_versions (version), word TEXT NOT NULL,
+                          PRIMARY KEY (version, word)) WITHOUT ROWID''')
+        c.execute("INSERT INTO stopword_versions (version) VALUES (1)")
+        c.executemany("INSERT INTO stopwords (version, word) VALUES (1, ?)", ((word,) for word in sorted(COMMON_WORDS)))
+
+        # Create 'entry_word_counts' table
+        # - entry_id: TEXT, primary key referencing entries(id)
+        # - word_count: INTEGER, occurrences of the words of the entry that are not stopwords
+        # - distinct_words: INTEGER, number of distinct words of the entry that are not stopwords
+        # - stopwords_version: INTEGER, version of the stopwords the counts were computed with
+        c.execute('''CREATE TABLE entry_word_counts
+                         (entry_id TEXT PRIMARY KEY, word_count INTEGER NOT NULL, distinct_words INTEGER NOT NULL,
+                          stopwords_version INTEGER NOT NULL)''')
+        c.execute('''INSERT INTO entry_word_counts
+                         SELECT e.id, COALESCE(SUM(f.frequency), 0), COUNT(f.word_id), 1
+                         FROM entries e LEFT JOIN word_frequencies f ON f.entry_id = e.id
+                           AND f.word_id NOT IN (SELECT w.id FROM stopwords s JOIN words w ON w.word = s.word)
+                         GROUP BY e.id''')
+
+        # Finds the counts computed with a previous version
+        c.execute("CREATE INDEX idx_entry_word_counts_version ON entry_word_counts (stopwords_version)")
+
+    @staticmethod
+    def _create_ngrams(c: Cursor) -> None:
+        """
+            Version 8: n-gram frequencies of the n-gram mode, in the same layout as the word ones.
+
+            Args:
+                c (Cursor): Cursor used to run the migration.
+        """
+        # Create 'ngrams' table; ids are never reused, as the pruning spares the n-grams added since the last one
+        # - id: INTEGER, primary key referenced by ngram_frequencies(ngram_id)
+        # - ngram: TEXT, unique n-gram, its words separated by single spaces
+        # - n: INTEGER, number of words of the n-gram
+        c.execute('''CREATE TABLE ngrams
+                         (id INTEGER PRIMARY KEY AUTOINCREMENT, ngram TEXT NOT NULL UNIQUE, n INTEGER NOT NULL)''')
+
+        # Create 'ngram_frequencies' table clustered by its primary key
+        # - entry_id: TEXT, foreign key referencing entries(id)
+        # - ngram_id: INTEGER, foreign key referencing ngrams(id)
+        # - frequency: INTEGER, frequency count of the n-gram in the entry
+        c.execute('''CREATE TABLE ngram_frequencies
+                         (entry_id TEXT NOT NULL, ngram_id INTEGER NOT NULL, frequency INTEGER NOT NULL,
+                          PRIMARY KEY (entry_id, ngram_id)) WITHOUT ROWID''')
+        c.execute('''CREATE INDEX idx_ngram_frequencies_ngram ON ngram_frequencies (ngram_id, frequency)''')
+
+        # Create 'ngram_totals' table
+        # - ngram_id: INTEGER, primary key referencing ngrams(id)
+        # - total_count: INTEGER, occurrences of the n-gram in all entries
+        # - document_count: INTEGER, number of entries containing the n-gram
+        c.execute('''CREATE TABLE ngram_totals
+                         (ngram_id INTEGER PRIMARY KEY, total_count INTEGER NOT NULL,
+                          document_count INTEGER NOT NULL)''')
+
+        # Top-N queries and pruning of the least frequent n-grams
+        c.execute('''CREATE INDEX idx_ngram_totals_total_count ON ngram_totals (total_count DESC, ngram_id)''')
+
+    @staticmethod
+    def _index_entry_sources(c: Cursor) -> None:
+        """
+            Version 9: index of the entries by source, for the per-source queries.
+
+            Args:
+                c (Cursor): Cursor used to run the migration.
+        """
+        c.execute("CREATE INDEX idx_entries_source ON entries (source)")
+
+    @staticmethod
+    def _create_corpus_totals(c: Cursor) -> None:
+        """
+            Version 10: corpus-wide counters maintained incrementally on ingestion, read instead of
+            counting the rows of the largest tables.
+
+            Args:
+                c (Cursor): Cursor used to run the migration.
+        """
+        # Create 'corpus_totals' table
+        # - name: TEXT, primary key, name of the counter, e.g. 'entries'
+        # - value: INTEGER, value of the counter
+        c.execute("CREATE TABLE corpus_totals (name TEXT PRIMARY KEY, value INTEGER NOT NULL) WITHOUT ROWID")
+        c.execute("INSERT INTO corpus_totals (name, value) SELECT 'entries', COUNT(*) FROM entries")
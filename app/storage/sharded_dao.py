@@ -0,0 +1,330 @@
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from sqlite3 import Connection, Error as SQLiteError
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple, TypeVar
+
+from app.metrics.metrics import Metrics
+from app.sketch.sketches import HeavyHitters
+from app.storage.database_client import shard_index
+from app.storage.text_processor_dao import (EntryRecord, FileCheckpoint, ManifestEntry, StopwordSet,
+                                            TextProcessorDAO, TextProcessorDAOInterface)
+from app.utils.constants import BATCH_SIZE, COMPRESS_TEXTS, HEAVY_HITTERS, REBUILD_CHUNK_SIZE
+
+T = TypeVar('T')
+
+
+class ShardedTextProcessorDAO(TextProcessorDAOInterface):
+    """
+        TextProcessorDAOInterface over several shard databases, each entry being stored in the
+        shard given by the hash of its id.
+
+        Each shard is written by its own thread through its own connection: SQLite runs without
+        the GIL, so the shards are written, and synced, concurrently. Reads are fanned out to every
+        shard on the same threads and merged. The ingestion manifest and the stopwords live in
+        every shard, the manifest being only read and written in the first one.
+
+        A batch spread over several shards is not atomic: its checkpoint is only recorded once
+        every shard has committed its part, so a batch interrupted midway is saved again on resume,
+        entries being replaced rather than added.
+    """
+    def __init__(self, connections: Sequence[Connection], metrics: Optional[Metrics] = None,
+                 compress_texts: bool = COMPRESS_TEXTS, heavy_hitters: bool = HEAVY_HITTERS):
+        """
+            Initialize a DAO and a writer thread per shard.
+
+            Args:
+                connections (Sequence[Connection]): Connection to each shard, by shard index, opened
+                    with check_same_thread=False as they are used from the writer threads.
+                metrics (Metrics, optional): Metrics of the pipeline. Defaults to disabled metrics.
+                compress_texts (bool): Store new texts zlib-compressed when it makes them smaller.
+                heavy_hitters (bool): Also count the saved words in the heavy-hitters sketches of
+                    each shard, merged when they are read.
+
+            Raises:
+                ValueError: If there is no shard.
+        """
+        if not connections:
+            raise ValueError("At least one shard is required")
+        self.metrics = metrics or Metrics()
+        self.__daos = [TextProcessorDAO(conn, self.metrics, compress_texts, heavy_hitters) for conn in connections]
+        # A single thread per shard, so each connection is only ever used by one thread at a time
+        self.__writers = [ThreadPoolExecutor(max_workers=1, thread_name_prefix=f'shard-{index}')
+                          for index in range(len(connections))]
+
+    @property
+    def shards(self) -> int:
+        return len(self.__daos)
+
+    def close(self) -> None:
+        """
+            Stop the writer threads. The connections are left open, to be closed by their owner.
+        """
+        for writer in self.__writers:
+            writer.shutdown()
+
+    def _run(self, index: int, operation: Callable[[TextProcessorDAO], T]) -> T:
+        """
+            Run an operation on a shard, on its thread.
+
+            Args:
+                index (int): Index of the shard.
+                operation (Callable[[TextProcessorDAO], T]): Operation, given the DAO of the shard.
+
+            Returns:
+                T: Result of the operation.
+        """
+        return self.__writers[index].submit(operation, self.__daos[index]).result()
+
+    def _fan_out(self, operation: Callable[[TextProcessorDAO], T]) -> List[T]:
+        """
+            Run an operation on every shard concurrently.
+
+            Args:
+                operation (Callable[[TextProcessorDAO], T]): Operation, given the DAO of a shard.
+
+            Returns:
+                List[T]: Result of the operation on each shard, by shard index.
+
+            Raises:
+                SQLiteError: The first error raised by a shard, once every shard is done.
+        """
+        futures = [writer.submit(operation, dao) for writer, dao in zip(self.__writers, self.__daos)]
+        return [future.result() for future in futures]
+
+    def save_entry(self, entry_id: str, source: str, text: str) -> None:
+        """
+            Save a text entry to its shard.
+
+            Args:
+                entry_id (str): Unique identifier for the entry.
+                source (str): Source of the entry.
+                text (str): Content of the entry.
+
+            Raises:
+                SQLiteError: If there's an error in database operations.
+        """
+        self._run(shard_index(entry_id, self.shards), lambda dao: dao.save_entry(entry_id, source, text))
+
+    def save_words_frequency(self, entry_id: str, word_freq: Counter) -> None:
+        """
+            Save the word frequencies of an entry to its shard.
+
+            Args:
+                entry_id (str): Unique identifier for the entry.
+                word_freq (Counter): Word frequencies of the entry.
+
+            Raises:
+                SQLiteError: If there's an error in database operations.
+        """
+        self._run(shard_index(entry_id, self.shards), lambda dao: dao.save_words_frequency(entry_id, word_freq))
+
+    def save_batch(self, records: List[EntryRecord], checkpoint: Optional[FileCheckpoint] = None) -> None:
+        """
+            Split a batch by shard and save the parts concurrently, each in a single transaction.
+
+            Args:
+                records (List[EntryRecord]): Entries to be saved.
+                checkpoint (FileCheckpoint, optional): Position of the file reached by this batch,
+                    recorded in the ingestion manifest once every part is committed.
+
+            Raises:
+                SQLiteError: If a part could not be saved. The other parts stay committed and the
+                    checkpoint is not recorded; saving the batch again replaces them, without
+                    counting them twice in the heavy-hitters sketches.
+        """
+        parts: List[List[EntryRecord]] = [[] for _ in self.__daos]
+        for record in records:
+            parts[shard_index(record.entry_id, self.shards)].append(record)
+        futures = [writer.submit(dao.save_batch, part)
+                   for writer, dao, part in zip(self.__writers, self.__daos, parts) if part]
+        errors = []
+        for future in futures:
+            try:
+                future.result()
+            except SQLiteError as e:
+                errors.append(str(e))
+        if errors:
+            raise SQLiteError(f"Error saving sharded batch: {'; '.join(errors)}")
+        if checkpoint:
+            self.save_checkpoint(checkpoint)
+
+    def save_entries(self, records: Iterable[EntryRecord], batch_size: int = BATCH_SIZE) -> int:
+        """
+            Save entries in batches, each batch being split by shard.
+
+            A batch that fails is skipped; the remaining batches are still saved.
+
+            Args:
+                records (Iterable[EntryRecord]): Entries to be saved.
+                batch_size (int): Maximum number of entries written per batch, over every shard.
+
+            Returns:
+                int: Number of entries of the batches saved on every shard.
+        """
+        if batch_size < 1:
+            raise ValueError(f"Batch size must be positive: {batch_size}")
+
+        saved = 0
+        records = iter(records)
+        while True:
+            batch = list(islice(records, batch_size))
+            if not batch:
+                break
+            try:
+                self.save_batch(batch)
+                saved += len(batch)
+            except SQLiteError as e:
+                print(f"Skipping batch of {len(batch)} entries: {e}")
+        return saved
+
+    def save_checkpoint(self, checkpoint: FileCheckpoint) -> None:
+        self._run(0, lambda dao: dao.save_checkpoint(checkpoint))
+
+    def get_file_manifest(self, content_hash: str) -> Optional[ManifestEntry]:
+        return self._run(0, lambda dao: dao.get_file_manifest(content_hash))
+
+    def start_file(self, content_hash: str, file_name: str, size: int) -> None:
+        self._run(0, lambda dao: dao.start_file(content_hash, file_name, size))
+
+    def complete_file(self, content_hash: str) -> None:
+        self._run(0, lambda dao: dao.complete_file(content_hash))
+
+    def count_completed_files(self) -> int:
+        return self._run(0, lambda dao: dao.count_completed_files())
+
+    def get_top_words(self, limit: int) -> List[Tuple[str, int]]:
+        """
+            Get the most frequent words over every shard, with their exact total counts.
+
+            Args:
+                limit (int): Maximum number of words to return.
+
+            Returns:
+                List[Tuple[str, int]]: Words and their total counts, most frequent first, ties by word.
+
+            Raises:
+                SQLiteError: If there's an error in database operations.
+        """
+        return self._merge_top(lambda dao, k: dao.get_top_words(k), TextProcessorDAO.get_word_count, limit)
+
+    def get_top_ngrams(self, limit: int, n: Optional[int] = None) -> List[Tuple[str, int]]:
+        """
+            Get the most frequent n-grams over every shard, each shard having pruned its own.
+
+            Args:
+                limit (int): Maximum number of n-grams to return.
+                n (int, optional): Number of words of the n-grams. Defaults to every size.
+
+            Returns:
+                List[Tuple[str, int]]: N-grams and their total counts, most frequent first, ties by n-gram.
+
+            Raises:
+                SQLiteError: If there's an error in database operations.
+        """
+        return self._merge_top(lambda dao, k: dao.get_top_ngrams(k, n), TextProcessorDAO.get_ngram_count, limit)
+
+    def _merge_top(self, top: Callable[[TextProcessorDAO, int], List[Tuple[str, int]]],
+                   count: Callable[[TextProcessorDAO, str], int], limit: int) -> List[Tuple[str, int]]:
+        """
+            Merge the top keys of every shard into the exact top keys of their sums.
+
+            The top `k` keys of each shard are read, from k = limit, and the missing counts of
+            every key read are looked up. A key read nowhere has at most the last count read on
+            each shard whose list was full, so once the limit-th best total exceeds the sum of
+            those counts the result is final; an unseen key could still tie with it and win the
+            tie on its key. Otherwise `k` is doubled.
+
+            Args:
+                top (Callable): Top keys of a shard and their counts, most frequent first.
+                count (Callable): Count of a key on a shard.
+                limit (int): Maximum number of keys to return.
+
+            Returns:
+                List[Tuple[str, int]]: Keys and their total counts, most frequent first, ties by key.
+        """
+        if limit < 1:
+            return []
+        k = limit
+        while True:
+            tops: List[Dict[str, int]] = [dict(rows) for rows in self._fan_out(lambda dao: top(dao, k))]
+            # Keys missing from a full list may still be counted on that shard, below its last count
+            full = [len(rows) == k for rows in tops]
+            keys = sorted({key for rows in tops for key in rows})
+
+            def shard_counts(index: int) -> Callable[[TextProcessorDAO], List[int]]:
+                rows = tops[index]
+                return lambda dao: [rows[key] if key in rows else count(dao, key) if full[index] else 0
+                                    for key in keys]
+
+            futures = [writer.submit(shard_counts(index), dao)
+                       for index, (writer, dao) in enumerate(zip(self.__writers, self.__daos))]
+            totals = [sum(counts) for counts in zip(*(future.result() for future in futures))]
+            merged = sorted(zip(keys, totals), key=lambda item: (-item[1], item[0]))[:limit]
+            unseen_bound = sum(min(rows.values()) for rows, is_full in zip(tops, full) if is_full)
+            if not unseen_bound or (len(merged) == limit and merged[-1][1] > unseen_bound):
+                return merged
+            k *= 2
+
+    def get_word_count(self, word: str) -> int:
+        return sum(self._fan_out(lambda dao: dao.get_word_count(word)))
+
+    def get_ngram_count(self, ngram: str) -> int:
+        return sum(self._fan_out(lambda dao: dao.get_ngram_count(ngram)))
+
+    def get_document_frequency(self, word: str) -> int:
+        return sum(self._fan_out(lambda dao: dao.get_document_frequency(word)))
+
+    def get_ngram_document_frequency(self, ngram: str) -> int:
+        return sum(self._fan_out(lambda dao: dao.get_ngram_document_frequency(ngram)))
+
+    def get_entry_count(self) -> int:
+        return sum(self._fan_out(lambda dao: dao.get_entry_count()))
+
+    def get_entry_text(self, entry_id: str) -> Optional[str]:
+        return self._run(shard_index(entry_id, self.shards), lambda dao: dao.get_entry_text(entry_id))
+
+    def get_stopwords(self) -> StopwordSet:
+        return self._run(0, TextProcessorDAO.get_stopwords)
+
+    def add_stopwords_version(self, words: Iterable[str]) -> int:
+        """
+            Add a new version of the stopword list to every shard.
+
+            Args:
+                words (Iterable[str]): Stopwords, lowercased like the counted words.
+
+            Returns:
+                int: Version of the new set, the same on every shard created together.
+
+            Raises:
+                SQLiteError: If there's an error in database operations.
+        """
+        words = list(words)
+        return max(self._fan_out(lambda dao: dao.add_stopwords_version(words)))
+
+    def rebuild_filtered_aggregates(self, chunk_size: int = REBUILD_CHUNK_SIZE) -> int:
+        return sum(self._fan_out(lambda dao: dao.rebuild_filtered_aggregates(chunk_size)))
+
+    def get_heavy_hitters(self) -> HeavyHitters:
+        """
+            Get the heavy-hitters sketches of every shard, merged.
+
+            Returns:
+                HeavyHitters: New sketches, counting the words of every shard.
+
+            Raises:
+                SQLiteError: If there's an error in database operations.
+                ValueError: If a stored sketch is corrupted or the shards' dimensions differ.
+        """
+        merged = HeavyHitters()
+        for heavy_hitters in self._fan_out(TextProcessorDAO.get_heavy_hitters):
+            merged.merge(heavy_hitters)
+        return merged
+
+    def merge_heavy_hitters(self, heavy_hitters: HeavyHitters) -> None:
+        self._run(0, lambda dao: dao.merge_heavy_hitters(heavy_hitters))
+
+    def get_generation(self) -> int:
+        # Each shard's generation only increases, so their sum changes with every commit of any shard
+        return sum(dao.get_generation() for dao in self.__daos)
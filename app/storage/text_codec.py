@@ -0,0 +1,40 @@
+import zlib
+from typing import Union
+
+from app.utils.constants import TEXT_COMPRESSION_LEVEL
+
+
+def compress_text(text: str, level: int = TEXT_COMPRESSION_LEVEL) -> Union[str, bytes]:
+    """
+        Compress a text with zlib, unless compressing does not make it smaller.
+
+        SQLite stores the result as a BLOB when compressed and as TEXT otherwise, which is how
+        decompress_text tells them apart.
+
+        Args:
+            text (str): Text to compress.
+            level (int): zlib compression level, from 1 (fastest) to 9 (smallest).
+
+        Returns:
+            Union[str, bytes]: The compressed text, or the text itself.
+    """
+    encoded = text.encode('utf-8')
+    compressed = zlib.compress(encoded, level)
+    return compressed if len(compressed) < len(encoded) else text
+
+
+def decompress_text(value: Union[str, bytes, None]) -> Union[str, None]:
+    """
+        Read a text stored by compress_text, compressed or not.
+
+        Also registered as the `decompress_text` SQL function on every connection.
+
+        Args:
+            value (Union[str, bytes, None]): Value of the column.
+
+        Returns:
+            Union[str, None]: The original text.
+    """
+    if isinstance(value, bytes):
+        return zlib.decompress(value).decode('utf-8')
+    return value
@@ -1,6 +1,76 @@
 from abc import ABC, abstractmethod
 from collections import Counter
-from sqlite3 import Connection, Error as SQLiteError
+from itertools import islice
+from sqlite3 import Connection, Cursor, Error as SQLiteError
+from typing import Dict, FrozenSet, Iterable, List, NamedTuple, Optional, Sequence, Set, Tuple
+
+from app.metrics.metrics import Metrics
+from app.sketch.sketches import HeavyHitters
+from app.storage.text_codec import compress_text, decompress_text
+from app.utils.constants import (BATCH_SIZE, COMPRESS_TEXTS, HEAVY_HITTERS, NGRAM_MAX_VOCABULARY, NGRAM_MIN_COUNT,
+                                 NGRAM_PRUNE_INTERVAL, REBUILD_CHUNK_SIZE)
+from app.utils.text_hash import text_digest
+
+# Words of the active stopword set, the latest version of the 'stopwords' table, and their ids
+ACTIVE_STOPWORDS = "SELECT word FROM stopwords WHERE version = (SELECT MAX(version) FROM stopword_versions)"
+ACTIVE_STOPWORD_IDS = f"SELECT id FROM words WHERE word IN ({ACTIVE_STOPWORDS})"
+# Number of entries, maintained with them instead of counted
+ENTRY_COUNT = "SELECT value FROM corpus_totals WHERE name = 'entries'"
+
+
+def contains_stopword(ngram: str, stopwords: FrozenSet[str]) -> bool:
+    """
+        Check whether any word of an n-gram is a stopword.
+
+        Args:
+            ngram (str): N-gram, its words separated by single spaces.
+            stopwords (FrozenSet[str]): Stopwords, e.g. the active ones.
+
+        Returns:
+            bool: True if the n-gram contains a stopword.
+    """
+    return not stopwords.isdisjoint(ngram.split(' '))
+
+
+class EntryRecord(NamedTuple):
+    """
+        A parsed CSV entry together with its computed word frequencies.
+    """
+    entry_id: str
+    source: str
+    text: str
+    word_freq: Counter
+    # N-gram frequencies, only in n-gram mode
+    ngram_freq: Optional[Counter] = None
+    # Content hash of the text (text_digest), when already computed, e.g. as a cache key
+    digest: Optional[bytes] = None
+
+
+class FileCheckpoint(NamedTuple):
+    """
+        Position up to which a file has been committed, identified by its content hash.
+    """
+    content_hash: str
+    offset: int
+
+
+class ManifestEntry(NamedTuple):
+    """
+        A file recorded in the ingestion manifest.
+    """
+    content_hash: str
+    file_name: str
+    size: int
+    checkpoint_offset: int
+    completed: bool
+
+
+class StopwordSet(NamedTuple):
+    """
+        A version of the stopword list, applied to the word counts at query time.
+    """
+    version: int
+    words: FrozenSet[str]
 
 
 class TextProcessorDAOInterface(ABC):
@@ -15,23 +85,143 @@ class TextProcessorDAOInterface(ABC):
     def save_words_frequency(self, entry_id: str, word_freq: Counter) -> None:
         pass
 
+    @abstractmethod
+    def save_batch(self, records: List[EntryRecord], checkpoint: Optional[FileCheckpoint] = None) -> None:
+        pass
+
+    @abstractmethod
+    def save_entries(self, records: Iterable[EntryRecord], batch_size: int = BATCH_SIZE) -> int:
+        pass
+
+    @abstractmethod
+    def save_checkpoint(self, checkpoint: FileCheckpoint) -> None:
+        pass
+
+    @abstractmethod
+    def get_file_manifest(self, content_hash: str) -> Optional[ManifestEntry]:
+        pass
+
+    @abstractmethod
+    def start_file(self, content_hash: str, file_name: str, size: int) -> None:
+        pass
+
+    @abstractmethod
+    def complete_file(self, content_hash: str) -> None:
+        pass
+
+    @abstractmethod
+    def count_completed_files(self) -> int:
+        pass
+
+    @abstractmethod
+    def get_top_words(self, limit: int) -> List[Tuple[str, int]]:
+        pass
+
+    @abstractmethod
+    def get_top_ngrams(self, limit: int, n: Optional[int] = None) -> List[Tuple[str, int]]:
+        pass
+
+    @abstractmethod
+    def get_word_count(self, word: str) -> int:
+        pass
+
+    @abstractmethod
+    def get_ngram_count(self, ngram: str) -> int:
+        pass
+
+    @abstractmethod
+    def get_document_frequency(self, word: str) -> int:
+        pass
+
+    @abstractmethod
+    def get_ngram_document_frequency(self, ngram: str) -> int:
+        pass
+
+    @abstractmethod
+    def get_entry_count(self) -> int:
+        pass
+
+    @abstractmethod
+    def get_entry_text(self, entry_id: str) -> Optional[str]:
+        pass
+
+    @abstractmethod
+    def get_stopwords(self) -> StopwordSet:
+        pass
+
+    @abstractmethod
+    def add_stopwords_version(self, words: Iterable[str]) -> int:
+        pass
+
+    @abstractmethod
+    def rebuild_filtered_aggregates(self, chunk_size: int = REBUILD_CHUNK_SIZE) -> int:
+        pass
+
+    @abstractmethod
+    def get_heavy_hitters(self) -> HeavyHitters:
+        pass
+
+    @abstractmethod
+    def get_generation(self) -> int:
+        pass
+
+    @abstractmethod
+    def merge_heavy_hitters(self, heavy_hitters: HeavyHitters) -> None:
+        pass
+
 
 class TextProcessorDAO(TextProcessorDAOInterface):
     """
         Concrete implementation of TextProcessorDAOInterface for SQLite database operations.
     """
-    def __init__(self, db_client: Connection):
+    # Maximum number of words looked up per query, below SQLite's host parameter limit
+    LOOKUP_CHUNK_SIZE = 500
+
+    def __init__(self, db_client: Connection, metrics: Optional[Metrics] = None,
+                 compress_texts: bool = COMPRESS_TEXTS, heavy_hitters: bool = HEAVY_HITTERS,
+                 ngram_min_count: int = NGRAM_MIN_COUNT, ngram_max_vocabulary: int = NGRAM_MAX_VOCABULARY,
+                 ngram_prune_interval: int = NGRAM_PRUNE_INTERVAL):
         """
             Initialize the DAO with a database connection.
 
             Args:
                 db_client (Connection): SQLite database connection object.
+                metrics (Metrics, optional): Metrics of the pipeline. Defaults to disabled metrics.
+                compress_texts (bool): Store new texts zlib-compressed when it makes them smaller.
+                    Texts are read back the same way whether they were compressed or not.
+                heavy_hitters (bool): Also count the saved words in the heavy-hitters sketches,
+                    stored in the same transactions as the word frequencies.
+                ngram_min_count (int): N-grams seen fewer times are pruned, once they had a whole
+                    pruning interval to reach this count.
+                ngram_max_vocabulary (int): Maximum number of n-grams kept by a pruning, the most
+                    frequent ones.
+                ngram_prune_interval (int): Number of entries with n-gram frequencies saved between
+                    two prunings.
         """
+        if ngram_prune_interval < 1:
+            raise ValueError(f"N-gram pruning interval must be positive: {ngram_prune_interval}")
         self.__conn = db_client
+        self.metrics = metrics or Metrics()
+        self.compress_texts = compress_texts
+        self.heavy_hitters = heavy_hitters
+        # In-memory cache of the 'words' table, so inserts don't look up every token
+        self.__word_ids: Dict[str, int] = {}
+        # Sketches as last committed, loaded on first use
+        self.__heavy_hitters: Optional[HeavyHitters] = None
+        # Active stopword set, reloaded when a new version is added
+        self.__stopwords: Optional[StopwordSet] = None
+        self.ngram_min_count = ngram_min_count
+        self.ngram_max_vocabulary = ngram_max_vocabulary
+        self.ngram_prune_interval = ngram_prune_interval
+        # Entries with n-grams committed since the last pruning, and the highest n-gram id at that time
+        self.__ngram_entries = 0
+        self.__ngram_floor: Optional[int] = None
+        # Number of commits that changed the data, so that readers know when their cached results are stale
+        self.__generation = 0
 
     def save_entry(self, entry_id: str, source: str, text: str) -> None:
         """
-            Save a text entry to the database.
+            Save a text entry to the database, storing its text only if no entry has it yet.
 
             Args:
                 entry_id (str): Unique identifier for the entry.
@@ -43,10 +233,12 @@ class TextProcessorDAO(TextProcessorDAOInterface):
         """
         c = None
         try:
-            c = self.__conn.cursor()
-            # Insert or replace the entry in the 'entries' table
-            c.execute("INSERT OR REPLACE INTO entries VALUES (?, ?, ?)", (entry_id, source, text))
-            self.__conn.commit()
+            with self.metrics.timer('save_entry'):
+                c = self.__conn.cursor()
+                # Insert or replace the entry in the 'entries' table
+                self._replace_entries(c, [(entry_id, source, text, None)])
+                self.__conn.commit()
+            self.__generation += 1
         except SQLiteError as e:
             self.__conn.rollback()  # Rollback changes in case of error
             raise SQLiteError(f"Error saving entry: {e}")
@@ -67,14 +259,843 @@ class TextProcessorDAO(TextProcessorDAOInterface):
         """
         c = None
         try:
-            c = self.__conn.cursor()
-            # Insert word frequencies into the 'word_frequencies' table
+            with self.metrics.timer('save_words_frequency'):
+                c = self.__conn.cursor()
+                # Like in save_batch, the sketches only count the frequencies of an entry once
+                saved = c.execute("SELECT 1 FROM entry_word_counts WHERE entry_id = ?", (entry_id,)).fetchone()
+                # Replace the word frequencies of the entry in the 'word_frequencies' table
+                word_ids = self._replace_word_frequencies(c, {entry_id: word_freq})
+                self._replace_entry_word_counts(c, {entry_id: word_freq})
+                self._update_heavy_hitters(c, [] if saved else [word_freq])
+                self.__conn.commit()
+            self.__generation += 1
+            self.__word_ids.update(word_ids)
+        except SQLiteError as e:
+            self.__conn.rollback()  # Rollback changes in case of error
+            self.__heavy_hitters = None
+            raise SQLiteError(f"Error saving word frequencies: {e}")
+        finally:
+            if c:
+                c.close()
+
+    def save_batch(self, records: List[EntryRecord], checkpoint: Optional[FileCheckpoint] = None) -> None:
+        """
+            Save a batch of entries and their word frequencies in a single transaction.
+
+            Re-saved entries atomically replace their previous word frequencies, and their previous
+            n-gram frequencies when the records have some. Texts are stored once, whatever the
+            number of entries having them. An entry repeated in the batch is saved once, with its
+            last occurrence.
+
+            Args:
+                records (List[EntryRecord]): Entries to be saved.
+                checkpoint (FileCheckpoint, optional): Position of the file reached by this batch,
+                    recorded in the ingestion manifest within the same transaction.
+
+            Raises:
+                SQLiteError: If there's an error in database operations. The whole batch is rolled back.
+        """
+        c = None
+        try:
+            with self.metrics.timer('save_batch'):
+                c = self.__conn.cursor()
+                # An entry repeated in the batch is replaced by its last occurrence
+                records = list({record.entry_id: record for record in records}.values())
+                existing_ids = self._replace_entries(c, [(record.entry_id, record.source, record.text, record.digest)
+                                                         for record in records])
+                word_freqs = {record.entry_id: record.word_freq for record in records}
+                word_ids = self._replace_word_frequencies(c, word_freqs)
+                self._replace_entry_word_counts(c, word_freqs)
+                self._update_heavy_hitters(c, [word_freq for entry_id, word_freq in word_freqs.items()
+                                               if entry_id not in existing_ids])
+                ngram_freqs = {record.entry_id: record.ngram_freq for record in records
+                               if record.ngram_freq is not None}
+                ngram_floor = self._replace_ngram_frequencies(c, ngram_freqs) if ngram_freqs else None
+                if checkpoint:
+                    c.execute("UPDATE ingest_manifest SET checkpoint_offset = ?, updated_at = CURRENT_TIMESTAMP "
+                              "WHERE content_hash = ?", (checkpoint.offset, checkpoint.content_hash))
+                # The commit is also timed on its own, as it is where the data is synced to disk
+                with self.metrics.timer('commit'):
+                    self.__conn.commit()
+            self.__generation += 1
+            self.__word_ids.update(word_ids)
+            if ngram_floor is not None:
+                self.__ngram_entries, self.__ngram_floor = 0, ngram_floor
+            else:
+                self.__ngram_entries += len(ngram_freqs)
+        except SQLiteError as e:
+            self.__conn.rollback()  # Rollback the whole batch in case of error
+            # The sketches may have counted the batch: they are reloaded as committed
+            self.__heavy_hitters = None
+            raise SQLiteError(f"Error saving batch: {e}")
+        finally:
+            if c:
+                c.close()
+
+    def _replace_entries(self, c: Cursor, entries: Sequence[Tuple[str, str, str, Optional[bytes]]]) -> Set[str]:
+        """
+            Insert or replace entries, storing their texts in 'texts' by content hash.
+
+            Texts that are no longer referenced by any entry once the entries are replaced are
+            deleted, and the entry count is increased by the new entries, all within the caller's
+            transaction.
+
+            Args:
+                c (Cursor): Cursor of the current transaction.
+                entries (Sequence[Tuple[str, str, str, Optional[bytes]]]): The id, source, text and
+                    content hash of the text of each entry, the hash being computed if None. Ids
+                    must be distinct.
+
+            Returns:
+                Set[str]: Ids of the entries that already existed, now replaced.
+        """
+        digests = [text_digest(text) if digest is None else digest for _, _, text, digest in entries]
+        texts = (text for _, _, text, _ in entries)
+        if self.compress_texts:
+            texts = map(compress_text, texts)
+        # A text already stored keeps the form it was first stored in, compressed or not
+        c.executemany("INSERT OR IGNORE INTO texts (content_hash, original_text) VALUES (?, ?)", zip(digests, texts))
+
+        entry_ids = [entry_id for entry_id, _, _, _ in entries]
+        previous_text_ids = set()
+        existing_ids = set()
+        for start in range(0, len(entry_ids), self.LOOKUP_CHUNK_SIZE):
+            chunk = entry_ids[start:start + self.LOOKUP_CHUNK_SIZE]
+            c.execute(f"SELECT id, text_id FROM entries WHERE id IN ({', '.join('?' * len(chunk))})", chunk)
+            for entry_id, text_id in c.fetchall():
+                existing_ids.add(entry_id)
+                previous_text_ids.add(text_id)
+
+        # The text id is looked up through the unique index on the content hash
+        c.executemany("INSERT OR REPLACE INTO entries (id, source, text_id) "
+                      "SELECT ?, ?, id FROM texts WHERE content_hash = ?",
+                      ((entry_id, source, digest) for (entry_id, source, _, _), digest in zip(entries, digests)))
+        c.executemany("DELETE FROM texts WHERE id = ? AND NOT EXISTS (SELECT 1 FROM entries WHERE text_id = ?)",
+                      ((text_id, text_id) for text_id in previous_text_ids))
+        if len(entry_ids) > len(existing_ids):
+            c.execute("UPDATE corpus_totals SET value = value + ? WHERE name = 'entries'",
+                      (len(entry_ids) - len(existing_ids),))
+        return existing_ids
+
+    def _replace_word_frequencies(self, c: Cursor, word_freqs: Dict[str, Counter]) -> Dict[str, int]:
+        """
+            Replace the word frequencies of entries and keep 'word_totals' up to date.
+
+            The previous frequencies of the entries, if any, are subtracted from the totals and
+            deleted before the new ones are inserted and added, all within the caller's transaction.
+
+            Args:
+                c (Cursor): Cursor of the current transaction.
+                word_freqs (Dict[str, Counter]): Word frequencies of each entry id.
+
+            Returns:
+                Dict[str, int]: Id of each word of the entries, to be cached once committed.
+        """
+        c.executemany(
+            "UPDATE word_totals SET "
+            "total_count = total_count - (SELECT frequency FROM word_frequencies "
+            "                             WHERE entry_id = ? AND word_id = word_totals.word_id), "
+            "document_count = document_count - 1 "
+            "WHERE word_id IN (SELECT word_id FROM word_frequencies WHERE entry_id = ?)",
+            ((entry_id, entry_id) for entry_id in word_freqs))
+        c.executemany("DELETE FROM word_frequencies WHERE entry_id = ?", ((entry_id,) for entry_id in word_freqs))
+
+        word_ids = self._resolve_word_ids(c, {word for word_freq in word_freqs.values() for word in word_freq})
+        c.executemany("INSERT INTO word_frequencies VALUES (?, ?, ?)",
+                      ((entry_id, word_ids[word], freq)
+                       for entry_id, word_freq in word_freqs.items() for word, freq in word_freq.items()))
+
+        # Aggregate the batch before touching 'word_totals', so each word is updated once
+        total_counts = Counter()
+        document_counts = Counter()
+        for word_freq in word_freqs.values():
             for word, freq in word_freq.items():
-                c.execute("INSERT INTO word_frequencies VALUES (?, ?, ?)", (entry_id, word, freq))
+                total_counts[word_ids[word]] += freq
+                document_counts[word_ids[word]] += 1
+        c.executemany("INSERT INTO word_totals (word_id, total_count, document_count) VALUES (?, ?, ?) "
+                      "ON CONFLICT (word_id) DO UPDATE SET "
+                      "total_count = total_count + excluded.total_count, "
+                      "document_count = document_count + excluded.document_count",
+                      ((word_id, total, document_counts[word_id]) for word_id, total in total_counts.items()))
+        return word_ids
+
+    def _replace_entry_word_counts(self, c: Cursor, word_freqs: Dict[str, Counter]) -> None:
+        """
+            Replace the number of words and distinct words of entries, excluding the active stopwords.
+
+            Args:
+                c (Cursor): Cursor of the current transaction.
+                word_freqs (Dict[str, Counter]): Word frequencies of each entry id.
+        """
+        version, stopwords = self._active_stopwords(c)
+        rows = []
+        for entry_id, word_freq in word_freqs.items():
+            word_count = sum(word_freq.values())
+            distinct_words = len(word_freq)
+            # Entries counted without stopwords, as by default, skip the lookups
+            if not stopwords.isdisjoint(word_freq):
+                excluded = stopwords.intersection(word_freq)
+                word_count -= sum(word_freq[word] for word in excluded)
+                distinct_words -= len(excluded)
+            rows.append((entry_id, word_count, distinct_words, version))
+        c.executemany("INSERT OR REPLACE INTO entry_word_counts "
+                      "(entry_id, word_count, distinct_words, stopwords_version) VALUES (?, ?, ?, ?)", rows)
+
+    def _replace_ngram_frequencies(self, c: Cursor, ngram_freqs: Dict[str, Counter]) -> Optional[int]:
+        """
+            Replace the n-gram frequencies of entries, keep 'ngram_totals' up to date and prune
+            the n-grams once a pruning interval is reached.
+
+            N-gram ids are not cached like word ids: most n-grams are rare, so the cache would
+            grow with the corpus for few hits.
+
+            Args:
+                c (Cursor): Cursor of the current transaction.
+                ngram_freqs (Dict[str, Counter]): N-gram frequencies of each entry id.
+
+            Returns:
+                Optional[int]: Highest n-gram id after pruning if the n-grams were pruned, to be
+                recorded once committed.
+        """
+        with self.metrics.timer('ngrams'):
+            if self.__ngram_floor is None:
+                # N-grams of previous runs had their interval: the next pruning may drop them
+                c.execute("SELECT COALESCE(MAX(id), 0) FROM ngrams")
+                self.__ngram_floor = c.fetchone()[0]
+            c.executemany(
+                "UPDATE ngram_totals SET "
+                "total_count = total_count - (SELECT frequency FROM ngram_frequencies "
+                "                             WHERE entry_id = ? AND ngram_id = ngram_totals.ngram_id), "
+                "document_count = document_count - 1 "
+                "WHERE ngram_id IN (SELECT ngram_id FROM ngram_frequencies WHERE entry_id = ?)",
+                ((entry_id, entry_id) for entry_id in ngram_freqs))
+            c.executemany("DELETE FROM ngram_frequencies WHERE entry_id = ?", ((entry_id,) for entry_id in ngram_freqs))
+
+            # New n-grams get their ids in order of first occurrence, which breaks ties of top-N queries
+            ngram_ids = self._resolve_ngram_ids(
+                c, list(dict.fromkeys(ngram for ngram_freq in ngram_freqs.values() for ngram in ngram_freq)))
+            c.executemany("INSERT INTO ngram_frequencies VALUES (?, ?, ?)",
+                          ((entry_id, ngram_ids[ngram], freq)
+                           for entry_id, ngram_freq in ngram_freqs.items() for ngram, freq in ngram_freq.items()))
+
+            # Batches have many more n-grams than words, so they are aggregated in SQL rather than in
+            # Python; the sums of each chunk of entries add up
+            entry_ids = list(ngram_freqs)
+            for start in range(0, len(entry_ids), self.LOOKUP_CHUNK_SIZE):
+                chunk = entry_ids[start:start + self.LOOKUP_CHUNK_SIZE]
+                c.execute("INSERT INTO ngram_totals (ngram_id, total_count, document_count) "
+                          "SELECT ngram_id, SUM(frequency), COUNT(*) FROM ngram_frequencies "
+                          f"WHERE entry_id IN ({', '.join('?' * len(chunk))}) GROUP BY ngram_id "
+                          "ON CONFLICT (ngram_id) DO UPDATE SET "
+                          "total_count = total_count + excluded.total_count, "
+                          "document_count = document_count + excluded.document_count", chunk)
+
+            if self.__ngram_entries + len(ngram_freqs) < self.ngram_prune_interval:
+                return None
+            return self._prune_ngrams(c)
+
+    def _resolve_ngram_ids(self, c: Cursor, ngrams: List[str]) -> Dict[str, int]:
+        """
+            Map n-grams to their ids in the 'ngrams' table, adding the missing ones.
+
+            The missing n-grams are given the next ids directly rather than being looked up again
+            once inserted: the transaction holds the write lock, so no other writer can take them.
+
+            Args:
+                c (Cursor): Cursor of the current transaction.
+                ngrams (List[str]): Distinct n-grams to be resolved.
+
+            Returns:
+                Dict[str, int]: Id of each n-gram.
+        """
+        ngram_ids = {}
+        for start in range(0, len(ngrams), self.LOOKUP_CHUNK_SIZE):
+            chunk = ngrams[start:start + self.LOOKUP_CHUNK_SIZE]
+            c.execute(f"SELECT ngram, id FROM ngrams WHERE ngram IN ({', '.join('?' * len(chunk))})", chunk)
+            ngram_ids.update(c.fetchall())
+        missing = [ngram for ngram in ngrams if ngram not in ngram_ids]
+        if missing:
+            # The sequence never decreases, even when the n-grams with the highest ids are pruned
+            c.execute("SELECT COALESCE((SELECT seq FROM sqlite_sequence WHERE name = 'ngrams'), 0)")
+            first_id = c.fetchone()[0] + 1
+            new_ids = dict(zip(missing, range(first_id, first_id + len(missing))))
+            c.executemany("INSERT INTO ngrams (id, ngram, n) VALUES (?, ?, ?)",
+                          ((ngram_id, ngram, ngram.count(' ') + 1) for ngram, ngram_id in new_ids.items()))
+            ngram_ids.update(new_ids)
+        return ngram_ids
+
+    def _prune_ngrams(self, c: Cursor) -> int:
+        """
+            Drop the long tail of the n-grams, with their frequencies and totals.
+
+            N-grams seen fewer than `ngram_min_count` times are dropped if they already existed at
+            the previous pruning, so new n-grams always get a whole interval to reach the count.
+            Then only the `ngram_max_vocabulary` most frequent n-grams are kept. An n-gram seen again
+            after being dropped starts over from its new occurrences.
+
+            Args:
+                c (Cursor): Cursor of the current transaction.
+
+            Returns:
+                int: Highest n-gram id after pruning, the floor of the next pruning.
+        """
+        with self.metrics.timer('ngram_pruning'):
+            c.execute("CREATE TEMP TABLE IF NOT EXISTS pruned_ngrams (id INTEGER PRIMARY KEY)")
+            c.execute("INSERT INTO pruned_ngrams SELECT ngram_id FROM ngram_totals "
+                      "WHERE total_count < ? AND ngram_id <= ?", (self.ngram_min_count, self.__ngram_floor))
+            c.execute("INSERT INTO pruned_ngrams SELECT ngram_id FROM ngram_totals "
+                      "WHERE ngram_id NOT IN pruned_ngrams "
+                      "ORDER BY total_count DESC, ngram_id LIMIT -1 OFFSET ?", (self.ngram_max_vocabulary,))
+            c.execute("DELETE FROM ngram_frequencies WHERE ngram_id IN pruned_ngrams")
+            c.execute("DELETE FROM ngram_totals WHERE ngram_id IN pruned_ngrams")
+            c.execute("DELETE FROM ngrams WHERE id IN pruned_ngrams")
+            self.metrics.increment('ngrams_pruned', c.rowcount)
+            c.execute("DELETE FROM pruned_ngrams")
+            c.execute("SELECT COALESCE(MAX(id), 0) FROM ngrams")
+            return c.fetchone()[0]
+
+    def _update_heavy_hitters(self, c: Cursor, word_freqs: Iterable[Counter]) -> None:
+        """
+            Count words in the heavy-hitters sketches and store them, when the mode is enabled.
+
+            The word frequencies are aggregated first, so each distinct word of a batch updates the
+            sketches once. Unlike 'word_totals', the sketches cannot forget the previous frequencies
+            of a re-saved entry, so only the entries whose frequencies were not saved yet are
+            counted: a batch saved again, e.g. on resume after a shard failed, is not counted twice.
+
+            Args:
+                c (Cursor): Cursor of the current transaction.
+                word_freqs (Iterable[Counter]): Word frequencies to be counted.
+        """
+        if not self.heavy_hitters:
+            return
+        with self.metrics.timer('heavy_hitters'):
+            counts = Counter()
+            for word_freq in word_freqs:
+                counts.update(word_freq)
+            heavy_hitters = self.get_heavy_hitters()
+            heavy_hitters.update_counts(counts)
+            self._store_heavy_hitters(c, heavy_hitters)
+
+    @staticmethod
+    def _store_heavy_hitters(c: Cursor, heavy_hitters: HeavyHitters) -> None:
+        """
+            Write the sketches to the 'sketches' table, within the caller's transaction.
+
+            Args:
+                c (Cursor): Cursor of the current transaction.
+                heavy_hitters (HeavyHitters): Sketches to be stored.
+        """
+        c.executemany("INSERT OR REPLACE INTO sketches (name, data, updated_at) VALUES (?, ?, CURRENT_TIMESTAMP)",
+                      heavy_hitters.to_blobs().items())
+
+    def _resolve_word_ids(self, c: Cursor, words: Set[str]) -> Dict[str, int]:
+        """
+            Map words to their ids in the 'words' table, adding the missing ones.
+
+            Words already in the cache are not looked up. The cache itself is only updated by the
+            caller once the transaction commits, so a rollback never leaves unknown ids in it.
+
+            Args:
+                c (Cursor): Cursor of the current transaction.
+                words (Set[str]): Words to be resolved.
+
+            Returns:
+                Dict[str, int]: Id of each word.
+        """
+        word_ids = {word: self.__word_ids[word] for word in words if word in self.__word_ids}
+        missing = [word for word in words if word not in word_ids]
+        if missing:
+            c.executemany("INSERT OR IGNORE INTO words (word) VALUES (?)", ((word,) for word in missing))
+            for start in range(0, len(missing), self.LOOKUP_CHUNK_SIZE):
+                chunk = missing[start:start + self.LOOKUP_CHUNK_SIZE]
+                c.execute(f"SELECT word, id FROM words WHERE word IN ({', '.join('?' * len(chunk))})", chunk)
+                word_ids.update(c.fetchall())
+        return word_ids
+
+    def save_entries(self, records: Iterable[EntryRecord], batch_size: int = BATCH_SIZE) -> int:
+        """
+            Save entries in batches, committing once per batch.
+
+            The records are consumed lazily, so at most `batch_size` entries are held in memory.
+            A batch that fails is rolled back and skipped; the remaining batches are still saved.
+
+            Args:
+                records (Iterable[EntryRecord]): Entries to be saved.
+                batch_size (int): Maximum number of entries written per transaction.
+
+            Returns:
+                int: Number of entries successfully saved.
+        """
+        if batch_size < 1:
+            raise ValueError(f"Batch size must be positive: {batch_size}")
+
+        saved = 0
+        records = iter(records)
+        while True:
+            batch = list(islice(records, batch_size))
+            if not batch:
+                break
+            try:
+                self.save_batch(batch)
+                saved += len(batch)
+            except SQLiteError as e:
+                print(f"Skipping batch of {len(batch)} entries: {e}")
+        return saved
+
+    def save_checkpoint(self, checkpoint: FileCheckpoint) -> None:
+        """
+            Record the position of a file reached by entries saved without a checkpoint, e.g. by
+            several batches that had to be committed first.
+
+            Args:
+                checkpoint (FileCheckpoint): Position of the file, recorded in the ingestion manifest.
+
+            Raises:
+                SQLiteError: If there's an error in database operations.
+        """
+        self._write_manifest("UPDATE ingest_manifest SET checkpoint_offset = ?, updated_at = CURRENT_TIMESTAMP "
+                             "WHERE content_hash = ?", (checkpoint.offset, checkpoint.content_hash))
+
+    def get_file_manifest(self, content_hash: str) -> Optional[ManifestEntry]:
+        """
+            Look up a file in the ingestion manifest.
+
+            Args:
+                content_hash (str): Content hash of the file.
+
+            Returns:
+                Optional[ManifestEntry]: The manifest entry, or None if the file was never seen.
+
+            Raises:
+                SQLiteError: If there's an error in database operations.
+        """
+        try:
+            row = self.__conn.execute(
+                "SELECT content_hash, file_name, size, checkpoint_offset, completed FROM ingest_manifest "
+                "WHERE content_hash = ?", (content_hash,)).fetchone()
+        except SQLiteError as e:
+            raise SQLiteError(f"Error retrieving file manifest: {e}")
+        return ManifestEntry(*row[:4], bool(row[4])) if row else None
+
+    def start_file(self, content_hash: str, file_name: str, size: int) -> None:
+        """
+            Register a file in the ingestion manifest, with no committed entries yet.
+
+            Args:
+                content_hash (str): Content hash of the file.
+                file_name (str): Name of the file.
+                size (int): Size of the file in bytes.
+
+            Raises:
+                SQLiteError: If there's an error in database operations.
+        """
+        self._write_manifest("INSERT OR IGNORE INTO ingest_manifest (content_hash, file_name, size) VALUES (?, ?, ?)",
+                             (content_hash, file_name, size))
+
+    def complete_file(self, content_hash: str) -> None:
+        """
+            Mark a file of the ingestion manifest as fully processed.
+
+            Args:
+                content_hash (str): Content hash of the file.
+
+            Raises:
+                SQLiteError: If there's an error in database operations.
+        """
+        self._write_manifest("UPDATE ingest_manifest SET completed = 1, checkpoint_offset = size, "
+                             "updated_at = CURRENT_TIMESTAMP WHERE content_hash = ?", (content_hash,))
+
+    def count_completed_files(self) -> int:
+        """
+            Count the files of the ingestion manifest that were fully processed.
+
+            Returns:
+                int: Number of completed files.
+
+            Raises:
+                SQLiteError: If there's an error in database operations.
+        """
+        try:
+            return self.__conn.execute("SELECT COUNT(*) FROM ingest_manifest WHERE completed").fetchone()[0]
+        except SQLiteError as e:
+            raise SQLiteError(f"Error retrieving file manifest: {e}")
+
+    def _write_manifest(self, sql: str, parameters: Tuple) -> None:
+        """
+            Run a single statement on the ingestion manifest and commit it.
+
+            Args:
+                sql (str): Statement to be run.
+                parameters (Tuple): Parameters of the statement.
+
+            Raises:
+                SQLiteError: If there's an error in database operations.
+        """
+        try:
+            self.__conn.execute(sql, parameters)
             self.__conn.commit()
         except SQLiteError as e:
             self.__conn.rollback()  # Rollback changes in case of error
-            raise SQLiteError(f"Error saving word frequencies: {e}")
+            raise SQLiteError(f"Error updating file manifest: {e}")
+
+    def get_top_words(self, limit: int) -> List[Tuple[str, int]]:
+        """
+            Get the most frequent words of the whole corpus, excluding the active stopwords.
+
+            Args:
+                limit (int): Maximum number of words to return.
+
+            Returns:
+                List[Tuple[str, int]]: Words and their total counts, most frequent first.
+
+            Raises:
+                SQLiteError: If there's an error in database operations.
+        """
+        try:
+            return self.__conn.execute(
+                "SELECT w.word, t.total_count FROM word_totals t JOIN words w ON w.id = t.word_id "
+                f"WHERE t.total_count > 0 AND t.word_id NOT IN ({ACTIVE_STOPWORD_IDS}) "
+                "ORDER BY t.total_count DESC, t.word_id LIMIT ?", (limit,)).fetchall()
+        except SQLiteError as e:
+            raise SQLiteError(f"Error retrieving top words: {e}")
+
+    def get_top_ngrams(self, limit: int, n: Optional[int] = None) -> List[Tuple[str, int]]:
+        """
+            Get the most frequent n-grams kept by the pruning, excluding the ones containing an
+            active stopword.
+
+            N-grams are split on the stopwords when counted, so only the ones counted before a
+            word became a stopword are skipped, while walking the totals index.
+
+            Args:
+                limit (int): Maximum number of n-grams to return.
+                n (int, optional): Number of words of the n-grams. Defaults to every size.
+
+            Returns:
+                List[Tuple[str, int]]: N-grams and their total counts, most frequent first.
+
+            Raises:
+                SQLiteError: If there's an error in database operations.
+        """
+        try:
+            stopwords = self.get_stopwords().words
+            cursor = self.__conn.execute(
+                "SELECT g.ngram, t.total_count FROM ngram_totals t JOIN ngrams g ON g.id = t.ngram_id "
+                "WHERE t.total_count > 0 AND (? IS NULL OR g.n = ?) "
+                "ORDER BY t.total_count DESC, t.ngram_id", (n, n))
+            return list(islice((row for row in cursor if not contains_stopword(row[0], stopwords)), limit))
+        except SQLiteError as e:
+            raise SQLiteError(f"Error retrieving top n-grams: {e}")
+
+    def get_word_count(self, word: str) -> int:
+        """
+            Get the total number of occurrences of a word in the corpus.
+
+            Args:
+                word (str): Word to look up.
+
+            Returns:
+                int: Total count of the word, 0 if it never occurred or is an active stopword.
+
+            Raises:
+                SQLiteError: If there's an error in database operations.
+        """
+        return self._get_word_total(word, 'total_count')
+
+    def get_ngram_count(self, ngram: str) -> int:
+        """
+            Get the total number of occurrences of an n-gram kept by the pruning.
+
+            Args:
+                ngram (str): N-gram to look up, its words separated by single spaces.
+
+            Returns:
+                int: Total count of the n-gram, 0 if it was never counted, was pruned or contains
+                an active stopword.
+
+            Raises:
+                SQLiteError: If there's an error in database operations.
+        """
+        return self._get_ngram_total(ngram, 'total_count')
+
+    def get_ngram_document_frequency(self, ngram: str) -> int:
+        """
+            Get the number of entries containing an n-gram kept by the pruning.
+
+            Args:
+                ngram (str): N-gram to look up, its words separated by single spaces.
+
+            Returns:
+                int: Number of entries containing the n-gram, 0 if it was never counted, was pruned
+                or contains an active stopword.
+
+            Raises:
+                SQLiteError: If there's an error in database operations.
+        """
+        return self._get_ngram_total(ngram, 'document_count')
+
+    def get_document_frequency(self, word: str) -> int:
+        """
+            Get the number of entries containing a word.
+
+            Args:
+                word (str): Word to look up.
+
+            Returns:
+                int: Number of entries containing the word, 0 if none does or if it is an active stopword.
+
+            Raises:
+                SQLiteError: If there's an error in database operations.
+        """
+        return self._get_word_total(word, 'document_count')
+
+    def get_entry_count(self) -> int:
+        """
+            Get the number of entries, maintained on ingestion rather than counted.
+
+            Returns:
+                int: Number of entries.
+
+            Raises:
+                SQLiteError: If there's an error in database operations.
+        """
+        try:
+            return self.__conn.execute(ENTRY_COUNT).fetchone()[0]
+        except SQLiteError as e:
+            raise SQLiteError(f"Error retrieving entry count: {e}")
+
+    def get_entry_text(self, entry_id: str) -> Optional[str]:
+        """
+            Get the original text of an entry, decompressing it if it was stored compressed.
+
+            Args:
+                entry_id (str): Unique identifier for the entry.
+
+            Returns:
+                Optional[str]: The text, or None if the entry does not exist.
+
+            Raises:
+                SQLiteError: If there's an error in database operations.
+        """
+        try:
+            row = self.__conn.execute("SELECT t.original_text FROM entries e JOIN texts t ON t.id = e.text_id "
+                                      "WHERE e.id = ?", (entry_id,)).fetchone()
+            return decompress_text(row[0]) if row else None
+        except SQLiteError as e:
+            raise SQLiteError(f"Error retrieving entry text: {e}")
+
+    def get_stopwords(self) -> StopwordSet:
+        """
+            Get the active stopword set, the latest version of the 'stopwords' table.
+
+            Returns:
+                StopwordSet: Version and words of the set.
+
+            Raises:
+                SQLiteError: If there's an error in database operations.
+        """
+        c = None
+        try:
+            c = self.__conn.cursor()
+            return self._active_stopwords(c)
+        except SQLiteError as e:
+            raise SQLiteError(f"Error retrieving stopwords: {e}")
+        finally:
+            if c:
+                c.close()
+
+    def _active_stopwords(self, c: Cursor) -> StopwordSet:
+        """
+            Get the active stopword set, reading its words only when its version changed.
+
+            Args:
+                c (Cursor): Cursor used to read the set.
+
+            Returns:
+                StopwordSet: Version and words of the set.
+        """
+        c.execute("SELECT COALESCE(MAX(version), 0) FROM stopword_versions")
+        version = c.fetchone()[0]
+        if self.__stopwords is None or self.__stopwords.version != version:
+            c.execute("SELECT word FROM stopwords WHERE version = ?", (version,))
+            self.__stopwords = StopwordSet(version, frozenset(row[0] for row in c.fetchall()))
+        return self.__stopwords
+
+    def add_stopwords_version(self, words: Iterable[str]) -> int:
+        """
+            Add a new version of the stopword list, which becomes the active one.
+
+            Reports filter the word counts with it right away; the per-entry aggregates follow once
+            rebuild_filtered_aggregates has run.
+
+            Args:
+                words (Iterable[str]): Stopwords, lowercased like the counted words.
+
+            Returns:
+                int: Version of the new set.
+
+            Raises:
+                SQLiteError: If there's an error in database operations.
+        """
+        c = None
+        try:
+            c = self.__conn.cursor()
+            c.execute("INSERT INTO stopword_versions DEFAULT VALUES")
+            version = c.lastrowid
+            c.executemany("INSERT OR IGNORE INTO stopwords (version, word) VALUES (?, ?)",
+                          ((version, word.lower()) for word in words))
+            self.__conn.commit()
+            self.__generation += 1
+            return version
+        except SQLiteError as e:
+            self.__conn.rollback()  # Rollback changes in case of error
+            raise SQLiteError(f"Error saving stopwords: {e}")
+        finally:
+            if c:
+                c.close()
+
+    def rebuild_filtered_aggregates(self, chunk_size: int = REBUILD_CHUNK_SIZE) -> int:
+        """
+            Recompute the per-entry aggregates computed with a previous stopword set.
+
+            Only 'entry_word_counts' depends on the stopwords, and it is recomputed in SQL from
+            'word_frequencies', without tokenizing anything. Each chunk is its own short
+            transaction, so the rebuild can run while another process is ingesting.
+
+            Args:
+                chunk_size (int): Maximum number of entries recomputed per transaction.
+
+            Returns:
+                int: Number of entries recomputed.
+
+            Raises:
+                SQLiteError: If there's an error in database operations.
+        """
+        if chunk_size < 1:
+            raise ValueError(f"Chunk size must be positive: {chunk_size}")
+        rebuilt = 0
+        while True:
+            c = None
+            try:
+                c = self.__conn.cursor()
+                version, _ = self._active_stopwords(c)
+                c.execute("INSERT OR REPLACE INTO entry_word_counts "
+                          "(entry_id, word_count, distinct_words, stopwords_version) "
+                          "SELECT e.entry_id, COALESCE(SUM(f.frequency), 0), COUNT(f.word_id), ? "
+                          "FROM entry_word_counts e "
+                          "LEFT JOIN word_frequencies f ON f.entry_id = e.entry_id "
+                          f"AND f.word_id NOT IN ({ACTIVE_STOPWORD_IDS}) "
+                          "WHERE e.entry_id IN (SELECT entry_id FROM entry_word_counts "
+                          "                     WHERE stopwords_version < ? LIMIT ?) "
+                          "GROUP BY e.entry_id", (version, version, chunk_size))
+                chunk = c.rowcount
+                self.__conn.commit()
+                self.__generation += 1
+            except SQLiteError as e:
+                self.__conn.rollback()  # Rollback changes in case of error
+                raise SQLiteError(f"Error rebuilding aggregates: {e}")
+            finally:
+                if c:
+                    c.close()
+            if not chunk:
+                return rebuilt
+            rebuilt += chunk
+
+    def get_heavy_hitters(self) -> HeavyHitters:
+        """
+            Get the heavy-hitters sketches of every word saved so far in heavy-hitters mode.
+
+            The returned sketches are the ones kept up to date by the DAO and must not be modified.
+
+            Returns:
+                HeavyHitters: The sketches, empty if none were stored yet.
+
+            Raises:
+                SQLiteError: If there's an error in database operations.
+                ValueError: If a stored sketch is corrupted.
+        """
+        if self.__heavy_hitters is None:
+            try:
+                blobs = dict(self.__conn.execute("SELECT name, data FROM sketches"))
+            except SQLiteError as e:
+                raise SQLiteError(f"Error retrieving sketches: {e}")
+            self.__heavy_hitters = HeavyHitters.from_blobs(blobs)
+        return self.__heavy_hitters
+
+    def merge_heavy_hitters(self, heavy_hitters: HeavyHitters) -> None:
+        """
+            Add sketches built elsewhere, e.g. by other processes or from another database, to the
+            stored ones.
+
+            Args:
+                heavy_hitters (HeavyHitters): Sketches to be added, left unchanged.
+
+            Raises:
+                SQLiteError: If there's an error in database operations.
+                ValueError: If the dimensions of the Count-Min sketches differ.
+        """
+        c = None
+        try:
+            c = self.__conn.cursor()
+            merged = self.get_heavy_hitters().merge(heavy_hitters)
+            self._store_heavy_hitters(c, merged)
+            self.__conn.commit()
+            self.__generation += 1
+        except SQLiteError as e:
+            self.__conn.rollback()  # Rollback changes in case of error
+            self.__heavy_hitters = None
+            raise SQLiteError(f"Error saving sketches: {e}")
         finally:
             if c:
                 c.close()
+
+    def get_generation(self) -> int:
+        """
+            Get the ingest generation of this DAO: the number of its commits that changed the data.
+
+            It is read from memory, so readers in the same process can check it on every query.
+
+            Returns:
+                int: The generation, increasing with every commit.
+        """
+        return self.__generation
+
+    def _get_word_total(self, word: str, column: str) -> int:
+        """
+            Read a column of 'word_totals' for a word.
+
+            Args:
+                word (str): Word to look up.
+                column (str): Either 'total_count' or 'document_count'.
+
+            Returns:
+                int: Value of the column, 0 if the word is unknown.
+        """
+        try:
+            row = self.__conn.execute(
+                f"SELECT t.{column} FROM word_totals t JOIN words w ON w.id = t.word_id "
+                f"WHERE w.word = ? AND t.word_id NOT IN ({ACTIVE_STOPWORD_IDS})", (word,)).fetchone()
+            return row[0] if row else 0
+        except SQLiteError as e:
+            raise SQLiteError(f"Error retrieving word totals: {e}")
+
+    def _get_ngram_total(self, ngram: str, column: str) -> int:
+        """
+            Read a column of 'ngram_totals' for an n-gram.
+
+            Args:
+                ngram (str): N-gram to look up.
+                column (str): Either 'total_count' or 'document_count'.
+
+            Returns:
+                int: Value of the column, 0 if the n-gram is unknown or contains an active stopword.
+        """
+        try:
+            if contains_stopword(ngram, self.get_stopwords().words):
+                return 0
+            row = self.__conn.execute(f"SELECT t.{column} FROM ngram_totals t JOIN ngrams g ON g.id = t.ngram_id "
+                                      "WHERE g.ngram = ?", (ngram,)).fetchone()
+            return row[0] if row else 0
+        except SQLiteError as e:
+            raise SQLiteError(f"Error retrieving n-gram totals: {e}")
@@ -6,6 +6,84 @@ INPUT_FOLDER = os.path.join('app', 'inputs', 'entries')
 OUTPUT_FOLDER = os.path.join('app', 'inputs', 'processed')
 DATABASE_NAME = os.path.join('app', 'storage', 'database', 'word_frequency.db')
 
+# Number of database files the entries are spread over by the hash of their ids, written concurrently (1 for a
+# single database)
+SHARDS = 1
+
+# SQLite connection profile: 'bulk-load', 'durable' or 'read-mostly'
+DATABASE_PROFILE = 'durable'
+
+# Whether texts are stored zlib-compressed, and the zlib compression level (1 to 9)
+COMPRESS_TEXTS = False
+TEXT_COMPRESSION_LEVEL = 6
+
+# Input files: plain CSV files, or CSV files compressed with gzip, bzip2 or xz, decompressed while reading
+CSV_EXTENSIONS = ('.csv', '.csv.gz', '.csv.bz2', '.csv.xz')
+
+# Number of entries written per database transaction
+BATCH_SIZE = 1000
+
+# Whether every word is counted at ingest time, stopwords included, so that stopwords only apply at query time
+RAW_COUNTS = False
+
+# Number of entries whose stopword-dependent aggregates are recomputed per transaction
+REBUILD_CHUNK_SIZE = 5000
+
+# Number of characters of the windows in which entries longer than that are tokenized and hashed, so that huge entries
+# need memory for a window rather than for several copies of their text
+TEXT_WINDOW_SIZE = 1 << 20
+
+# Number of distinct texts whose word frequencies are cached by the text processor (0 disables the cache)
+TEXT_CACHE_SIZE = 4096
+
+# Number of worker processes used to tokenize entries (1 processes files sequentially)
+WORKERS = 1
+
+# Heavy-hitters mode: approximate corpus-wide word counts kept in fixed memory next to the exact ones. Counts of
+# the top words are overestimated by at most TOP_WORDS_EPSILON times the number of words ingested, and any
+# word count by at most WORD_COUNTS_EPSILON times that number, with a probability of 1 - WORD_COUNTS_DELTA
+HEAVY_HITTERS = False
+TOP_WORDS_EPSILON = 0.001
+WORD_COUNTS_EPSILON = 0.001
+WORD_COUNTS_DELTA = 0.01
+
+# N-gram mode: phrases of NGRAM_SIZES consecutive words counted next to the words, never spanning a stopword.
+# Every NGRAM_PRUNE_INTERVAL entries, n-grams seen fewer than NGRAM_MIN_COUNT times since at least the previous
+# pruning are dropped, then only the NGRAM_MAX_VOCABULARY most frequent ones are kept
+NGRAMS = False
+NGRAM_SIZES = (2, 3)
+NGRAM_MIN_COUNT = 2
+NGRAM_MAX_VOCABULARY = 1_000_000
+NGRAM_PRUNE_INTERVAL = 50_000
+
+# Asyncio pipeline: number of batches buffered between two stages
+PIPELINE_QUEUE_SIZE = 4
+
+# Number of rows fetched per query when streaming reports, and default number of rows of top-N reports
+REPORT_PAGE_SIZE = 1000
+REPORT_LIMIT = 20
+
+# Number of hits per page of search results
+SEARCH_LIMIT = 10
+
+# Query service: maximum number of results cached, seconds a result is served from the cache at most, and
+# seconds between two reads of SQLite's data_version when following the commits of other connections
+QUERY_CACHE_SIZE = 1024
+QUERY_CACHE_TTL = 60.0
+QUERY_DATA_VERSION_INTERVAL = 1.0
+
+# Watch mode: seconds a file must stay unchanged to be processed, seconds between two readiness checks,
+# seconds between two full scans of the input folder, and maximum number of files tracked at once
+WATCH_SETTLE_SECONDS = 1.0
+WATCH_POLL_INTERVAL = 0.5
+WATCH_RESCAN_INTERVAL = 30.0
+WATCH_MAX_PENDING = 1000
+
+# Instances sharing the input folder claim its files: the files of an instance are reclaimed by the others once it
+# has not renewed its lease for CLAIM_LEASE_SECONDS, and it renews it every CLAIM_HEARTBEAT_INTERVAL seconds
+CLAIM_LEASE_SECONDS = 60.0
+CLAIM_HEARTBEAT_INTERVAL = 10.0
+
 # Define a set of common words to be ignored in word frequency analysis
 COMMON_WORDS = {"a", "the", "and", "or", "but", "if", "then", "else", "when", "at", "by", "from", "of", "on", "for",
                 "with", "about", "against", "between", "into", "through", "during", "before", "after", "above", "below",
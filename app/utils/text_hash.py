@@ -0,0 +1,45 @@
+import hashlib
+
+from app.utils.constants import TEXT_WINDOW_SIZE
+from app.utils.text_windows import text_windows
+
+
+def normalize_text(text: str) -> str:
+    """
+        Normalize a text for content addressing: runs of whitespace, line breaks included, become
+        a single space and the surrounding whitespace is removed.
+
+        Whitespace never belongs to a word, so texts with the same normalized form have the same
+        word frequencies.
+
+        Args:
+            text (str): Text to normalize.
+
+        Returns:
+            str: Normalized text.
+    """
+    return ' '.join(text.split())
+
+
+def text_digest(text: str, window_size: int = TEXT_WINDOW_SIZE) -> bytes:
+    """
+        Content hash of a text, insensitive to whitespace differences.
+
+        Long texts are normalized and hashed window by window, never copied whole.
+
+        Args:
+            text (str): Text to hash.
+            window_size (int): Number of characters normalized at a time.
+
+        Returns:
+            bytes: SHA-256 digest of the normalized text.
+    """
+    digest = hashlib.sha256()
+    separator = b''
+    for window in text_windows(text, window_size):
+        normalized = normalize_text(window)
+        if normalized:
+            # The windows end with whitespace, which joins their normalized forms with a space
+            digest.update(separator + normalized.encode('utf-8'))
+            separator = b' '
+    return digest.digest()
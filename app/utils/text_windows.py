@@ -0,0 +1,40 @@
+import re
+from typing import Iterator
+
+# Whitespace followed by no other whitespace up to the end of the searched range
+LAST_WHITESPACE = re.compile(r'\s(?=\S*\Z)')
+WHITESPACE = re.compile(r'\s')
+
+
+def text_windows(text: str, window_size: int) -> Iterator[str]:
+    """
+        Split a text into consecutive windows of at most about `window_size` characters, each
+        ending right after a whitespace character.
+
+        Numbers, words, emojis and the context of case conversions never span whitespace, so each
+        window can be tokenized or normalized on its own with the same results as the whole text.
+        A window only exceeds the size when the text has no whitespace for longer than it.
+
+        Args:
+            text (str): Text to split.
+            window_size (int): Target number of characters of a window.
+
+        Yields:
+            str: Windows of the text, in order, the text itself if it fits in one window.
+
+        Raises:
+            ValueError: If the window size is not positive.
+    """
+    if window_size < 1:
+        raise ValueError(f"Window size must be positive: {window_size}")
+    start, length = 0, len(text)
+    while length - start > window_size:
+        end = start + window_size
+        # Searched within the bounds of the window, without copying it
+        match = LAST_WHITESPACE.search(text, start, end) or WHITESPACE.search(text, end)
+        if match is None:
+            break
+        yield text[start:match.end()]
+        start = match.end()
+    if start < length:
+        yield text[start:]
@@ -0,0 +1,274 @@
+import os
+import socket
+import threading
+import time
+from typing import Iterable, Iterator, List, Optional
+
+from app.metrics.metrics import Metrics
+from app.utils.constants import CLAIM_HEARTBEAT_INTERVAL, CLAIM_LEASE_SECONDS
+
+# Folder of the input folder holding the files claimed by each instance, one sub-folder per instance
+CLAIMS_FOLDER = '.claims'
+# File of an instance's folder whose modification time is the heartbeat of the instance
+HEARTBEAT_FILE = '.heartbeat'
+
+
+def default_worker_id() -> str:
+    """
+        Id of this instance, unique across the hosts sharing an input folder.
+
+        Returns:
+            str: Host name and process id.
+    """
+    return f"{socket.gethostname()}-{os.getpid()}".replace(os.sep, '_')
+
+
+class FileClaimer:
+    """
+        Share the files of an input folder between several instances, on one host or on several
+        hosts mounting the same folder.
+
+        An instance claims a file by renaming it into its own folder of '.claims'. A rename within
+        a file system is atomic, also over NFS, so exactly one instance gets each file. Its lease
+        on the files it claimed is the modification time of its heartbeat file, touched by a
+        background thread. When an instance stops heartbeating for longer than the lease, e.g.
+        because it crashed, the others rename its files back into the input folder to be claimed
+        again, where their checkpoints let them resume.
+
+        A file is processed at least once: an instance presumed dead but only stalled may finish a
+        reclaimed file too, which is harmless as entries are replaced rather than added.
+    """
+    def __init__(self, folder: str, worker_id: Optional[str] = None, lease_seconds: float = CLAIM_LEASE_SECONDS,
+                 heartbeat_interval: float = CLAIM_HEARTBEAT_INTERVAL, metrics: Optional[Metrics] = None):
+        """
+            Initialize the claimer.
+
+            Args:
+                folder (str): Input folder shared by the instances.
+                worker_id (str, optional): Id of this instance. Defaults to its host name and process id.
+                    An instance restarted with the same id first processes the files it had claimed.
+                lease_seconds (float): Time after which the files of an instance that stopped
+                    heartbeating are reclaimed. Must cover the clock skew between the hosts.
+                heartbeat_interval (float): Time between two heartbeats, well below the lease.
+                metrics (Metrics, optional): Metrics the failed heartbeats, expired leases and
+                    released files are counted in. Defaults to disabled metrics.
+
+            Raises:
+                ValueError: If the heartbeat interval is not below the lease.
+        """
+        if not 0 < heartbeat_interval < lease_seconds:
+            raise ValueError(f"Heartbeat interval must be positive and below the lease: {heartbeat_interval}")
+        self.folder = os.path.abspath(folder)
+        self.claims_folder = os.path.join(self.folder, CLAIMS_FOLDER)
+        self.worker_id = worker_id or default_worker_id()
+        self.worker_folder = os.path.join(self.claims_folder, self.worker_id)
+        self.lease_seconds = lease_seconds
+        self.heartbeat_interval = heartbeat_interval
+        self.metrics = metrics or Metrics()
+        self._stop = threading.Event()
+        self._heartbeat_thread: Optional[threading.Thread] = None
+
+    def __enter__(self) -> 'FileClaimer':
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
+
+    def start(self) -> None:
+        """
+            Create the folder of this instance and start heartbeating.
+        """
+        self.heartbeat()
+        self._stop.clear()
+        self._heartbeat_thread = threading.Thread(target=self._heartbeat_loop, name='claims-heartbeat', daemon=True)
+        self._heartbeat_thread.start()
+
+    def stop(self) -> None:
+        """
+            Stop heartbeating, put the files still claimed back into the input folder and remove
+            the folder of this instance.
+        """
+        self._stop.set()
+        if self._heartbeat_thread:
+            self._heartbeat_thread.join()
+            self._heartbeat_thread = None
+        self._release_folder(self.worker_folder)
+
+    def heartbeat(self) -> None:
+        """
+            Renew the lease of this instance on its claimed files.
+
+            Raises:
+                OSError: If the heartbeat file cannot be written.
+        """
+        os.makedirs(self.worker_folder, exist_ok=True)
+        heartbeat_path = os.path.join(self.worker_folder, HEARTBEAT_FILE)
+        try:
+            # No explicit time, so that NFS sets the server's time
+            os.utime(heartbeat_path)
+        except FileNotFoundError:
+            open(heartbeat_path, 'a').close()
+
+    def _heartbeat_loop(self) -> None:
+        while not self._stop.wait(self.heartbeat_interval):
+            try:
+                self.heartbeat()
+            except OSError as e:
+                print(f"Error renewing the lease of {self.worker_id}: {e}")
+                self.metrics.increment('claim_heartbeats_failed')
+
+    def claim(self, file_path: str) -> Optional[str]:
+        """
+            Claim a file of the input folder.
+
+            Args:
+                file_path (str): Path of the file in the input folder.
+
+            Returns:
+                Optional[str]: Path of the claimed file, or None if another instance claimed it first.
+        """
+        claimed_path = os.path.join(self.worker_folder, os.path.basename(file_path))
+        try:
+            os.rename(file_path, claimed_path)
+        except FileNotFoundError:
+            return None
+        return claimed_path
+
+    def claim_files(self, file_paths: Iterable[str]) -> Iterator[str]:
+        """
+            Claim files one at a time, as they are consumed, so that the other instances share the
+            files not reached yet. Files left claimed by a previous run of this instance come first.
+
+            Args:
+                file_paths (Iterable[str]): Paths of the files in the input folder.
+
+            Yields:
+                str: Path of each file claimed by this instance.
+        """
+        yield from self.claimed_files()
+        for file_path in file_paths:
+            claimed_path = self.claim(file_path)
+            if claimed_path:
+                yield claimed_path
+
+    def claimed_files(self) -> List[str]:
+        """
+            List the files claimed by this instance.
+
+            Returns:
+                List[str]: Paths of the claimed files, sorted by name.
+        """
+        return self._list_claimed(self.worker_folder)
+
+    def release(self, claimed_path: str) -> bool:
+        """
+            Put a claimed file back into the input folder, unless a file with the same name arrived meanwhile.
+
+            A rename would silently replace a file created under the same name between a check and
+            the rename, so the file is hard-linked into the input folder, which fails if the name
+            is taken, then unlinked from the claims. File systems without hard links fall back to
+            checking first.
+
+            Args:
+                claimed_path (str): Path of the claimed file.
+
+            Returns:
+                bool: Whether the file was put back.
+        """
+        file_path = os.path.join(self.folder, os.path.basename(claimed_path))
+        try:
+            self._move_without_replacing(claimed_path, file_path)
+        except FileExistsError:
+            print(f"Not releasing {claimed_path}: {file_path} already exists")
+            self.metrics.increment('claims_not_released')
+            return False
+        except FileNotFoundError:
+            # Reclaimed by another instance in the meantime
+            return False
+        self.metrics.increment('claims_released')
+        return True
+
+    @staticmethod
+    def _move_without_replacing(source: str, target: str) -> None:
+        """
+            Move a file within a file system, failing if the target exists.
+
+            Raises:
+                FileExistsError: If the target exists.
+                FileNotFoundError: If the source does not exist.
+        """
+        try:
+            os.link(source, target)
+        except (FileExistsError, FileNotFoundError):
+            raise
+        except OSError:
+            # No hard links on this file system
+            if os.path.exists(target):
+                raise FileExistsError(target)
+            os.rename(source, target)
+            return
+        os.unlink(source)
+
+    def reclaim_expired(self) -> int:
+        """
+            Put the files of the instances whose lease expired back into the input folder.
+
+            Several instances may reclaim concurrently: each file is renamed back by only one of them.
+
+            Returns:
+                int: Number of files put back by this instance.
+        """
+        try:
+            worker_ids = os.listdir(self.claims_folder)
+        except FileNotFoundError:
+            return 0
+        reclaimed = 0
+        for worker_id in worker_ids:
+            worker_folder = os.path.join(self.claims_folder, worker_id)
+            if worker_id != self.worker_id and self._is_expired(worker_folder):
+                print(f"Lease of {worker_id} expired, reclaiming its files")
+                self.metrics.increment('claim_leases_expired')
+                reclaimed += self._release_folder(worker_folder)
+        return reclaimed
+
+    def _is_expired(self, worker_folder: str) -> bool:
+        """
+            Whether an instance stopped heartbeating for longer than the lease.
+
+            An instance folder without heartbeat, e.g. left by a crash while it was created, is
+            dated by the folder itself.
+        """
+        for path in (os.path.join(worker_folder, HEARTBEAT_FILE), worker_folder):
+            try:
+                return time.time() - os.stat(path).st_mtime > self.lease_seconds
+            except FileNotFoundError:
+                continue
+        return False
+
+    def _release_folder(self, worker_folder: str) -> int:
+        """
+            Put every file of an instance folder back into the input folder and remove the folder.
+
+            Returns:
+                int: Number of files put back.
+        """
+        released = sum(self.release(claimed_path) for claimed_path in self._list_claimed(worker_folder))
+        try:
+            os.remove(os.path.join(worker_folder, HEARTBEAT_FILE))
+        except FileNotFoundError:
+            pass
+        try:
+            os.rmdir(worker_folder)
+        except OSError:
+            # Not empty, or already removed by another instance
+            pass
+        return released
+
+    @staticmethod
+    def _list_claimed(worker_folder: str) -> List[str]:
+        try:
+            names = sorted(os.listdir(worker_folder))
+        except FileNotFoundError:
+            return []
+        return [os.path.join(worker_folder, name) for name in names if name != HEARTBEAT_FILE]
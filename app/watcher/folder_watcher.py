@@ -0,0 +1,285 @@
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import sys
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+from app.utils.constants import WATCH_MAX_PENDING, WATCH_POLL_INTERVAL, WATCH_RESCAN_INTERVAL, WATCH_SETTLE_SECONDS
+
+# inotify(7) event masks
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_Q_OVERFLOW = 0x00004000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+# struct inotify_event header: wd, mask, cookie, len
+INOTIFY_EVENT = struct.Struct('iIII')
+INOTIFY_BUFFER_SIZE = 64 * 1024
+
+
+class _Inotify:
+    """Minimal ctypes binding of Linux inotify watching a single folder."""
+    def __init__(self, folder: str):
+        libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        self.fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        mask = IN_CREATE | IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO
+        if libc.inotify_add_watch(self.fd, os.fsencode(folder), mask) < 0:
+            errno = ctypes.get_errno()
+            os.close(self.fd)
+            raise OSError(errno, f"inotify_add_watch failed for {folder}")
+
+    def read(self, timeout: float) -> Optional[List[Tuple[int, str]]]:
+        """
+            Wait for events.
+
+            Args:
+                timeout (float): Maximum number of seconds to wait.
+
+            Returns:
+                Optional[List[Tuple[int, str]]]: (mask, file name) of each event, or None if the
+                kernel queue overflowed and events were lost.
+        """
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return []
+        try:
+            buffer = os.read(self.fd, INOTIFY_BUFFER_SIZE)
+        except BlockingIOError:
+            return []
+
+        events = []
+        position = 0
+        while position < len(buffer):
+            _, mask, _, length = INOTIFY_EVENT.unpack_from(buffer, position)
+            position += INOTIFY_EVENT.size
+            name = buffer[position:position + length].rstrip(b'\0')
+            position += length
+            if mask & IN_Q_OVERFLOW:
+                return None
+            events.append((mask, os.fsdecode(name)))
+        return events
+
+    def close(self) -> None:
+        os.close(self.fd)
+
+
+class FolderWatcher:
+    """
+        Watch a folder and report the files that are completely written.
+
+        A file is ready as soon as it is renamed into the folder, which is atomic, or once its
+        size and modification time stop changing for `settle_seconds`. Linux inotify is used
+        when available, and the folder is polled otherwise. The folder is also fully rescanned
+        every `rescan_interval` seconds, which recovers files dropped by backpressure or by an
+        inotify queue overflow.
+    """
+    def __init__(self, folder: str, accept: Callable[[str], bool],
+                 settle_seconds: float = WATCH_SETTLE_SECONDS, poll_interval: float = WATCH_POLL_INTERVAL,
+                 rescan_interval: float = WATCH_RESCAN_INTERVAL, max_pending: int = WATCH_MAX_PENDING,
+                 use_inotify: bool = True):
+        """
+            Initialize the watcher.
+
+            Args:
+                folder (str): Folder to be watched.
+                accept (Callable[[str], bool]): Whether a file name should be watched.
+                settle_seconds (float): Time a file must stay unchanged to be considered written.
+                poll_interval (float): Maximum time between two readiness checks.
+                rescan_interval (float): Time between two full scans of the folder.
+                max_pending (int): Maximum number of files tracked at once. Files arriving beyond
+                    it are left for a later rescan, so a burst never grows memory unboundedly.
+                use_inotify (bool): Use inotify when running on Linux.
+        """
+        self.folder = os.path.abspath(folder)
+        self.accept = accept
+        self.settle_seconds = settle_seconds
+        self.poll_interval = poll_interval
+        self.rescan_interval = rescan_interval
+        self.max_pending = max_pending
+        # Candidate files: path -> (size, mtime, time the file was last seen changing)
+        self._pending: Dict[str, Tuple[int, int, float]] = {}
+        # Files renamed into the folder, ready without waiting
+        self._moved_in: Dict[str, None] = {}
+        # Files already handed out: path -> (size, mtime) at that time
+        self._done: Dict[str, Tuple[int, int]] = {}
+        self._last_scan = float('-inf')
+        self._inotify: Optional[_Inotify] = None
+        if use_inotify and sys.platform.startswith('linux'):
+            try:
+                self._inotify = _Inotify(self.folder)
+            except (OSError, AttributeError) as e:
+                print(f"inotify unavailable, polling {self.folder}: {e}")
+
+    @property
+    def uses_inotify(self) -> bool:
+        return self._inotify is not None
+
+    def close(self) -> None:
+        """
+            Release the inotify descriptor, if any.
+        """
+        if self._inotify:
+            self._inotify.close()
+            self._inotify = None
+
+    def __enter__(self) -> 'FolderWatcher':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def wait_ready(self, timeout: Optional[float] = None) -> List[str]:
+        """
+            Wait for files to be completely written.
+
+            Args:
+                timeout (float, optional): Maximum number of seconds to wait. Defaults to the
+                    poll interval.
+
+            Returns:
+                List[str]: Paths of the ready files, oldest first. Empty if none got ready in time.
+        """
+        timeout = self.poll_interval if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+        while True:
+            now = time.monotonic()
+            if now - self._last_scan >= self.rescan_interval or not self._inotify:
+                self._scan()
+            ready = self._collect_ready(time.monotonic())
+            remaining = deadline - time.monotonic()
+            if ready or remaining <= 0:
+                return ready
+            self._wait_events(min(remaining, self.poll_interval))
+
+    def mark_done(self, file_path: str) -> None:
+        """
+            Stop reporting a file until it changes, e.g. when it could not be moved away.
+
+            Args:
+                file_path (str): Path of the handled file.
+        """
+        stat = self._stat(file_path)
+        if stat:
+            self._done[file_path] = stat
+
+    def _wait_events(self, timeout: float) -> None:
+        """
+            Sleep until the folder changes or the timeout expires, recording the changed files.
+
+            Args:
+                timeout (float): Maximum number of seconds to wait.
+        """
+        if not self._inotify:
+            time.sleep(timeout)
+            return
+
+        events = self._inotify.read(timeout)
+        if events is None:
+            # Events were lost, fall back to a full scan
+            self._last_scan = float('-inf')
+            return
+        for mask, name in events:
+            if not name or not self.accept(name):
+                continue
+            file_path = os.path.join(self.folder, name)
+            if mask & IN_MOVED_TO:
+                if len(self._moved_in) < self.max_pending:
+                    self._moved_in[file_path] = None
+                    self._pending.pop(file_path, None)
+            else:
+                self._observe(file_path, time.monotonic())
+
+    def _scan(self) -> None:
+        """
+            Observe every accepted file of the folder.
+        """
+        now = time.monotonic()
+        self._last_scan = now
+        try:
+            names = sorted(os.listdir(self.folder))
+        except OSError as e:
+            print(f"Error listing {self.folder}: {e}")
+            return
+        present = set()
+        for name in names:
+            if self.accept(name):
+                file_path = os.path.join(self.folder, name)
+                present.add(file_path)
+                self._observe(file_path, now)
+        # Forget files that disappeared
+        for tracked in (self._pending, self._moved_in, self._done):
+            for file_path in [path for path in tracked if path not in present]:
+                del tracked[file_path]
+
+    def _observe(self, file_path: str, now: float) -> None:
+        """
+            Record the current size and modification time of a candidate file.
+
+            Args:
+                file_path (str): Path of the file.
+                now (float): Current monotonic time.
+        """
+        stat = self._stat(file_path)
+        if stat is None:
+            self._pending.pop(file_path, None)
+            return
+        if self._done.get(file_path) == stat or file_path in self._moved_in:
+            return
+        self._done.pop(file_path, None)
+
+        previous = self._pending.get(file_path)
+        if previous is None:
+            if len(self._pending) >= self.max_pending:
+                return
+            self._pending[file_path] = (*stat, now)
+        elif previous[:2] != stat:
+            self._pending[file_path] = (*stat, now)
+
+    def _collect_ready(self, now: float) -> List[str]:
+        """
+            Pop the files that are ready.
+
+            Args:
+                now (float): Current monotonic time.
+
+            Returns:
+                List[str]: Paths of the ready files.
+        """
+        ready = list(self._moved_in)
+        self._moved_in.clear()
+        for file_path, (size, mtime, changed_at) in list(self._pending.items()):
+            stat = self._stat(file_path)
+            if stat is None:
+                del self._pending[file_path]
+            elif stat != (size, mtime):
+                self._pending[file_path] = (*stat, now)
+            elif now - changed_at >= self.settle_seconds:
+                del self._pending[file_path]
+                ready.append(file_path)
+        return ready
+
+    @staticmethod
+    def _stat(file_path: str) -> Optional[Tuple[int, int]]:
+        """
+            Get the size and modification time of a file.
+
+            Args:
+                file_path (str): Path of the file.
+
+            Returns:
+                Optional[Tuple[int, int]]: Size and modification time in nanoseconds, or None if
+                the file is gone.
+        """
+        try:
+            stat = os.stat(file_path)
+        except OSError:
+            return None
+        return stat.st_size, stat.st_mtime_ns
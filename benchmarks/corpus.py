@@ -0,0 +1,116 @@
+import random
+from typing import List, NamedTuple, TextIO
+
+from app.utils.constants import COMMON_WORDS
+
+SYLLABLES = ('ka', 'lo', 'mi', 'ne', 'ru', 'sa', 'ti', 'vo', 'ze', 'pa', 'qui', 'den', 'bor', 'lin', 'tar', 'esh')
+EMOJIS = ('😀', '😂', '🙏', '🌍', '🎉', '🍕', '🚀', '🚗', '🇧🇷', '🇺🇸')
+# First id of the generated entries; ids always have 7 digits
+FIRST_ID = 1000000
+# Number of distinct boilerplate texts re-sent by duplicated entries
+BOILERPLATE_TEXTS = 20
+
+
+class CorpusSpec(NamedTuple):
+    """
+        Parameters of a synthetic corpus.
+
+        Densities are the probability of each token being an emoji or a number, the multi-line
+        ratio is the share of entries whose text spans several lines, the duplicate ratio is the
+        share of entries re-sending one of a few boilerplate texts, and `zipf_exponent` skews the
+        word distribution (0 is uniform, around 1 is natural language).
+    """
+    entries: int = 10000
+    words_per_entry: int = 60
+    emoji_density: float = 0.05
+    number_density: float = 0.05
+    multiline_ratio: float = 0.3
+    vocabulary_size: int = 20000
+    zipf_exponent: float = 1.1
+    sources: int = 20
+    seed: int = 42
+    duplicate_ratio: float = 0.0
+
+
+def build_vocabulary(spec: CorpusSpec, rng: random.Random) -> List[str]:
+    """
+        Build the vocabulary of a corpus: the common words followed by synthetic words.
+
+        Args:
+            spec (CorpusSpec): Parameters of the corpus.
+            rng (random.Random): Seeded random generator.
+
+        Returns:
+            List[str]: Distinct words, the most frequent first.
+    """
+    vocabulary = sorted(COMMON_WORDS)
+    seen = set(vocabulary)
+    while len(vocabulary) < spec.vocabulary_size:
+        word = ''.join(rng.choice(SYLLABLES) for _ in range(rng.randint(1, 4)))
+        if word not in seen:
+            seen.add(word)
+            vocabulary.append(word.capitalize() if rng.random() < 0.1 else word)
+    return vocabulary
+
+
+def write_corpus(stream: TextIO, spec: CorpusSpec = CorpusSpec()) -> int:
+    """
+        Write a deterministic synthetic corpus in the `id, "source", "text"` input format.
+
+        Args:
+            stream (TextIO): Destination of the corpus.
+            spec (CorpusSpec): Parameters of the corpus.
+
+        Returns:
+            int: Number of entries written.
+    """
+    rng = random.Random(spec.seed)
+    vocabulary = build_vocabulary(spec, rng)
+    cum_weights = []
+    total = 0.0
+    for rank in range(1, len(vocabulary) + 1):
+        total += 1 / rank ** spec.zipf_exponent
+        cum_weights.append(total)
+
+    boilerplate: List[str] = []
+    for index in range(spec.entries):
+        if spec.duplicate_ratio and len(boilerplate) == BOILERPLATE_TEXTS and rng.random() < spec.duplicate_ratio:
+            stream.write(f'{FIRST_ID + index:07d}, "source{index % spec.sources}", "{rng.choice(boilerplate)}"\n')
+            continue
+
+        words = rng.choices(vocabulary, cum_weights=cum_weights, k=spec.words_per_entry)
+        tokens = []
+        for word in words:
+            draw = rng.random()
+            if draw < spec.emoji_density:
+                tokens.append(rng.choice(EMOJIS))
+            elif draw < spec.emoji_density + spec.number_density:
+                tokens.append(str(rng.randint(0, 10000)) if rng.random() < 0.5 else f"{rng.uniform(0, 100):.2f}")
+            else:
+                tokens.append(word)
+
+        if rng.random() < spec.multiline_ratio:
+            # Continuation lines never start with a 7-digit id followed by a comma
+            lines = [' '.join(tokens[start:start + 12]) for start in range(0, len(tokens), 12)]
+            text = '\n'.join(lines)
+        else:
+            text = ' '.join(tokens)
+        if spec.duplicate_ratio and len(boilerplate) < BOILERPLATE_TEXTS:
+            boilerplate.append(text)
+        stream.write(f'{FIRST_ID + index:07d}, "source{index % spec.sources}", "{text}"\n')
+    return spec.entries
+
+
+def generate_corpus(file_path: str, spec: CorpusSpec = CorpusSpec()) -> int:
+    """
+        Write a deterministic synthetic corpus to a file.
+
+        Args:
+            file_path (str): Path of the CSV file to be created.
+            spec (CorpusSpec): Parameters of the corpus.
+
+        Returns:
+            int: Number of entries written.
+    """
+    with open(file_path, 'w', encoding='utf-8', newline='\n') as file:
+        return write_corpus(file, spec)
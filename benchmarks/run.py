@@ -0,0 +1,259 @@
+import argparse
+import contextlib
+import json
+import multiprocessing
+import os
+import platform
+import re
+import resource
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Dict, List, NamedTuple, Optional
+
+from app.app import App
+from app.processor.text_processor import TextProcessor
+from app.storage.database_client import PROFILES, DatabaseClient
+from app.storage.text_processor_dao import EntryRecord, TextProcessorDAO
+from app.utils.constants import DATABASE_NAME, DATABASE_PROFILE, INPUT_FOLDER, OUTPUT_FOLDER, WORKERS
+from benchmarks.corpus import CorpusSpec, generate_corpus
+
+# Throughput metrics must not drop, and memory must not grow, by more than the tolerance
+THROUGHPUT_METRICS = ('entries_per_s', 'mb_per_s')
+MEMORY_METRICS = ('peak_rss_mb',)
+DEFAULT_TOLERANCE = 0.15
+
+
+class BenchmarkOptions(NamedTuple):
+    """
+        Settings of the application under benchmark.
+    """
+    workers: int = WORKERS
+    db_profile: str = DATABASE_PROFILE
+    async_pipeline: bool = False
+
+
+def bench_read_full(corpus_path: str, workdir: str, options: BenchmarkOptions) -> int:
+    """Read the whole file with retrieve_csv_content and split it into entries."""
+    content = TextProcessor().retrieve_csv_content(corpus_path)
+    return len(re.split(r'\n(?=\d{7},)', content.strip()))
+
+
+def bench_read_stream(corpus_path: str, workdir: str, options: BenchmarkOptions) -> int:
+    """Stream the entries of the file."""
+    return sum(1 for _ in TextProcessor().iter_csv_entries(corpus_path))
+
+
+def bench_process_text(corpus_path: str, workdir: str, options: BenchmarkOptions) -> Callable[[], int]:
+    """Tokenize and count every text; the texts are loaded before timing."""
+    processor = TextProcessor()
+    texts = [text for _, _, text in processor.iter_csv_records(corpus_path)]
+
+    def run() -> int:
+        for text in texts:
+            processor.process_text(text)
+        return len(texts)
+    return run
+
+
+def bench_dao_write(corpus_path: str, workdir: str, options: BenchmarkOptions) -> Callable[[], int]:
+    """Write every entry with the batched DAO; the records are computed before timing."""
+    processor = TextProcessor()
+    records = [EntryRecord(entry_id, source, text, processor.process_text(text))
+               for entry_id, source, text in processor.iter_csv_records(corpus_path)]
+    conn = DatabaseClient(os.path.join(workdir, 'dao_write.db'), options.db_profile).create_database()
+
+    def run() -> int:
+        try:
+            return TextProcessorDAO(conn).save_entries(records, processor.batch_size)
+        finally:
+            conn.close()
+    return run
+
+
+def bench_end_to_end(corpus_path: str, workdir: str, options: BenchmarkOptions) -> Callable[[], int]:
+    """Run the whole App on a copy of the file, in a scratch working directory."""
+    os.chdir(workdir)
+    for folder in (INPUT_FOLDER, OUTPUT_FOLDER, os.path.dirname(DATABASE_NAME)):
+        os.makedirs(folder, exist_ok=True)
+    shutil.copy(corpus_path, os.path.join(INPUT_FOLDER, os.path.basename(corpus_path)))
+
+    def run() -> int:
+        with contextlib.redirect_stdout(open(os.devnull, 'w')):
+            App(workers=options.workers, db_profile=options.db_profile,
+                async_pipeline=options.async_pipeline).start()
+        return sum(1 for _ in TextProcessor().iter_csv_entries(
+            os.path.join(OUTPUT_FOLDER, os.path.basename(corpus_path))))
+    return run
+
+
+# Stages either do all their work when called, or return a callable with the part to be timed
+STAGES: Dict[str, Callable] = {
+    'read_full': bench_read_full,
+    'read_stream': bench_read_stream,
+    'process_text': bench_process_text,
+    'dao_write': bench_dao_write,
+    'end_to_end': bench_end_to_end,
+}
+
+
+def peak_rss_mb() -> float:
+    """
+        Peak resident set size of the current process.
+
+        Returns:
+            float: Peak RSS in MiB.
+    """
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in KiB elsewhere
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def _measure(stage: str, corpus_path: str, workdir: str, options: BenchmarkOptions) -> Dict[str, float]:
+    """
+        Run a stage and measure it. Meant to run in a fresh process, so the peak RSS is the stage's.
+    """
+    size_mb = os.path.getsize(corpus_path) / (1024 * 1024)
+    started = time.perf_counter()
+    result = STAGES[stage](corpus_path, workdir, options)
+    if callable(result):
+        started = time.perf_counter()
+        result = result()
+    seconds = time.perf_counter() - started
+    return {
+        'entries': result,
+        'seconds': round(seconds, 4),
+        'entries_per_s': round(result / seconds, 1) if seconds else 0.0,
+        'mb_per_s': round(size_mb / seconds, 3) if seconds else 0.0,
+        'peak_rss_mb': round(peak_rss_mb(), 1),
+    }
+
+
+def run_benchmarks(spec: CorpusSpec, stages: List[str], options: BenchmarkOptions = BenchmarkOptions()) -> Dict:
+    """
+        Generate a corpus and benchmark each stage on it, every stage in its own process.
+
+        Args:
+            spec (CorpusSpec): Parameters of the synthetic corpus.
+            stages (List[str]): Names of the stages to run.
+            options (BenchmarkOptions): Settings of the application.
+
+        Returns:
+            Dict: Machine-readable results.
+    """
+    workdir = tempfile.mkdtemp(prefix='word_frequency_bench_')
+    try:
+        corpus_path = os.path.join(workdir, 'corpus.csv')
+        generate_corpus(corpus_path, spec)
+        results = {
+            'corpus': dict(spec._asdict(), size_mb=round(os.path.getsize(corpus_path) / (1024 * 1024), 3)),
+            'environment': dict(options._asdict(), python=platform.python_version(), platform=platform.platform()),
+            'stages': {},
+        }
+        context = multiprocessing.get_context('fork' if 'fork' in multiprocessing.get_all_start_methods()
+                                              else 'spawn')
+        for stage in stages:
+            stage_dir = tempfile.mkdtemp(dir=workdir)
+            with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+                results['stages'][stage] = executor.submit(_measure, stage, corpus_path, stage_dir, options).result()
+        return results
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def compare_results(results: Dict, baseline: Dict, tolerance: float = DEFAULT_TOLERANCE) -> List[str]:
+    """
+        Compare results against a baseline.
+
+        Args:
+            results (Dict): Results of the current run.
+            baseline (Dict): Stored results of a reference run.
+            tolerance (float): Accepted relative degradation, e.g. 0.15 for 15%.
+
+        Returns:
+            List[str]: Description of each regression, empty if there is none.
+    """
+    regressions = []
+    for stage, metrics in results['stages'].items():
+        reference = baseline.get('stages', {}).get(stage)
+        if not reference:
+            continue
+        for metric in THROUGHPUT_METRICS:
+            if reference.get(metric) and metrics[metric] < reference[metric] * (1 - tolerance):
+                regressions.append(f"{stage}.{metric}: {metrics[metric]} < baseline {reference[metric]}")
+        for metric in MEMORY_METRICS:
+            if reference.get(metric) and metrics[metric] > reference[metric] * (1 + tolerance):
+                regressions.append(f"{stage}.{metric}: {metrics[metric]} > baseline {reference[metric]}")
+    return regressions
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    """
+        Parse the command line arguments.
+
+        Args:
+            argv (list, optional): Arguments to parse. Defaults to sys.argv.
+
+        Returns:
+            argparse.Namespace: Parsed arguments.
+    """
+    defaults = CorpusSpec()
+    parser = argparse.ArgumentParser(description="Benchmark the word frequency pipeline on a synthetic corpus.")
+    parser.add_argument('--entries', type=int, default=defaults.entries)
+    parser.add_argument('--words-per-entry', type=int, default=defaults.words_per_entry)
+    parser.add_argument('--emoji-density', type=float, default=defaults.emoji_density)
+    parser.add_argument('--number-density', type=float, default=defaults.number_density)
+    parser.add_argument('--multiline-ratio', type=float, default=defaults.multiline_ratio)
+    parser.add_argument('--vocabulary-size', type=int, default=defaults.vocabulary_size)
+    parser.add_argument('--zipf-exponent', type=float, default=defaults.zipf_exponent)
+    parser.add_argument('--seed', type=int, default=defaults.seed)
+    parser.add_argument('--duplicate-ratio', type=float, default=defaults.duplicate_ratio)
+    parser.add_argument('--stages', nargs='+', choices=list(STAGES), default=list(STAGES))
+    parser.add_argument('--workers', type=int, default=WORKERS,
+                        help="worker processes of the end-to-end run (default: %(default)s)")
+    parser.add_argument('--db-profile', choices=list(PROFILES), default=DATABASE_PROFILE,
+                        help="SQLite connection profile of the write stages (default: %(default)s)")
+    parser.add_argument('--async-pipeline', action='store_true',
+                        help="run the end-to-end stage with the asyncio pipeline")
+    parser.add_argument('--output', help="write the results as JSON to this file")
+    parser.add_argument('--baseline', help="JSON results to compare against; exits with 1 on regression")
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE,
+                        help="accepted relative degradation against the baseline (default: %(default)s)")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """
+        Run the benchmarks from the command line.
+
+        Returns:
+            int: Exit status, 1 if a regression was found.
+    """
+    args = parse_args(argv)
+    spec = CorpusSpec(args.entries, args.words_per_entry, args.emoji_density, args.number_density,
+                      args.multiline_ratio, args.vocabulary_size, args.zipf_exponent, CorpusSpec().sources, args.seed,
+                      args.duplicate_ratio)
+    results = run_benchmarks(spec, args.stages, BenchmarkOptions(args.workers, args.db_profile, args.async_pipeline))
+
+    print(f"{'stage':<14}{'entries/s':>14}{'MB/s':>10}{'seconds':>10}{'peak RSS MB':>14}")
+    for stage, metrics in results['stages'].items():
+        print(f"{stage:<14}{metrics['entries_per_s']:>14}{metrics['mb_per_s']:>10}"
+              f"{metrics['seconds']:>10}{metrics['peak_rss_mb']:>14}")
+
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(results, file, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as file:
+            regressions = compare_results(results, json.load(file), args.tolerance)
+        for regression in regressions:
+            print(f"Regression: {regression}")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,17 +1,114 @@
+import argparse
+
 from app.app import App
+from app.metrics.metrics import Metrics, profiling
+from app.reporting.reporter import REPORT_FORMATS
+from app.search.searcher import SEARCH_OPERATORS
+from app.storage.database_client import PROFILES
+from app.utils.constants import DATABASE_PROFILE, REPORT_LIMIT, SEARCH_LIMIT, SHARDS, WORKERS
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    """
+        Parse the command line arguments.
 
+        Args:
+            argv (list, optional): Arguments to parse. Defaults to sys.argv.
 
-def main():
+        Returns:
+            argparse.Namespace: Parsed arguments.
+    """
+    parser = argparse.ArgumentParser(description="Word frequency counter for CSV entries.")
+    parser.add_argument('--workers', type=int, default=WORKERS,
+                        help="number of worker processes used to tokenize entries (default: %(default)s)")
+    parser.add_argument('--async-pipeline', action='store_true',
+                        help="overlap reading, tokenizing and writing in an asyncio pipeline")
+    parser.add_argument('--compress-texts', action='store_true',
+                        help="store new texts zlib-compressed in the database")
+    parser.add_argument('--heavy-hitters', action='store_true',
+                        help="also count the words in fixed-size sketches for approximate top-k and point queries")
+    parser.add_argument('--ngrams', action='store_true',
+                        help="also count phrases of 2 and 3 words, pruning the rare ones as they are counted")
+    parser.add_argument('--raw-counts', action='store_true',
+                        help="count stopwords too and only exclude them at query time")
+    parser.add_argument('--stopwords', metavar='FILE',
+                        help="make the words of FILE, one per line, the active stopwords and rebuild the aggregates")
+    parser.add_argument('--rebuild-aggregates', action='store_true',
+                        help="rebuild the aggregates computed with an older stopwords version")
+    parser.add_argument('--shards', type=int, default=SHARDS,
+                        help="number of database files the entries are spread over and written concurrently, "
+                             "the same for every command on a database (default: %(default)s)")
+    parser.add_argument('--worker-id',
+                        help="id under which this instance claims input files shared with other instances "
+                             "(default: host name and process id)")
+    parser.add_argument('--db-profile', choices=list(PROFILES), default=DATABASE_PROFILE,
+                        help="SQLite connection profile (default: %(default)s)")
+    parser.add_argument('--watch', action='store_true',
+                        help="keep watching the input folder and process files as soon as they are written")
+    parser.add_argument('--report', choices=('summary', 'top-words', 'top-ngrams', 'heavy-hitters', 'sources', 'table'),
+                        help="print a report of the database instead of processing the input folder")
+    parser.add_argument('--search', metavar='QUERY',
+                        help="print the entries containing the words of QUERY, best matches first")
+    parser.add_argument('--operator', choices=SEARCH_OPERATORS, default='and',
+                        help="whether search hits contain all or any of the words (default: %(default)s)")
+    parser.add_argument('--after', metavar='CURSOR', help="cursor of the previous page of search hits")
+    parser.add_argument('--format', choices=REPORT_FORMATS, default='text',
+                        help="output format of the report or search hits (default: %(default)s)")
+    parser.add_argument('--limit', type=int,
+                        help=f"number of rows of the top-N reports (default: {REPORT_LIMIT}) "
+                             f"or of search hits per page (default: {SEARCH_LIMIT})")
+    parser.add_argument('--table', help="table dumped by the 'table' report")
+    parser.add_argument('--metrics', metavar='PATH',
+                        help="write per-stage timers, counters and histograms as JSON to PATH ('-' for stdout)")
+    parser.add_argument('--metrics-textfile', metavar='PATH',
+                        help="write the metrics in the Prometheus text format to PATH")
+    parser.add_argument('--profile', metavar='PATH', help="profile the run with cProfile and dump the stats to PATH")
+    parser.add_argument('--trace-memory', action='store_true',
+                        help="trace allocations with tracemalloc and print the top allocation sites")
+    args = parser.parse_args(argv)
+    if args.report == 'table' and not args.table:
+        parser.error("the 'table' report requires --table")
+    if args.shards < 1:
+        parser.error("--shards must be positive")
+    return args
+
+
+def main(argv=None):
     """
         Main entry point of the application.
 
         This function initializes and starts the application.
         It also handles any unexpected errors that might occur during execution.
     """
+    args = parse_args(argv)
+
+    # Metrics are only recorded when they are exported or when the run is profiled
+    metrics = Metrics(enabled=bool(args.metrics or args.metrics_textfile or args.trace_memory),
+                      json_path=args.metrics, textfile_path=args.metrics_textfile)
 
     # Create an instance of the App class and Start the application
-    application = App()
-    application.start()
+    application = App(workers=args.workers, metrics=metrics, db_profile=args.db_profile,
+                      async_pipeline=args.async_pipeline, compress_texts=args.compress_texts,
+                      heavy_hitters=args.heavy_hitters, raw_counts=args.raw_counts,
+                      ngrams=args.ngrams, shards=args.shards, worker_id=args.worker_id)
+    if args.stopwords:
+        application.set_stopwords(args.stopwords)
+        return
+    if args.rebuild_aggregates:
+        application.rebuild_aggregates()
+        return
+    if args.search is not None:
+        application.search(args.search, args.operator, args.limit or SEARCH_LIMIT, args.after, args.format)
+        return
+    if args.report:
+        application.report(args.report, args.format, args.limit or REPORT_LIMIT, args.table)
+        return
+    with profiling(metrics, args.profile, args.trace_memory):
+        if args.watch:
+            application.watch()
+        else:
+            application.start()
+    metrics.export()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,78 @@
+import io
+import os
+import tempfile
+import unittest
+
+from app.processor.text_processor import TextProcessor
+from benchmarks.corpus import CorpusSpec, generate_corpus, write_corpus
+from benchmarks.run import compare_results
+
+
+class TestCorpus(unittest.TestCase):
+
+    def setUp(self):
+        self.spec = CorpusSpec(entries=200, words_per_entry=30, vocabulary_size=500, seed=7)
+
+    def test_corpus_is_deterministic(self):
+        first, second = io.StringIO(), io.StringIO()
+        write_corpus(first, self.spec)
+        write_corpus(second, self.spec)
+
+        self.assertEqual(first.getvalue(), second.getvalue())
+
+        other = io.StringIO()
+        write_corpus(other, self.spec._replace(seed=8))
+        self.assertNotEqual(first.getvalue(), other.getvalue())
+
+    def test_corpus_is_parsed_into_every_entry(self):
+        with tempfile.TemporaryDirectory() as folder:
+            file_path = os.path.join(folder, 'corpus.csv')
+            self.assertEqual(generate_corpus(file_path, self.spec), self.spec.entries)
+
+            records = list(TextProcessor().iter_csv_records(file_path))
+
+        self.assertEqual(len(records), self.spec.entries)
+        self.assertEqual(records[0][:2], ('1000000', 'source0'))
+        self.assertTrue(any('\n' in text for _, _, text in records))
+
+    def test_corpus_with_duplicated_texts(self):
+        with tempfile.TemporaryDirectory() as folder:
+            file_path = os.path.join(folder, 'corpus.csv')
+            generate_corpus(file_path, self.spec._replace(duplicate_ratio=0.5))
+
+            texts = [text for _, _, text in TextProcessor().iter_csv_records(file_path)]
+
+        self.assertEqual(len(texts), self.spec.entries)
+        self.assertLess(len(set(texts)), self.spec.entries * 0.7)
+
+    def test_corpus_without_multiline_entries_or_emojis(self):
+        stream = io.StringIO()
+        write_corpus(stream, self.spec._replace(multiline_ratio=0, emoji_density=0))
+
+        self.assertEqual(len(stream.getvalue().splitlines()), self.spec.entries)
+        self.assertTrue(stream.getvalue().isascii())
+
+
+class TestCompareResults(unittest.TestCase):
+
+    def setUp(self):
+        self.baseline = {'stages': {'process_text': {'entries_per_s': 1000, 'mb_per_s': 10, 'peak_rss_mb': 100}}}
+
+    def test_results_within_tolerance_pass(self):
+        results = {'stages': {'process_text': {'entries_per_s': 900, 'mb_per_s': 9, 'peak_rss_mb': 110},
+                              'dao_write': {'entries_per_s': 1, 'mb_per_s': 1, 'peak_rss_mb': 1}}}
+
+        self.assertEqual(compare_results(results, self.baseline, tolerance=0.15), [])
+
+    def test_slower_or_bigger_results_are_regressions(self):
+        results = {'stages': {'process_text': {'entries_per_s': 800, 'mb_per_s': 10, 'peak_rss_mb': 130}}}
+
+        regressions = compare_results(results, self.baseline, tolerance=0.15)
+
+        self.assertEqual(len(regressions), 2)
+        self.assertTrue(regressions[0].startswith('process_text.entries_per_s'))
+        self.assertTrue(regressions[1].startswith('process_text.peak_rss_mb'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,145 @@
+import json
+import os
+import sys
+import tempfile
+import threading
+import unittest
+
+from app.metrics.metrics import Histogram, Metrics, profiling
+from app.processor.text_processor import TextProcessor
+from app.storage.database_client import DatabaseClient
+from app.storage.text_processor_dao import TextProcessorDAO
+
+
+class TestMetrics(unittest.TestCase):
+
+    def test_disabled_metrics_record_nothing(self):
+        metrics = Metrics()
+
+        with metrics.timer('tokenize'):
+            pass
+        metrics.increment('entries_read', 3)
+        metrics.set_gauge('peak', 1)
+        metrics.observe('entry_chars', 10)
+
+        self.assertEqual(metrics.snapshot(), {'timers': {}, 'counters': {}, 'gauges': {}, 'histograms': {}})
+        self.assertEqual(metrics.to_prometheus(), '')
+
+    def test_enabled_metrics_record_timers_counters_and_histograms(self):
+        metrics = Metrics(enabled=True)
+
+        for _ in range(2):
+            with metrics.timer('tokenize'):
+                pass
+        metrics.increment('entries_read', 3)
+        metrics.increment('entries_read')
+        for value in (10, 100, 100000):
+            metrics.observe('entry_chars', value)
+
+        snapshot = metrics.snapshot()
+        self.assertEqual(snapshot['timers']['tokenize']['calls'], 2)
+        self.assertEqual(snapshot['counters'], {'entries_read': 4})
+        self.assertEqual(snapshot['histograms']['entry_chars']['count'], 3)
+        self.assertEqual(snapshot['histograms']['entry_chars']['buckets']['64'], 1)
+        self.assertEqual(snapshot['histograms']['entry_chars']['buckets']['128'], 2)
+        self.assertEqual(snapshot['histograms']['entry_chars']['buckets']['+Inf'], 3)
+
+    def test_histogram_bounds_are_inclusive(self):
+        histogram = Histogram((1, 5))
+        for value in (0, 1, 5, 6):
+            histogram.observe(value)
+
+        self.assertEqual(histogram.cumulative_counts(), [2, 3, 4])
+        self.assertEqual(histogram.sum, 12)
+
+    def test_concurrent_updates_are_not_lost(self):
+        metrics = Metrics(enabled=True)
+
+        def record():
+            for _ in range(2000):
+                metrics.increment('entries_saved')
+                metrics.observe('entry_words', 1)
+                metrics.add_time('save_batch', 0.001)
+
+        switch_interval = sys.getswitchinterval()
+        sys.setswitchinterval(1e-6)
+        try:
+            threads = [threading.Thread(target=record) for _ in range(4)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        finally:
+            sys.setswitchinterval(switch_interval)
+
+        snapshot = metrics.snapshot()
+        self.assertEqual(snapshot['counters'], {'entries_saved': 8000})
+        self.assertEqual(snapshot['histograms']['entry_words']['count'], 8000)
+        self.assertEqual(snapshot['timers']['save_batch']['calls'], 8000)
+
+    def test_prometheus_format(self):
+        metrics = Metrics(enabled=True)
+        metrics.add_time('commit', 0.5)
+        metrics.increment('files_completed')
+        metrics.observe('entry_words', 7)
+
+        lines = metrics.to_prometheus().splitlines()
+
+        self.assertIn('# TYPE word_frequency_stage_seconds_total counter', lines)
+        self.assertIn('word_frequency_stage_seconds_total{stage="commit"} 0.5', lines)
+        self.assertIn('word_frequency_stage_calls_total{stage="commit"} 1', lines)
+        self.assertIn('word_frequency_files_completed_total 1', lines)
+        self.assertIn('word_frequency_entry_words_bucket{le="5"} 0', lines)
+        self.assertIn('word_frequency_entry_words_bucket{le="10"} 1', lines)
+        self.assertIn('word_frequency_entry_words_count 1', lines)
+
+    def test_export_writes_json_and_textfile(self):
+        with tempfile.TemporaryDirectory() as folder:
+            json_path = os.path.join(folder, 'metrics.json')
+            textfile_path = os.path.join(folder, 'metrics.prom')
+            metrics = Metrics(enabled=True, json_path=json_path, textfile_path=textfile_path)
+            metrics.increment('entries_saved', 2)
+
+            metrics.export()
+
+            with open(json_path) as file:
+                self.assertEqual(json.load(file)['counters'], {'entries_saved': 2})
+            with open(textfile_path) as file:
+                self.assertIn('word_frequency_entries_saved_total 2\n', file.read())
+            self.assertEqual(sorted(os.listdir(folder)), ['metrics.json', 'metrics.prom'])
+
+    def test_profiling_dumps_cprofile_stats_and_records_tracemalloc_peak(self):
+        metrics = Metrics(enabled=True)
+        with tempfile.TemporaryDirectory() as folder:
+            profile_path = os.path.join(folder, 'run.prof')
+
+            with profiling(metrics, profile_path, trace_memory=True):
+                [str(number) for number in range(1000)]
+
+            self.assertTrue(os.path.getsize(profile_path) > 0)
+        self.assertGreater(metrics.gauges['tracemalloc_peak_bytes'], 0)
+
+
+class TestPipelineMetrics(unittest.TestCase):
+
+    def test_processing_a_file_records_each_stage(self):
+        metrics = Metrics(enabled=True)
+        conn = DatabaseClient(':memory:').create_database()
+        with tempfile.TemporaryDirectory() as folder:
+            file_path = os.path.join(folder, 'input.csv')
+            with open(file_path, 'w') as file:
+                file.write('1000001, "source1", "apple pear apple"\n1000002, "source2", "plum"\n')
+
+            TextProcessor(batch_size=1, metrics=metrics).process_csv_file(file_path, TextProcessorDAO(conn, metrics))
+        conn.close()
+
+        snapshot = metrics.snapshot()
+        self.assertEqual(set(snapshot['timers']), {'read_split', 'tokenize', 'save_batch', 'commit'})
+        self.assertEqual(snapshot['timers']['save_batch']['calls'], 2)
+        self.assertEqual(snapshot['counters'], {'entries_read': 2, 'entries_saved': 2, 'files_completed': 1,
+                                                'text_cache_hits': 0, 'text_cache_misses': 2})
+        self.assertEqual(snapshot['histograms']['entry_words']['sum'], 4)
+
+
+if __name__ == '__main__':
+    unittest.main()
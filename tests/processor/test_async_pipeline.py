@@ -0,0 +1,175 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+
+from app.processor.async_pipeline import AsyncPipeline
+from app.processor.text_processor import TextProcessor
+from app.storage.database_client import DatabaseClient
+from app.storage.text_processor_dao import TextProcessorDAO
+from tests.processor.test_text_processor import FailingMockTextProcessorDAO, MockTextProcessorDAO
+
+
+class SlowMockTextProcessorDAO(MockTextProcessorDAO):
+    """Records how far the reader got every time a batch is written."""
+    def __init__(self, text_processor):
+        super().__init__()
+        self.text_processor = text_processor
+        self.batches_ahead = []
+        self.threads = set()
+
+    def save_batch(self, records, checkpoint=None):
+        self.threads.add(threading.get_ident())
+        time.sleep(0.01)
+        super().save_batch(records, checkpoint)
+        self.batches_ahead.append(self.text_processor.batches_read - len(self.checkpoints))
+
+
+class CountingTextProcessor(TextProcessor):
+    def __init__(self, batch_size):
+        super().__init__(batch_size)
+        self.batches_read = 0
+
+    def iter_record_batches(self, file_path, start_offset=0):
+        for batch in super().iter_record_batches(file_path, start_offset):
+            self.batches_read += 1
+            yield batch
+
+
+class TestAsyncPipeline(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.file_paths = []
+        for file_index in range(3):
+            file_path = os.path.join(self.folder, f'input{file_index}.csv')
+            with open(file_path, 'w', encoding='utf-8') as file:
+                for entry_index in range(7):
+                    file.write(f'{1000000 + file_index * 100 + entry_index}, "source{file_index}", '
+                               f'"Entry {entry_index} of file\nnumber {file_index} 😀 again"\n')
+            self.file_paths.append(file_path)
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def test_process_csv_files_matches_sequential_processing(self):
+        sequential_dao = MockTextProcessorDAO()
+        for file_path in self.file_paths:
+            TextProcessor().process_csv_file(file_path, sequential_dao)
+
+        pipeline_dao = MockTextProcessorDAO()
+        done = []
+        AsyncPipeline(TextProcessor(batch_size=3), workers=2).process_csv_files(
+            self.file_paths, pipeline_dao, done.append)
+
+        self.assertEqual(done, self.file_paths)
+        self.assertEqual(pipeline_dao.records, sequential_dao.records)
+        self.assertEqual(pipeline_dao.manifest, sequential_dao.manifest)
+
+    def test_process_csv_files_splits_raw_ngrams_on_stopwords(self):
+        sequential_dao = MockTextProcessorDAO()
+        TextProcessor(stopwords=(), ngram_sizes=(2, 3), ngram_stopwords={'of'}).process_csv_file(
+            self.file_paths[0], sequential_dao)
+
+        pipeline_dao = MockTextProcessorDAO()
+        AsyncPipeline(TextProcessor(batch_size=3, stopwords=(), ngram_sizes=(2, 3), ngram_stopwords={'of'}),
+                      workers=2).process_csv_files(self.file_paths[:1], pipeline_dao, lambda file_path: None)
+
+        self.assertEqual(pipeline_dao.records, sequential_dao.records)
+        self.assertEqual(pipeline_dao.records[0].word_freq['of'], 1)
+        self.assertFalse([ngram for record in pipeline_dao.records for ngram in record.ngram_freq
+                          if 'of' in ngram.split()])
+
+    def test_file_is_done_after_its_last_batch_commits(self):
+        dao = MockTextProcessorDAO()
+        completed_when_done = []
+
+        def on_file_done(file_path):
+            completed_when_done.append([entry.completed for entry in dao.manifest.values()
+                                        if entry.file_name == os.path.basename(file_path)])
+
+        AsyncPipeline(TextProcessor(batch_size=2)).process_csv_files(self.file_paths, dao, on_file_done)
+
+        self.assertEqual(completed_when_done, [[True]] * 3)
+
+    def test_failed_batch_is_resumed_on_the_next_run(self):
+        dao = FailingMockTextProcessorDAO({'1000103'})
+        pipeline = AsyncPipeline(TextProcessor(batch_size=2), workers=2)
+        done = []
+
+        pipeline.process_csv_files(self.file_paths, dao, done.append)
+
+        # The later batches of the file are not saved, and the file is left to be resumed
+        self.assertEqual(done, [self.file_paths[0], self.file_paths[2]])
+        self.assertEqual(sorted(record.entry_id for record in dao.records if record.source == 'source1'),
+                         ['1000100', '1000101'])
+        self.assertEqual(sum(entry.completed for entry in dao.manifest.values()), 2)
+
+        dao.failing_ids.clear()
+        done = []
+        pipeline.process_csv_files(self.file_paths, dao, done.append)
+
+        self.assertEqual(done, self.file_paths)
+        self.assertEqual(sorted(record.entry_id for record in dao.records if record.source == 'source1'),
+                         [str(1000100 + i) for i in range(7)])
+        self.assertTrue(all(entry.completed for entry in dao.manifest.values()))
+
+    def test_slow_writer_bounds_the_batches_read_ahead(self):
+        text_processor = CountingTextProcessor(batch_size=1)
+        dao = SlowMockTextProcessorDAO(text_processor)
+
+        AsyncPipeline(text_processor, queue_size=2).process_csv_files(self.file_paths, dao, lambda file_path: None)
+
+        self.assertEqual(len(dao.records), 21)
+        # Both queues full, plus one batch held by each stage
+        self.assertLessEqual(max(dao.batches_ahead), 2 * 2 + 3)
+        # Every write runs on the single writer thread
+        self.assertEqual(len(dao.threads), 1)
+        self.assertNotIn(threading.get_ident(), dao.threads)
+
+    def test_process_csv_files_skips_processed_and_isolates_missing_files(self):
+        missing = os.path.join(self.folder, 'missing.csv')
+        dao = MockTextProcessorDAO()
+        pipeline = AsyncPipeline(TextProcessor(batch_size=5))
+        pipeline.process_csv_files(self.file_paths[:1], dao, lambda file_path: None)
+
+        done = []
+        pipeline.process_csv_files([missing, *self.file_paths], dao, done.append)
+
+        self.assertEqual(done, [missing, *self.file_paths])
+        self.assertEqual(len(dao.records), 21)
+
+    def test_process_csv_files_with_sqlite(self):
+        conn = DatabaseClient(':memory:', check_same_thread=False).create_database()
+        try:
+            AsyncPipeline(TextProcessor(batch_size=4)).process_csv_files(
+                self.file_paths, TextProcessorDAO(conn), lambda file_path: None)
+
+            self.assertEqual(conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0], 21)
+            self.assertEqual(conn.execute("SELECT COUNT(*) FROM ingest_manifest WHERE completed").fetchone()[0], 3)
+        finally:
+            conn.close()
+
+    def test_connection_bound_to_its_thread_is_reported(self):
+        conn = DatabaseClient(':memory:').create_database()
+        try:
+            done = []
+            AsyncPipeline(TextProcessor()).process_csv_files(self.file_paths[:1], TextProcessorDAO(conn), done.append)
+
+            # The manifest lookup fails on the writer thread, so nothing is written
+            self.assertEqual(done, self.file_paths[:1])
+            self.assertEqual(conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0], 0)
+        finally:
+            conn.close()
+
+    def test_invalid_settings(self):
+        with self.assertRaises(ValueError):
+            AsyncPipeline(TextProcessor(), workers=0)
+        with self.assertRaises(ValueError):
+            AsyncPipeline(TextProcessor(), queue_size=0)
+
+
+if __name__ == '__main__':
+    unittest.main()
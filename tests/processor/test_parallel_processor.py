@@ -0,0 +1,110 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from app.processor.parallel_processor import ParallelTextProcessor
+from app.processor.text_processor import TextProcessor
+from tests.processor.test_text_processor import FailingMockTextProcessorDAO, MockTextProcessorDAO
+
+
+class TestParallelTextProcessor(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.file_paths = []
+        for file_index in range(3):
+            file_path = os.path.join(self.folder, f'input{file_index}.csv')
+            with open(file_path, 'w', encoding='utf-8') as file:
+                for entry_index in range(7):
+                    file.write(f'{1000000 + file_index * 100 + entry_index}, "source{file_index}", '
+                               f'"Entry {entry_index} of file\nnumber {file_index} 😀 again"\n')
+            self.file_paths.append(file_path)
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def test_process_csv_files_matches_sequential_processing(self):
+        sequential_dao = MockTextProcessorDAO()
+        for file_path in self.file_paths:
+            TextProcessor().process_csv_file(file_path, sequential_dao)
+
+        parallel_dao = MockTextProcessorDAO()
+        processor = ParallelTextProcessor(TextProcessor(batch_size=3), workers=2)
+        done = list(processor.process_csv_files(self.file_paths, parallel_dao))
+
+        self.assertEqual(done, self.file_paths)
+        self.assertEqual(parallel_dao.records, sequential_dao.records)
+        self.assertEqual(parallel_dao.manifest, sequential_dao.manifest)
+
+    def test_process_csv_files_counts_ngrams_like_sequential_processing(self):
+        sequential_dao = MockTextProcessorDAO()
+        TextProcessor(ngram_sizes=(2, 3)).process_csv_file(self.file_paths[0], sequential_dao)
+
+        parallel_dao = MockTextProcessorDAO()
+        processor = ParallelTextProcessor(TextProcessor(batch_size=3, ngram_sizes=(2, 3)), workers=2)
+        list(processor.process_csv_files(self.file_paths[:1], parallel_dao))
+
+        self.assertEqual(parallel_dao.records, sequential_dao.records)
+        self.assertEqual(parallel_dao.records[0].ngram_freq['file number'], 1)
+
+    def test_process_csv_files_splits_raw_ngrams_on_stopwords(self):
+        sequential_dao = MockTextProcessorDAO()
+        TextProcessor(stopwords=(), ngram_sizes=(2, 3), ngram_stopwords={'of'}).process_csv_file(
+            self.file_paths[0], sequential_dao)
+
+        parallel_dao = MockTextProcessorDAO()
+        processor = ParallelTextProcessor(TextProcessor(batch_size=3, stopwords=(), ngram_sizes=(2, 3),
+                                                        ngram_stopwords={'of'}), workers=2)
+        list(processor.process_csv_files(self.file_paths[:1], parallel_dao))
+
+        self.assertEqual(parallel_dao.records, sequential_dao.records)
+        self.assertEqual(parallel_dao.records[0].word_freq['of'], 1)
+        self.assertFalse([ngram for record in parallel_dao.records for ngram in record.ngram_freq
+                          if 'of' in ngram.split()])
+
+    def test_process_csv_files_skips_processed_files(self):
+        dao = MockTextProcessorDAO()
+        processor = ParallelTextProcessor(TextProcessor(), workers=2)
+        list(processor.process_csv_files(self.file_paths[:1], dao))
+        done = list(processor.process_csv_files(self.file_paths, dao))
+
+        self.assertEqual(done, self.file_paths)
+        self.assertEqual(len(dao.records), 21)
+
+    def test_process_csv_files_isolates_missing_file(self):
+        missing = os.path.join(self.folder, 'missing.csv')
+        dao = MockTextProcessorDAO()
+        processor = ParallelTextProcessor(TextProcessor(batch_size=5), workers=2)
+        done = list(processor.process_csv_files([missing, self.file_paths[0]], dao))
+
+        self.assertEqual(done, [missing, self.file_paths[0]])
+        self.assertEqual(len(dao.records), 7)
+
+    def test_process_csv_files_resumes_a_failed_batch(self):
+        dao = FailingMockTextProcessorDAO({'1000103'})
+        processor = ParallelTextProcessor(TextProcessor(batch_size=2), workers=2)
+
+        done = list(processor.process_csv_files(self.file_paths, dao))
+
+        # The later batches of the file are not saved, and the file is left to be resumed
+        self.assertEqual(done, [self.file_paths[0], self.file_paths[2]])
+        self.assertEqual(sorted(record.entry_id for record in dao.records if record.source == 'source1'),
+                         ['1000100', '1000101'])
+        self.assertEqual(sum(entry.completed for entry in dao.manifest.values()), 2)
+
+        dao.failing_ids.clear()
+        done = list(processor.process_csv_files(self.file_paths, dao))
+
+        self.assertEqual(done, self.file_paths)
+        self.assertEqual(sorted(record.entry_id for record in dao.records if record.source == 'source1'),
+                         [str(1000100 + i) for i in range(7)])
+        self.assertTrue(all(entry.completed for entry in dao.manifest.values()))
+
+    def test_invalid_worker_count(self):
+        with self.assertRaises(ValueError):
+            ParallelTextProcessor(TextProcessor(), workers=0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,8 +1,31 @@
+import bz2
+import gzip
+import lzma
+import os
+import re
+import tempfile
 import unittest
 from collections import Counter
+from sqlite3 import Error as SQLiteError
 from unittest.mock import mock_open, MagicMock
 
 from app.processor.text_processor import TextProcessor
+from app.storage.text_processor_dao import ManifestEntry
+from app.utils.text_hash import text_digest
+
+
+def write_csv(content):
+    with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False, encoding='utf-8', newline='') as file:
+        file.write(content)
+    return file.name
+
+
+def write_compressed_csv(content, extension, opener):
+    with tempfile.NamedTemporaryFile(suffix=f'.csv{extension}', delete=False) as file:
+        pass
+    with opener(file.name, 'wt', encoding='utf-8', newline='') as compressed:
+        compressed.write(content)
+    return file.name
 
 
 class MockTextProcessorDAO:
@@ -12,6 +35,38 @@ class MockTextProcessorDAO:
     def save_words_frequency(self, entry_id, word_freq):
         pass
 
+    def __init__(self):
+        self.records = []
+        self.checkpoints = []
+        self.manifest = {}
+
+    def save_batch(self, records, checkpoint=None):
+        self.records.extend(records)
+        self.checkpoints.append(checkpoint)
+
+    def get_file_manifest(self, content_hash):
+        return self.manifest.get(content_hash)
+
+    def start_file(self, content_hash, file_name, size):
+        self.manifest[content_hash] = ManifestEntry(content_hash, file_name, size, 0, False)
+
+    def complete_file(self, content_hash):
+        self.manifest[content_hash] = self.manifest[content_hash]._replace(completed=True)
+
+
+class FailingMockTextProcessorDAO(MockTextProcessorDAO):
+    """Rejects the batches containing one of `failing_ids`, and records the checkpoints of the others."""
+    def __init__(self, failing_ids=()):
+        super().__init__()
+        self.failing_ids = set(failing_ids)
+
+    def save_batch(self, records, checkpoint=None):
+        if self.failing_ids.intersection(record.entry_id for record in records):
+            raise SQLiteError("rejected")
+        super().save_batch(records, checkpoint)
+        self.manifest[checkpoint.content_hash] = self.manifest[checkpoint.content_hash]._replace(
+            checkpoint_offset=checkpoint.offset)
+
 
 class TestTextProcessor(unittest.TestCase):
 
@@ -41,6 +96,204 @@ class TestTextProcessor(unittest.TestCase):
         result_counter = processor.process_text(text)
         self.assertEqual(result_counter, expected_counter)
 
+    def test_process_text_with_digest(self):
+        for processor in (TextProcessor(), TextProcessor(cache_size=0)):
+            self.assertEqual(processor.process_text_with_digest("Hello world, hello"),
+                             (Counter({'hello': 2, 'world': 1}), text_digest("Hello world, hello")))
+
+    def test_process_text_raw_counts(self):
+        processor = TextProcessor(stopwords=())
+        self.assertEqual(processor.process_text("This is a test, a test."),
+                         Counter({'this': 1, 'is': 1, 'a': 2, 'test': 2}))
+
+    def test_process_ngrams(self):
+        self.assertIsNone(TextProcessor().process_ngrams("new york city"))
+        self.assertEqual(TextProcessor(ngram_sizes=(3, 2, 2)).process_ngrams("New York city"),
+                         Counter({'new york': 1, 'york city': 1, 'new york city': 1}))
+        with self.assertRaises(ValueError):
+            TextProcessor(ngram_sizes=(1, 2))
+
+    def test_process_ngrams_raw_counts(self):
+        processor = TextProcessor(stopwords=(), ngram_sizes=(2, 3), ngram_stopwords={'in', 'the'})
+        text = "Snow in the new york city"
+
+        self.assertEqual(processor.process_text(text)['the'], 1)
+        self.assertEqual(processor.process_ngrams(text),
+                         Counter({'new york': 1, 'york city': 1, 'new york city': 1}))
+
+    def test_process_text_caches_repeated_texts(self):
+        processor = TextProcessor(cache_size=2)
+        first = processor.process_text("Buy now, 50% off!")
+        self.assertIs(processor.process_text("Buy  now,\n50% off! "), first)
+        processor.process_text("second text")
+        processor.process_text("third text")
+        # The least recently used text was evicted
+        self.assertEqual(processor.process_text("Buy now, 50% off!"), first)
+
+        self.assertEqual(processor.cache_info(), (1, 4, 2, 2))
+
+    def test_process_text_without_cache(self):
+        processor = TextProcessor(cache_size=0)
+        self.assertIsNot(processor.process_text("same"), processor.process_text("same"))
+        self.assertEqual(processor.cache_info(), (0, 0, 0, 0))
+
+        with self.assertRaises(ValueError):
+            TextProcessor(cache_size=-1)
+
+    def test_process_csv_file_saves_entries_in_batches(self):
+        file_content = ('1000001, "source1", "Hello world"\n'
+                        '1000002, "source2", "Another\nline of text"\n'
+                        '1000003, "missing text"')
+        file_path = write_csv(file_content)
+        self.addCleanup(os.remove, file_path)
+        dao = MockTextProcessorDAO()
+        TextProcessor(batch_size=10).process_csv_file(file_path, dao)
+
+        self.assertEqual([record.entry_id for record in dao.records], ['1000001', '1000002'])
+        self.assertEqual(dao.records[1].source, 'source2')
+        self.assertEqual(dao.records[1].text, 'Another\nline of text')
+        self.assertEqual(dao.records[1].word_freq, Counter({'another': 1, 'line': 1, 'text': 1}))
+
+    def test_iter_csv_entries_matches_full_split(self):
+        contents = [
+            '\n\n1000001, "s1", "one"\n1000002, "s2", "two\nlines"\n\n',
+            '1000001, "s1", "text with\n123 numbers"\r\n1000002, "s2", "crlf"',
+            '  1000001, "s1", "leading spaces"\n12345, "not an id"\n1000002, "s2", "x"\n',
+            '1000001, "s1", "only entry"',
+            '1000001, "s1", "old mac"\r1000002, "s2", "line\rendings"\r',
+            '1000001, "s1", "mixed"\r\r\n1000002, "s2", "x"\r\n1000003, "s3", "y"\n\r',
+        ]
+        processor = TextProcessor()
+        for content in contents:
+            file_path = write_csv(content)
+            try:
+                with open(file_path, encoding='utf-8') as f:
+                    expected = re.split(r'\n(?=\d{7},)', f.read().strip())
+                self.assertEqual(list(processor.iter_csv_entries(file_path)), expected)
+            finally:
+                os.remove(file_path)
+
+    def test_iter_csv_entries_file_not_found(self):
+        with self.assertRaises(FileNotFoundError):
+            list(TextProcessor().iter_csv_entries('nonexistent.csv'))
+
+    def test_iter_csv_records_skips_invalid_entries(self):
+        file_content = '1000001, "source1", "Hello"\n1000002, "missing text"\n1000003, "source3", "Bye"'
+        file_path = write_csv(file_content)
+        self.addCleanup(os.remove, file_path)
+        records = list(TextProcessor().iter_csv_records(file_path))
+
+        self.assertEqual(records, [('1000001', 'source1', 'Hello'), ('1000003', 'source3', 'Bye')])
+
+    def test_iter_csv_entry_spans_resumes_from_offset(self):
+        file_path = write_csv('1000001, "s1", "héllo"\n1000002, "s2", "two\nlines"\n1000003, "s3", "three"\n')
+        self.addCleanup(os.remove, file_path)
+        processor = TextProcessor()
+
+        spans = list(processor.iter_csv_entry_spans(file_path))
+        resumed = list(processor.iter_csv_entry_spans(file_path, spans[0][1]))
+
+        self.assertEqual(resumed, spans[1:])
+        self.assertEqual(spans[-1][1], os.path.getsize(file_path))
+
+    def test_iter_csv_entry_spans_splits_carriage_returns(self):
+        file_path = write_csv('1234567,a,b\r1234568,c,d\r\r\n1234569,e,f\r')
+        self.addCleanup(os.remove, file_path)
+        processor = TextProcessor()
+
+        spans = list(processor.iter_csv_entry_spans(file_path))
+
+        self.assertEqual(spans, [('1234567,a,b', 12), ('1234568,c,d\n', 26), ('1234569,e,f', 38)])
+        self.assertEqual(list(processor.iter_csv_entry_spans(file_path, 12)), spans[1:])
+
+    def test_process_csv_file_records_checkpoints(self):
+        file_path = write_csv('1000001, "s1", "one"\n1000002, "s2", "two"\n1000003, "s3", "three"')
+        self.addCleanup(os.remove, file_path)
+        dao = MockTextProcessorDAO()
+
+        TextProcessor(batch_size=2).process_csv_file(file_path, dao)
+
+        content_hash, size = TextProcessor.fingerprint(file_path)
+        spans = list(TextProcessor().iter_csv_entry_spans(file_path))
+        self.assertEqual([checkpoint.offset for checkpoint in dao.checkpoints], [spans[1][1], size])
+        self.assertTrue(all(checkpoint.content_hash == content_hash for checkpoint in dao.checkpoints))
+        self.assertTrue(dao.manifest[content_hash].completed)
+
+    def test_process_csv_file_skips_processed_file(self):
+        file_path = write_csv('1000001, "s1", "one"')
+        self.addCleanup(os.remove, file_path)
+        dao = MockTextProcessorDAO()
+        content_hash, size = TextProcessor.fingerprint(file_path)
+        dao.manifest[content_hash] = ManifestEntry(content_hash, 'other.csv', size, size, True)
+
+        TextProcessor().process_csv_file(file_path, dao)
+
+        self.assertEqual(dao.records, [])
+
+    def test_process_csv_file_resumes_from_checkpoint(self):
+        file_path = write_csv('1000001, "s1", "one"\n1000002, "s2", "two"\n1000003, "s3", "three"')
+        self.addCleanup(os.remove, file_path)
+        dao = MockTextProcessorDAO()
+        content_hash, size = TextProcessor.fingerprint(file_path)
+        offset = list(TextProcessor().iter_csv_entry_spans(file_path))[0][1]
+        dao.manifest[content_hash] = ManifestEntry(content_hash, 'input.csv', size, offset, False)
+
+        TextProcessor().process_csv_file(file_path, dao)
+
+        self.assertEqual([record.entry_id for record in dao.records], ['1000002', '1000003'])
+
+    def test_process_csv_file_resumes_a_failed_batch(self):
+        file_path = write_csv(''.join(f'100000{i}, "s", "text {i}"\n' for i in range(1, 6)))
+        self.addCleanup(os.remove, file_path)
+        dao = FailingMockTextProcessorDAO({'1000003'})
+        content_hash, _ = TextProcessor.fingerprint(file_path)
+
+        with self.assertRaises(SQLiteError):
+            TextProcessor(batch_size=2).process_csv_file(file_path, dao)
+        self.assertEqual([record.entry_id for record in dao.records], ['1000001', '1000002'])
+        self.assertFalse(dao.manifest[content_hash].completed)
+
+        dao.failing_ids.clear()
+        TextProcessor(batch_size=2).process_csv_file(file_path, dao)
+
+        self.assertEqual([record.entry_id for record in dao.records], [f'100000{i}' for i in range(1, 6)])
+        self.assertTrue(dao.manifest[content_hash].completed)
+
+    def test_iter_csv_entry_spans_streams_compressed_files(self):
+        content = '1000001, "s1", "héllo"\n1000002, "s2", "two\nlines"\n1000003, "s3", "three"\n'
+        plain_path = write_csv(content)
+        self.addCleanup(os.remove, plain_path)
+        processor = TextProcessor()
+        expected = list(processor.iter_csv_entry_spans(plain_path))
+
+        for extension, opener in (('.gz', gzip.open), ('.bz2', bz2.open), ('.xz', lzma.open)):
+            file_path = write_compressed_csv(content, extension, opener)
+            self.addCleanup(os.remove, file_path)
+            with self.subTest(extension=extension):
+                spans = list(processor.iter_csv_entry_spans(file_path))
+                self.assertEqual(spans, expected)
+                # Offsets are positions in the uncompressed content
+                self.assertEqual(list(processor.iter_csv_entry_spans(file_path, spans[0][1])), expected[1:])
+                self.assertEqual(processor.retrieve_csv_content(file_path), content)
+
+    def test_iter_csv_entry_spans_corrupted_compressed_file(self):
+        with tempfile.NamedTemporaryFile(suffix='.csv.gz', delete=False) as file:
+            file.write(gzip.compress(b'1000001, "s1", "one"\n' * 100)[:-20])
+        self.addCleanup(os.remove, file.name)
+
+        with self.assertRaises(IOError):
+            list(TextProcessor().iter_csv_entry_spans(file.name))
+
+    def test_process_csv_file_compressed_file(self):
+        file_path = write_compressed_csv('1000001, "s1", "one"\n1000002, "s2", "two"', '.gz', gzip.open)
+        self.addCleanup(os.remove, file_path)
+        dao = MockTextProcessorDAO()
+
+        TextProcessor().process_csv_file(file_path, dao)
+
+        self.assertEqual([record.text for record in dao.records], ['one', 'two'])
+        self.assertTrue(all(entry.completed for entry in dao.manifest.values()))
+
 
 if __name__ == '__main__':
     unittest.main()
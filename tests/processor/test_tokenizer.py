@@ -0,0 +1,86 @@
+import glob
+import random
+import re
+import unittest
+from collections import Counter
+
+from app.processor.text_processor import TextProcessor
+from app.processor.tokenizer import Tokenizer
+from app.utils.constants import COMMON_WORDS, INPUT_FOLDER, OUTPUT_FOLDER
+
+
+def reference_process_text(text):
+    """Original implementation of TextProcessor.process_text, kept to check the tokenizer against."""
+    text = re.sub(r'\d+(?:\.\d+)?', '', text)
+    text = re.sub(r'[\U0001F600-\U0001F64F\U0001F300-\U0001F5FF\U0001F680-\U0001F6FF\U0001F1E0-\U0001F1FF]', '',
+                  text)
+    words = re.findall(r'\b\w+\b', text.lower())
+    return Counter(word for word in words if word not in COMMON_WORDS)
+
+
+class TestTokenizer(unittest.TestCase):
+
+    def setUp(self):
+        self.tokenizer = Tokenizer()
+
+    def assertMatchesReference(self, text):
+        self.assertEqual(self.tokenizer.count(text), reference_process_text(text), repr(text))
+
+    def test_count_matches_reference_on_input_files(self):
+        processor = TextProcessor()
+        # The sample inputs are moved to the output folder once the app processes them
+        file_paths = glob.glob(f'{INPUT_FOLDER}/*.csv') + glob.glob(f'{OUTPUT_FOLDER}/*.csv')
+        texts = [text for file_path in sorted(file_paths) for _, _, text in processor.iter_csv_records(file_path)]
+        self.assertTrue(texts)
+        for text in texts:
+            self.assertMatchesReference(text)
+
+    def test_count_matches_reference_on_edge_cases(self):
+        for text in ["", "123", "1.5.6", "abc1.5def", "abc1.def", "hello😀world", "😀.5", "A_B c__d",
+                     "ΑΣ1Β ΟΔΟΣ", "İstanbul", "The THE the", "x²", "🇧🇷 flag", "tab\tseparated\nlines"]:
+            self.assertMatchesReference(text)
+
+    def test_count_matches_reference_on_random_texts(self):
+        alphabet = list("abcdeΣσς ÉéİI the and 0123456789.,'-_\n😀🚀🇧🌍✨") + [" the ", " and ", " 3.14 "]
+        rng = random.Random(42)
+        for _ in range(500):
+            self.assertMatchesReference(''.join(rng.choice(alphabet) for _ in range(rng.randint(0, 60))))
+
+    def test_windowed_count_matches_reference(self):
+        alphabet = list("abΣσ İ 0123456789.,\n\t😀🇧🇷") + [" the ", " 3.14 ", "ΟΔΟΣ "]
+        rng = random.Random(7)
+        for _ in range(300):
+            text = ''.join(rng.choice(alphabet) for _ in range(rng.randint(0, 200)))
+            tokenizer = Tokenizer(window_size=rng.randint(1, 20))
+            self.assertEqual(tokenizer.count(text), reference_process_text(text), repr(text))
+            self.assertEqual(tokenizer.count_ngrams(text, (2, 3)), self.tokenizer.count_ngrams(text, (2, 3)))
+
+    def test_invalid_window_size(self):
+        with self.assertRaises(ValueError):
+            Tokenizer(window_size=0)
+
+    def test_count_many(self):
+        texts = ["Hello world", "", "Hello 😀 again 42"]
+        self.assertEqual(self.tokenizer.count_many(texts), [reference_process_text(text) for text in texts])
+
+    def test_count_ngrams(self):
+        counts = self.tokenizer.count_ngrams("Big data, BIG data pipelines!", (2, 3))
+        self.assertEqual(counts, Counter({'big data': 2, 'data big': 1, 'data pipelines': 1, 'big data big': 1,
+                                          'data big data': 1, 'big data pipelines': 1}))
+
+    def test_count_ngrams_never_spans_a_stopword(self):
+        counts = self.tokenizer.count_ngrams("Bank of America 2024 results 😀 today", (2, 3))
+        # Numbers and emojis are removed like in the word counts, stopwords split the phrases
+        self.assertEqual(counts, Counter({'america results': 1, 'results today': 1, 'america results today': 1}))
+        self.assertEqual(Tokenizer(stopwords=()).count_ngrams("Bank of America", (2,)),
+                         Counter({'bank of': 1, 'of america': 1}))
+        self.assertEqual(Tokenizer(stopwords=(), ngram_stopwords={'of'}).count_ngrams("Bank of America", (2,)),
+                         Counter())
+
+    def test_custom_stopwords(self):
+        tokenizer = Tokenizer(stopwords={"hello"})
+        self.assertEqual(tokenizer.count("Hello the world"), Counter({"the": 1, "world": 1}))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,158 @@
+import os
+import shutil
+import tempfile
+import unittest
+from collections import Counter
+from unittest.mock import MagicMock
+
+from app.query.query_service import DataVersion, QueryService, ShardedQueryService, WordCount, WordStats
+from app.storage.database_client import DatabaseClient
+from app.storage.sharded_dao import ShardedTextProcessorDAO
+from app.storage.text_processor_dao import EntryRecord, TextProcessorDAO
+
+
+class TestQueryService(unittest.TestCase):
+
+    def setUp(self):
+        self.conn = DatabaseClient(':memory:').create_database()
+        self.dao = TextProcessorDAO(self.conn)
+        self.dao.save_batch([
+            EntryRecord('1', 'news', 'text', Counter({'apple': 3, 'pear': 1, 'the': 5})),
+            EntryRecord('2', 'news', 'text', Counter({'pear': 3, 'plum': 1})),
+            EntryRecord('3', 'blog', 'text', Counter({'apple': 4, 'fig': 2})),
+        ])
+        self.service = QueryService(self.conn, self.dao.get_generation)
+
+    def tearDown(self):
+        self.conn.close()
+
+    def test_entry_frequencies(self):
+        self.assertEqual(self.service.entry_frequencies('1'), (WordCount('apple', 3), WordCount('pear', 1)))
+        self.assertEqual(self.service.entry_frequencies('missing'), ())
+
+    def test_top_words(self):
+        self.assertEqual(self.service.top_words(2), (WordCount('apple', 7), WordCount('pear', 4)))
+        self.assertEqual(self.service.top_words(5, source='news'),
+                         (WordCount('pear', 4), WordCount('apple', 3), WordCount('plum', 1)))
+        self.assertEqual(self.service.top_words(5, source='missing'), ())
+        with self.assertRaises(ValueError):
+            self.service.top_words(0)
+
+    def test_word_stats(self):
+        self.assertEqual(self.service.word_stats('Apple'), WordStats('apple', 7, 2))
+        self.assertEqual(self.service.word_stats('the'), WordStats('the', 0, 0))
+        self.assertEqual(self.service.word_stats('missing'), WordStats('missing', 0, 0))
+
+    def test_repeated_query_is_served_from_the_cache(self):
+        self.service.top_words(2, source='news')
+        self.service.top_words(2, source='news')
+        self.service.top_words(3, source='news')
+
+        self.assertEqual((self.service.cache.hits, self.service.cache.misses), (1, 2))
+
+    def test_saving_entries_invalidates_the_cache(self):
+        self.assertEqual(self.service.word_stats('fig'), WordStats('fig', 2, 1))
+        self.dao.save_batch([EntryRecord('4', 'blog', 'text', Counter({'fig': 5}))])
+
+        self.assertEqual(self.service.word_stats('fig'), WordStats('fig', 7, 2))
+        self.assertEqual(self.service.top_words(1, source='blog'), (WordCount('fig', 7),))
+
+    def test_new_stopwords_invalidate_the_cache(self):
+        self.assertEqual(self.service.top_words(1), (WordCount('apple', 7),))
+        self.dao.add_stopwords_version(self.dao.get_stopwords().words | {'apple'})
+
+        self.assertEqual(self.service.top_words(1), (WordCount('pear', 4),))
+
+
+class TestQueryServiceOtherConnection(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        client = DatabaseClient(os.path.join(self.folder, 'word_frequency.db'))
+        self.writer = client.create_database()
+        self.reader = client.connect_read_only()
+        self.dao = TextProcessorDAO(self.writer)
+
+    def tearDown(self):
+        self.reader.close()
+        self.writer.close()
+        shutil.rmtree(self.folder)
+
+    def test_commits_of_another_connection_invalidate_the_cache(self):
+        now = [0.0]
+        service = QueryService(self.reader, DataVersion([self.reader], interval=1.0, clock=lambda: now[0]))
+        self.dao.save_batch([EntryRecord('1', 'news', 'text', Counter({'apple': 1}))])
+        self.assertEqual(service.word_stats('apple'), WordStats('apple', 1, 1))
+        self.assertEqual(service.word_stats('apple'), WordStats('apple', 1, 1))
+
+        self.dao.save_batch([EntryRecord('2', 'news', 'text', Counter({'apple': 2}))])
+        self.assertEqual(service.word_stats('apple'), WordStats('apple', 1, 1))
+        now[0] = 1.0
+
+        self.assertEqual(service.word_stats('apple'), WordStats('apple', 3, 2))
+        self.assertEqual((service.cache.hits, service.cache.misses), (2, 2))
+
+
+class TestDataVersion(unittest.TestCase):
+
+    def test_data_version_is_read_once_per_interval(self):
+        now = [0.0]
+        connections = [MagicMock(), MagicMock()]
+        for version, conn in enumerate(connections, 1):
+            conn.execute.return_value.fetchone.return_value = (version,)
+        generation = DataVersion(connections, interval=1.0, clock=lambda: now[0])
+
+        self.assertEqual([generation(), generation()], [3, 3])
+        connections[0].execute.return_value.fetchone.return_value = (5,)
+        now[0] = 0.5
+        self.assertEqual(generation(), 3)
+        now[0] = 1.0
+        self.assertEqual(generation(), 7)
+        self.assertEqual([conn.execute.call_count for conn in connections], [2, 2])
+
+
+class TestShardedQueryService(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        client = DatabaseClient(os.path.join(self.folder, 'word_frequency.db'), check_same_thread=False)
+        self.writers = client.create_shards(3)
+        self.dao = ShardedTextProcessorDAO(self.writers)
+        # The service reads through its own connections, the DAO using its ones from its shard threads
+        self.readers = client.connect_shards_read_only(3)
+        self.single = DatabaseClient(':memory:').create_database()
+        # Word j occurs i * j times in entry i: totals without ties, and the top words of a shard
+        # differ from the merged ones
+        records = [EntryRecord(f'entry{i}', ('news', 'blog')[i % 2], 'text',
+                               Counter({f'word{j}': i * j + (j == i) * 100 for j in range(1, i % 7 + 2)}))
+                   for i in range(1, 30)]
+        self.dao.save_batch(records)
+        TextProcessorDAO(self.single).save_batch(records)
+        self.service = ShardedQueryService(self.readers, self.dao, self.dao.get_generation)
+        self.expected = QueryService(self.single)
+
+    def tearDown(self):
+        self.dao.close()
+        for conn in self.writers + self.readers + [self.single]:
+            conn.close()
+        shutil.rmtree(self.folder)
+
+    def test_queries_match_a_single_database(self):
+        for entry_id in ('entry1', 'entry12', 'entry29', 'missing'):
+            self.assertEqual(self.service.entry_frequencies(entry_id), self.expected.entry_frequencies(entry_id))
+        for limit in (1, 3, 100):
+            for source in (None, 'news', 'blog', 'missing'):
+                self.assertEqual(self.service.top_words(limit, source), self.expected.top_words(limit, source))
+        for word in ('word1', 'Word5', 'the', 'missing'):
+            self.assertEqual(self.service.word_stats(word), self.expected.word_stats(word))
+
+    def test_saving_entries_invalidates_the_cache(self):
+        before = self.service.word_stats('word1')
+        self.dao.save_batch([EntryRecord('new', 'news', 'text', Counter({'word1': 2}))])
+
+        self.assertEqual(self.service.word_stats('word1'),
+                         WordStats('word1', before.total_count + 2, before.document_count + 1))
+
+
+if __name__ == '__main__':
+    unittest.main()
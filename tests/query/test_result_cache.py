@@ -0,0 +1,75 @@
+import unittest
+
+from app.query.result_cache import ResultCache
+
+
+class FakeClock:
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestResultCache(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.cache = ResultCache(max_entries=2, ttl_seconds=10, clock=self.clock)
+        self.computed = []
+
+    def compute(self, value):
+        def compute():
+            self.computed.append(value)
+            return value
+        return compute
+
+    def test_hit_does_not_compute(self):
+        self.assertEqual(self.cache.get('a', 1, self.compute(1)), 1)
+        self.assertEqual(self.cache.get('a', 1, self.compute(2)), 1)
+
+        self.assertEqual(self.computed, [1])
+        self.assertEqual((self.cache.hits, self.cache.misses), (1, 1))
+
+    def test_new_generation_drops_every_result(self):
+        self.cache.get('a', 1, self.compute(1))
+        self.cache.get('b', 1, self.compute(2))
+
+        self.assertEqual(self.cache.get('a', 2, self.compute(3)), 3)
+        self.assertEqual(len(self.cache), 1)
+
+    def test_result_expires(self):
+        self.cache.get('a', 1, self.compute(1))
+        self.clock.now = 9.9
+        self.assertEqual(self.cache.get('a', 1, self.compute(2)), 1)
+        self.clock.now = 10
+        self.assertEqual(self.cache.get('a', 1, self.compute(3)), 3)
+
+    def test_least_recently_used_is_evicted(self):
+        self.cache.get('a', 1, self.compute(1))
+        self.cache.get('b', 1, self.compute(2))
+        self.cache.get('a', 1, self.compute(3))
+        self.cache.get('c', 1, self.compute(4))
+
+        self.assertEqual(len(self.cache), 2)
+        self.assertEqual(self.cache.get('a', 1, self.compute(5)), 1)
+        self.assertEqual(self.cache.get('b', 1, self.compute(6)), 6)
+
+    def test_disabled_cache_always_computes(self):
+        cache = ResultCache(max_entries=0)
+        cache.get('a', 1, self.compute(1))
+        cache.get('a', 1, self.compute(2))
+
+        self.assertEqual(self.computed, [1, 2])
+        self.assertEqual(len(cache), 0)
+
+    def test_invalid_arguments(self):
+        with self.assertRaises(ValueError):
+            ResultCache(max_entries=-1)
+        with self.assertRaises(ValueError):
+            ResultCache(ttl_seconds=0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,158 @@
+import io
+import json
+import unittest
+from collections import Counter
+
+from app.reporting.reporter import Report, Reporter, ShardedReporter, write_report
+from app.storage.database_client import DatabaseClient
+from app.storage.sharded_dao import ShardedTextProcessorDAO
+from app.storage.text_processor_dao import EntryRecord, TextProcessorDAO
+
+
+class TestReporter(unittest.TestCase):
+
+    def setUp(self):
+        self.conn = DatabaseClient(':memory:').create_database()
+        TextProcessorDAO(self.conn).save_batch([
+            EntryRecord("1000001", "source1", "apple pear", Counter({"apple": 2, "pear": 1})),
+            EntryRecord("1000002", "source1", "apple", Counter({"apple": 1})),
+            EntryRecord("1000003", "source2", "plum", Counter({"plum": 4})),
+            EntryRecord("1000004", "source2", "", Counter()),
+            EntryRecord("1000005", "source3", "pear", Counter({"pear": 1})),
+        ])
+        self.reporter = Reporter(self.conn, page_size=2)
+
+    def tearDown(self):
+        self.conn.close()
+
+    def test_table_walks_every_row_with_keyset_pagination(self):
+        report = self.reporter.table('entries')
+
+        self.assertEqual(list(report.columns), ['id', 'source', 'text_id'])
+        self.assertEqual([row[0] for row in report.rows], ['1000001', '1000002', '1000003', '1000004', '1000005'])
+
+    def test_table_with_composite_key(self):
+        rows = list(self.reporter.table('word_frequencies').rows)
+
+        self.assertEqual(rows, self.conn.execute("SELECT * FROM word_frequencies ORDER BY entry_id, word_id").fetchall())
+
+    def test_table_without_primary_key(self):
+        self.conn.execute("CREATE TABLE notes (text TEXT)")
+        self.conn.executemany("INSERT INTO notes VALUES (?)", [("a",), ("b",), ("c",)])
+
+        self.assertEqual(list(self.reporter.table('notes').rows), [("a",), ("b",), ("c",)])
+
+    def test_table_decompresses_texts(self):
+        TextProcessorDAO(self.conn, compress_texts=True).save_entry("1000006", "source3", "kiwi " * 100)
+
+        rows = list(self.reporter.table('texts').rows)
+
+        self.assertEqual(rows[-1][2], "kiwi " * 100)
+
+    def test_table_unknown(self):
+        with self.assertRaises(ValueError):
+            self.reporter.table('missing; DROP TABLE entries')
+
+    def test_summary(self):
+        summary = dict(self.reporter.summary().rows)
+
+        self.assertEqual(summary['entries'], 5)
+        self.assertEqual(summary['words'], 3)
+
+    def test_top_words(self):
+        self.assertEqual(list(self.reporter.top_words(2).rows), [("plum", 4, 1), ("apple", 3, 2)])
+
+    def test_stopwords_are_excluded_at_query_time(self):
+        TextProcessorDAO(self.conn, heavy_hitters=True).save_batch([
+            EntryRecord("1000006", "source3", "the plum", Counter({"the": 9, "plum": 1})),
+        ])
+        self.assertEqual(list(self.reporter.top_words(1).rows), [("plum", 5, 2)])
+        self.assertEqual(list(self.reporter.heavy_hitters(1).rows), [("plum", 1, 1)])
+        self.assertEqual(list(self.reporter.source_stats().rows)[-1], ("source3", 2, 2, 2))
+
+        TextProcessorDAO(self.conn).add_stopwords_version(["plum"])
+
+        self.assertEqual(list(self.reporter.top_words(1).rows), [("the", 9, 1)])
+
+    def test_top_ngrams(self):
+        TextProcessorDAO(self.conn).save_batch([
+            EntryRecord("1000006", "source1", "apple pie apple pie", Counter({"apple": 2, "pie": 2}),
+                        Counter({"apple pie": 2, "pie apple": 1, "apple pie apple": 1})),
+        ])
+
+        self.assertEqual(list(self.reporter.top_ngrams(2).rows), [("apple pie", 2, 2, 1), ("pie apple", 2, 1, 1)])
+
+        TextProcessorDAO(self.conn).add_stopwords_version(["pie"])
+
+        self.assertEqual(list(self.reporter.top_ngrams(2).rows), [])
+
+    def test_heavy_hitters(self):
+        self.assertEqual(list(self.reporter.heavy_hitters(2).rows), [])
+
+        TextProcessorDAO(self.conn, heavy_hitters=True).save_batch([
+            EntryRecord("1000006", "source1", "plum", Counter({"plum": 2, "kiwi": 1})),
+        ])
+
+        self.assertEqual(list(self.reporter.heavy_hitters(1).rows), [("plum", 2, 2)])
+
+    def test_source_stats(self):
+        self.assertEqual(list(self.reporter.source_stats().rows),
+                         [("source1", 2, 4, 2), ("source2", 2, 4, 1), ("source3", 1, 1, 1)])
+
+
+class TestShardedReporter(unittest.TestCase):
+
+    def setUp(self):
+        self.connections = DatabaseClient(':memory:', check_same_thread=False).create_shards(2)
+        self.dao = ShardedTextProcessorDAO(self.connections, heavy_hitters=True)
+        self.dao.save_batch([
+            EntryRecord(str(entry_id), "source1", "apple pear", Counter({"apple": entry_id, "pear": 1}),
+                        Counter({"apple pear": 2}))
+            for entry_id in range(1, 7)
+        ])
+        self.reporter = ShardedReporter(self.connections, self.dao)
+
+    def tearDown(self):
+        self.dao.close()
+        for conn in self.connections:
+            conn.close()
+
+    def test_summary_sums_the_shards(self):
+        self.assertEqual(dict(self.reporter.summary().rows)['entries'], 6)
+
+    def test_merged_views(self):
+        self.assertEqual(list(self.reporter.top_words(5).rows), [("apple", 21, 6), ("pear", 6, 6)])
+        self.assertEqual(list(self.reporter.top_ngrams(5).rows), [("apple pear", 2, 12, 6)])
+        # Same columns as without shards
+        self.assertEqual(self.reporter.top_ngrams(5).columns, Reporter(self.connections[0]).top_ngrams(5).columns)
+        self.assertEqual(list(self.reporter.heavy_hitters(1).rows), [("apple", 21, 21)])
+
+
+class TestWriteReport(unittest.TestCase):
+
+    def setUp(self):
+        self.report = Report(('word', 'count'), iter([("apple", 3), ("pear, ripe", 1)]))
+
+    def test_write_text(self):
+        stream = io.StringIO()
+        self.assertEqual(write_report(self.report, 'text', stream), 2)
+        self.assertEqual(stream.getvalue(), "word\tcount\napple\t3\npear, ripe\t1\n")
+
+    def test_write_jsonl(self):
+        stream = io.StringIO()
+        write_report(self.report, 'jsonl', stream)
+        self.assertEqual([json.loads(line) for line in stream.getvalue().splitlines()],
+                         [{"word": "apple", "count": 3}, {"word": "pear, ripe", "count": 1}])
+
+    def test_write_csv(self):
+        stream = io.StringIO()
+        write_report(self.report, 'csv', stream)
+        self.assertEqual(stream.getvalue(), 'word,count\r\napple,3\r\n"pear, ripe",1\r\n')
+
+    def test_write_unknown_format(self):
+        with self.assertRaises(ValueError):
+            write_report(self.report, 'xml', io.StringIO())
+
+
+if __name__ == '__main__':
+    unittest.main()
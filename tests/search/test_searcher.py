@@ -0,0 +1,91 @@
+import math
+import random
+import unittest
+from collections import Counter
+
+from app.search.searcher import SearchCursor, Searcher
+from app.storage.database_client import DatabaseClient
+from app.storage.text_processor_dao import EntryRecord, TextProcessorDAO
+
+
+class TestSearcher(unittest.TestCase):
+
+    def setUp(self):
+        self.conn = DatabaseClient(':memory:').create_database()
+        rng = random.Random(3)
+        vocabulary = ['apple', 'pear', 'plum', 'kiwi', 'fig', 'lime']
+        self.word_freqs = {}
+        for index in range(300):
+            words = rng.sample(vocabulary, rng.randint(1, 4))
+            self.word_freqs[f'{1000000 + index}'] = Counter({word: rng.randint(1, 3) for word in words})
+        TextProcessorDAO(self.conn).save_batch([EntryRecord(entry_id, 'source', ' '.join(word_freq), word_freq)
+                                                for entry_id, word_freq in self.word_freqs.items()])
+        self.searcher = Searcher(self.conn)
+
+    def tearDown(self):
+        self.conn.close()
+
+    def brute_force(self, words, match_all):
+        entries = len(self.word_freqs)
+        weights = {}
+        for word in words:
+            document_count = sum(word in word_freq for word_freq in self.word_freqs.values())
+            weights[word] = math.log(1 + (entries - document_count + 0.5) / (document_count + 0.5))
+        hits = []
+        for entry_id, word_freq in self.word_freqs.items():
+            present = [word in word_freq for word in words]
+            if all(present) if match_all else any(present):
+                hits.append((sum(weights[word] * word_freq[word] for word in words), entry_id))
+        return [entry_id for _, entry_id in sorted(hits, reverse=True)]
+
+    def test_search_matches_brute_force(self):
+        for query in ['apple', 'apple pear', 'plum kiwi fig']:
+            for operator in ('and', 'or'):
+                with self.subTest(query=query, operator=operator):
+                    page = self.searcher.search(query, operator, limit=7)
+                    expected = self.brute_force(query.split(), operator == 'and')
+                    self.assertEqual([hit.entry_id for hit in page.hits], expected[:7])
+
+    def test_pages_walk_every_hit_once(self):
+        expected = self.brute_force(['pear', 'lime'], False)
+        found = []
+        cursor = None
+        while True:
+            page = self.searcher.search('Pear, LIME!', 'or', limit=25, after=cursor)
+            found.extend(hit.entry_id for hit in page.hits)
+            if page.next_cursor is None:
+                break
+            cursor = SearchCursor.decode(page.next_cursor.encode())
+
+        self.assertEqual(found, expected)
+
+    def test_stopwords_numbers_and_unknown_words(self):
+        self.assertEqual(self.searcher.search('the apple 42', 'and', limit=3).hits,
+                         self.searcher.search('apple', 'and', limit=3).hits)
+        self.assertEqual(self.searcher.search('apple banana', 'and').hits, [])
+        self.assertEqual(self.searcher.search('apple banana', 'or').hits, self.searcher.search('apple', 'or').hits)
+        self.assertEqual(self.searcher.search('the', 'or').hits, [])
+
+    def test_scores_rank_frequent_words_higher(self):
+        TextProcessorDAO(self.conn).save_batch([
+            EntryRecord('2000001', 'source', 'durian', Counter({'durian': 5})),
+            EntryRecord('2000002', 'source', 'durian', Counter({'durian': 1})),
+        ])
+
+        hits = Searcher(self.conn).search('durian').hits
+
+        self.assertEqual([hit.entry_id for hit in hits], ['2000001', '2000002'])
+        self.assertAlmostEqual(hits[0].score, 5 * hits[1].score)
+
+    def test_invalid_arguments(self):
+        with self.assertRaises(ValueError):
+            self.searcher.search('apple', 'xor')
+        with self.assertRaises(ValueError):
+            self.searcher.search('apple', limit=0)
+        with self.assertRaises(ValueError):
+            SearchCursor.decode('no separator')
+        self.assertEqual(SearchCursor.decode(SearchCursor(0.1, 'id:1').encode()), SearchCursor(0.1, 'id:1'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,151 @@
+import random
+import unittest
+from collections import Counter
+
+from app.sketch.sketches import CountMinSketch, HeavyHitter, HeavyHitters, SpaceSaving
+
+
+def zipf_stream(words, length, seed=7):
+    rng = random.Random(seed)
+    vocabulary = [f'word{rank}' for rank in range(words)]
+    return rng.choices(vocabulary, weights=[1 / rank for rank in range(1, words + 1)], k=length)
+
+
+class TestSpaceSaving(unittest.TestCase):
+
+    def test_counts_are_exact_below_capacity(self):
+        summary = SpaceSaving(10)
+        summary.update_counts(Counter({'apple': 3, 'pear': 1}))
+        summary.update('apple')
+
+        self.assertEqual(summary.top(), [HeavyHitter('apple', 4, 4), HeavyHitter('pear', 1, 1)])
+        self.assertEqual(summary.estimate('plum'), 0)
+
+    def test_counts_are_within_error_bound(self):
+        stream = zipf_stream(2000, 50000)
+        actual = Counter(stream)
+        summary = SpaceSaving(100)
+        for word in stream:
+            summary.update(word)
+
+        bound = summary.total / summary.capacity
+        for hitter in summary.top():
+            self.assertLessEqual(hitter.lower_bound, actual[hitter.word])
+            self.assertGreaterEqual(hitter.estimate, actual[hitter.word])
+            self.assertLessEqual(hitter.estimate - actual[hitter.word], bound)
+        # Every word occurring more often than the bound is counted
+        counted = {hitter.word for hitter in summary.top()}
+        self.assertTrue({word for word, count in actual.items() if count > bound} <= counted)
+        self.assertEqual([hitter.word for hitter in summary.top(3)], ['word0', 'word1', 'word2'])
+
+    def test_merge_keeps_error_bound(self):
+        stream = zipf_stream(2000, 40000)
+        actual = Counter(stream)
+        first, second = SpaceSaving(100), SpaceSaving(100)
+        for word in stream[:20000]:
+            first.update(word)
+        for word in stream[20000:]:
+            second.update(word)
+
+        merged = first.merge(second)
+
+        self.assertEqual(merged.total, len(stream))
+        self.assertEqual(len(merged.top()), 100)
+        for hitter in merged.top():
+            self.assertLessEqual(hitter.lower_bound, actual[hitter.word])
+            self.assertLessEqual(actual[hitter.word], hitter.estimate)
+            self.assertLessEqual(hitter.estimate - actual[hitter.word], merged.total / merged.capacity)
+
+    def test_serialization_round_trip(self):
+        summary = SpaceSaving(3)
+        summary.update_counts(Counter({'héllo': 5, 'wörld': 2, '😀': 1, 'plum': 1}))
+
+        restored = SpaceSaving.from_bytes(summary.to_bytes())
+
+        self.assertEqual((restored.capacity, restored.total), (3, 9))
+        self.assertEqual(restored.top(), summary.top())
+        restored.update('new', 10)
+        self.assertEqual(restored.top(1), [HeavyHitter('new', 12, 10)])
+
+    def test_invalid_arguments(self):
+        with self.assertRaises(ValueError):
+            SpaceSaving(0)
+        with self.assertRaises(ValueError):
+            SpaceSaving.from_error(1.5)
+        with self.assertRaises(ValueError):
+            SpaceSaving.from_bytes(CountMinSketch(2, 2).to_bytes())
+        with self.assertRaises(ValueError):
+            SpaceSaving.from_bytes(SpaceSaving(2).to_bytes()[:5])
+        self.assertEqual(SpaceSaving.from_error(0.01).capacity, 100)
+
+
+class TestCountMinSketch(unittest.TestCase):
+
+    def test_estimates_are_never_too_low(self):
+        stream = zipf_stream(5000, 50000)
+        actual = Counter(stream)
+        sketch = CountMinSketch.from_error(0.01, 0.01)
+        sketch.update_counts(actual)
+
+        self.assertEqual((sketch.width, sketch.depth), (272, 5))
+        errors = [sketch.estimate(word) - count for word, count in actual.items()]
+        self.assertTrue(all(error >= 0 for error in errors))
+        exceeding = sum(error > sketch.error_bound() for error in errors)
+        self.assertLessEqual(exceeding, 0.01 * len(errors))
+
+    def test_merge_equals_single_sketch(self):
+        single, first, second = CountMinSketch(64, 3), CountMinSketch(64, 3), CountMinSketch(64, 3)
+        single.update_counts(Counter({'apple': 3, 'pear': 2, 'plum': 1}))
+        first.update_counts(Counter({'apple': 1, 'pear': 2}))
+        second.update_counts(Counter({'apple': 2, 'plum': 1}))
+
+        merged = first.merge(second)
+
+        self.assertEqual(merged.to_bytes(), single.to_bytes())
+        with self.assertRaises(ValueError):
+            merged.merge(CountMinSketch(32, 3))
+
+    def test_serialization_round_trip(self):
+        sketch = CountMinSketch(50, 4)
+        sketch.update('apple', 3)
+
+        restored = CountMinSketch.from_bytes(sketch.to_bytes())
+
+        self.assertEqual((restored.width, restored.depth, restored.total), (50, 4, 3))
+        self.assertEqual(restored.estimate('apple'), 3)
+        with self.assertRaises(ValueError):
+            CountMinSketch.from_bytes(sketch.to_bytes()[:-1])
+
+    def test_rows_never_share_a_column(self):
+        sketch = CountMinSketch(3, 2)
+
+        for word in (f"word{i}" for i in range(100)):
+            first, second = sketch._cells(word)
+            self.assertNotEqual(first, second - sketch.width, word)
+
+
+class TestHeavyHitters(unittest.TestCase):
+
+    def test_top_words_are_tightened_by_count_min(self):
+        heavy_hitters = HeavyHitters(SpaceSaving(2), CountMinSketch(1000, 5))
+        heavy_hitters.update_counts(Counter({'apple': 10, 'pear': 5}))
+        heavy_hitters.update_counts(Counter({'plum': 1}))
+
+        # 'plum' replaced 'pear' in the summary, with the count of 'pear' as error
+        self.assertEqual(heavy_hitters.top_words.estimate('plum'), 6)
+        self.assertEqual(heavy_hitters.top(), [HeavyHitter('apple', 10, 10), HeavyHitter('plum', 1, 1)])
+        self.assertEqual(heavy_hitters.estimate('pear'), 5)
+
+    def test_blobs_round_trip_and_merge(self):
+        heavy_hitters = HeavyHitters()
+        heavy_hitters.update_counts(Counter({'apple': 2}))
+
+        restored = HeavyHitters.from_blobs(heavy_hitters.to_blobs())
+        restored.merge(heavy_hitters)
+
+        self.assertEqual(restored.top(), [HeavyHitter('apple', 4, 4)])
+        self.assertEqual(HeavyHitters.from_blobs({}).top(), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,8 +1,12 @@
+import os
+import shutil
+import tempfile
 import unittest
 import sqlite3
+from concurrent.futures import ThreadPoolExecutor
 from unittest.mock import patch, MagicMock
-from app.storage.database_client import DatabaseClient
-from app.utils.constants import DATABASE_NAME
+from app.storage.database_client import DatabaseClient, shard_index, shard_path
+from app.utils.constants import COMMON_WORDS, DATABASE_NAME
 
 
 class TestDatabaseClient(unittest.TestCase):
@@ -21,6 +25,8 @@ class TestDatabaseClient(unittest.TestCase):
         self.mock_conn = MagicMock()
         self.mock_cursor = MagicMock()
         self.mock_conn.cursor.return_value = self.mock_cursor
+        # A brand new database has schema version 0
+        self.mock_cursor.fetchone.return_value = (0,)
 
         # Reset the mock_connect for each test
         self.mock_connect.reset_mock()
@@ -31,11 +37,22 @@ class TestDatabaseClient(unittest.TestCase):
         client = DatabaseClient()
         result = client.create_database()
 
-        self.mock_connect.assert_called_once_with(DATABASE_NAME)
-        self.assertEqual(self.mock_cursor.execute.call_count, 2)
-        self.mock_conn.commit.assert_called_once()
+        self.mock_connect.assert_called_once_with(DATABASE_NAME, check_same_thread=True)
+        self.mock_cursor.execute.assert_any_call("PRAGMA user_version")
+        self.mock_cursor.execute.assert_any_call("PRAGMA user_version = 10")
+        # One transaction per migration
+        self.assertEqual(self.mock_conn.commit.call_count, 10)
         self.assertEqual(result, self.mock_conn)
 
+    def test_create_database_up_to_date(self):
+        self.mock_cursor.fetchone.return_value = (10,)
+
+        client = DatabaseClient()
+        client.create_database()
+
+        self.mock_cursor.execute.assert_called_once_with("PRAGMA user_version")
+        self.mock_conn.commit.assert_not_called()
+
     def test_create_database_sqlite_error(self):
         self.mock_connect.side_effect = sqlite3.Error("Test error")
 
@@ -57,3 +74,192 @@ class TestDatabaseClient(unittest.TestCase):
     def test_database_client_interface(self):
         self.assertTrue(hasattr(DatabaseClient, 'create_database'))
         self.assertTrue(callable(getattr(DatabaseClient, 'create_database')))
+
+
+class TestDatabaseClientMigrations(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.database_name = os.path.join(self.folder, 'word_frequency.db')
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def test_concurrent_instances_migrate_once(self):
+        def create():
+            DatabaseClient(self.database_name).create_database().close()
+
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            for future in [executor.submit(create) for _ in range(4)]:
+                future.result()
+
+        conn = sqlite3.connect(self.database_name)
+        self.assertEqual(conn.execute("PRAGMA user_version").fetchone()[0], 10)
+        conn.close()
+
+    def test_create_shards(self):
+        connections = DatabaseClient(self.database_name).create_shards(3)
+        for conn in connections:
+            conn.close()
+
+        self.assertEqual(sorted(os.listdir(self.folder)), ['word_frequency.shard1of3.db', 'word_frequency.shard2of3.db',
+                                                           'word_frequency.shard3of3.db'])
+        connections = DatabaseClient(self.database_name).connect_shards_read_only(3)
+        for conn in connections:
+            self.assertEqual(conn.execute("PRAGMA user_version").fetchone()[0], 10)
+            conn.close()
+        with self.assertRaises(sqlite3.Error):
+            DatabaseClient(self.database_name).connect_shards_read_only(2)
+        with self.assertRaises(ValueError):
+            DatabaseClient(self.database_name).create_shards(0)
+
+    def test_shard_index_and_path(self):
+        self.assertEqual(shard_path(self.database_name, 0, 4), os.path.join(self.folder, 'word_frequency.shard1of4.db'))
+        self.assertEqual(shard_path(':memory:', 2, 4), ':memory:')
+        self.assertEqual(shard_index('entry', 1), 0)
+        # Stable across processes, unlike hash()
+        self.assertEqual(shard_index('entry', 7), 2)
+        self.assertEqual({shard_index(str(i), 4) for i in range(100)}, {0, 1, 2, 3})
+
+    def test_create_database_schema(self):
+        conn = DatabaseClient(self.database_name).create_database()
+        try:
+            tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+            indexes = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+            self.assertTrue({'entries', 'texts', 'words', 'word_frequencies', 'word_totals', 'sketches'} <= tables)
+            self.assertTrue({'idx_word_frequencies_word', 'idx_entries_text', 'idx_entries_source'} <= indexes)
+            self.assertEqual(conn.execute("PRAGMA user_version").fetchone()[0], 10)
+        finally:
+            conn.close()
+
+    def test_migrate_original_schema(self):
+        conn = sqlite3.connect(self.database_name)
+        conn.execute("CREATE TABLE entries (id TEXT PRIMARY KEY, source TEXT, original_text TEXT)")
+        conn.execute("CREATE TABLE word_frequencies (id TEXT, word TEXT, frequency INTEGER)")
+        conn.execute("INSERT INTO entries VALUES ('1000001', 'source', 'hello hello world')")
+        # The original DAO appended duplicated rows when an entry was processed twice
+        conn.executemany("INSERT INTO word_frequencies VALUES (?, ?, ?)",
+                         [('1000001', 'hello', 1), ('1000001', 'world', 1), ('1000001', 'hello', 2)])
+        conn.commit()
+        conn.close()
+
+        conn = DatabaseClient(self.database_name).create_database()
+        try:
+            rows = conn.execute("SELECT f.entry_id, w.word, f.frequency FROM word_frequencies f "
+                                "JOIN words w ON w.id = f.word_id ORDER BY w.word").fetchall()
+            self.assertEqual(rows, [('1000001', 'hello', 2), ('1000001', 'world', 1)])
+            totals = conn.execute("SELECT w.word, t.total_count, t.document_count FROM word_totals t "
+                                  "JOIN words w ON w.id = t.word_id ORDER BY w.word").fetchall()
+            self.assertEqual(totals, [('hello', 2, 1), ('world', 1, 1)])
+            self.assertEqual(conn.execute("SELECT e.id, t.original_text FROM entries e "
+                                          "JOIN texts t ON t.id = e.text_id").fetchall(),
+                             [('1000001', 'hello hello world')])
+        finally:
+            conn.close()
+
+    def test_migrate_seeds_stopwords_and_entry_word_counts(self):
+        conn = sqlite3.connect(self.database_name)
+        conn.execute("CREATE TABLE entries (id TEXT PRIMARY KEY, source TEXT, original_text TEXT)")
+        conn.execute("CREATE TABLE word_frequencies (id TEXT, word TEXT, frequency INTEGER)")
+        conn.executemany("INSERT INTO entries VALUES (?, ?, ?)",
+                         [('1000001', 'source', 'the cat and the hat'), ('1000002', 'source', '')])
+        conn.executemany("INSERT INTO word_frequencies VALUES (?, ?, ?)",
+                         [('1000001', 'the', 2), ('1000001', 'cat', 1), ('1000001', 'hat', 1)])
+        conn.commit()
+        conn.close()
+
+        conn = DatabaseClient(self.database_name).create_database()
+        try:
+            stopwords = {row[0] for row in conn.execute("SELECT word FROM stopwords WHERE version = 1")}
+            self.assertEqual(stopwords, set(COMMON_WORDS))
+            self.assertEqual(conn.execute("SELECT * FROM entry_word_counts ORDER BY entry_id").fetchall(),
+                             [('1000001', 2, 2, 1), ('1000002', 0, 0, 1)])
+            self.assertEqual(conn.execute("SELECT value FROM corpus_totals WHERE name = 'entries'").fetchone(), (2,))
+        finally:
+            conn.close()
+
+
+    def test_migrate_deduplicates_texts(self):
+        conn = sqlite3.connect(self.database_name)
+        conn.execute("CREATE TABLE entries (id TEXT PRIMARY KEY, source TEXT, original_text TEXT)")
+        conn.executemany("INSERT INTO entries VALUES (?, ?, ?)",
+                         [('1000001', 'a', 'Buy now!'), ('1000002', 'b', ' Buy\nnow! '), ('1000003', 'a', 'Other')])
+        conn.commit()
+        conn.close()
+
+        conn = DatabaseClient(self.database_name).create_database()
+        try:
+            self.assertEqual(conn.execute("SELECT id, original_text FROM texts ORDER BY id").fetchall(),
+                             [(1, 'Buy now!'), (2, 'Other')])
+            self.assertEqual(conn.execute("SELECT id, text_id FROM entries ORDER BY id").fetchall(),
+                             [('1000001', 1), ('1000002', 1), ('1000003', 2)])
+        finally:
+            conn.close()
+
+class TestDatabaseClientProfiles(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.database_name = os.path.join(self.folder, 'word_frequency.db')
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def test_unknown_profile(self):
+        with self.assertRaises(ValueError):
+            DatabaseClient(self.database_name, 'fastest')
+
+    def test_profile_settings_are_applied_and_read_back(self):
+        client = DatabaseClient(self.database_name, 'bulk-load')
+        conn = client.create_database()
+        try:
+            self.assertEqual(client.applied_settings, {
+                'page_size': 16384, 'journal_mode': 'wal', 'synchronous': 'normal', 'cache_size': -262144,
+                'mmap_size': 268435456, 'temp_store': 'memory'})
+            self.assertEqual(conn.execute("PRAGMA journal_mode").fetchone()[0], 'wal')
+        finally:
+            conn.close()
+
+    def test_page_size_of_an_existing_database_is_kept(self):
+        DatabaseClient(self.database_name, 'durable').create_database().close()
+
+        client = DatabaseClient(self.database_name, 'bulk-load')
+        client.create_database().close()
+
+        self.assertEqual(client.applied_settings['page_size'], 4096)
+
+    def test_read_only_connection_reads_next_to_a_writer(self):
+        writer = DatabaseClient(self.database_name).create_database()
+        reader = DatabaseClient(self.database_name, 'read-mostly').connect_read_only()
+        try:
+            writer.execute("INSERT INTO entries VALUES ('1000001', 'source', 1)")
+            writer.commit()
+            # The writer holds an open transaction while the reader reads the last committed state
+            writer.execute("INSERT INTO entries VALUES ('1000002', 'source', 2)")
+
+            self.assertEqual(reader.execute("SELECT id FROM entries").fetchall(), [('1000001',)])
+            with self.assertRaises(sqlite3.OperationalError):
+                reader.execute("DELETE FROM entries")
+        finally:
+            reader.close()
+            writer.close()
+
+    def test_read_only_connection_escapes_the_path(self):
+        database_name = os.path.join(self.folder, 'words ?#%41.db')
+        writer = DatabaseClient(database_name).create_database()
+        try:
+            writer.execute("INSERT INTO entries VALUES ('1000001', 'source', 1)")
+            writer.commit()
+            reader = DatabaseClient(database_name).connect_read_only()
+            try:
+                self.assertEqual(reader.execute("SELECT id FROM entries").fetchall(), [('1000001',)])
+            finally:
+                reader.close()
+        finally:
+            writer.close()
+        self.assertEqual(sorted(os.listdir(self.folder)), ['words ?#%41.db'])
+
+    def test_read_only_connection_requires_an_existing_database(self):
+        with self.assertRaises(sqlite3.Error):
+            DatabaseClient(self.database_name).connect_read_only()
+        self.assertFalse(os.path.exists(self.database_name))
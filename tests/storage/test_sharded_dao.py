@@ -0,0 +1,121 @@
+import unittest
+from collections import Counter
+from sqlite3 import Error as SQLiteError
+
+from app.storage.database_client import DatabaseClient, shard_index
+from app.storage.sharded_dao import ShardedTextProcessorDAO
+from app.storage.text_processor_dao import EntryRecord, FileCheckpoint
+
+
+class TestShardedTextProcessorDAO(unittest.TestCase):
+
+    def setUp(self):
+        self.connections = DatabaseClient(':memory:', check_same_thread=False).create_shards(3)
+        self.dao = ShardedTextProcessorDAO(self.connections, heavy_hitters=True)
+        # Word i occurs i times in entry i, plus once in every later entry: enough skew and ties
+        # for the top words of a shard to differ from the merged ones
+        self.records = [EntryRecord(f'entry{i}', 'source', f'text {i}',
+                                    Counter({f'word{j}': (i if j == i else 1) for j in range(1, i + 1)}))
+                        for i in range(1, 40)]
+
+    def tearDown(self):
+        self.dao.close()
+        for conn in self.connections:
+            conn.close()
+
+    def expected_totals(self):
+        totals = Counter()
+        for record in self.records:
+            totals.update(record.word_freq)
+        return totals
+
+    def test_entries_are_routed_by_hash(self):
+        self.dao.save_batch(self.records)
+
+        for index, conn in enumerate(self.connections):
+            entry_ids = {row[0] for row in conn.execute("SELECT id FROM entries")}
+            self.assertEqual(entry_ids, {record.entry_id for record in self.records
+                                         if shard_index(record.entry_id, 3) == index})
+        self.assertEqual(self.dao.get_entry_text('entry7'), 'text 7')
+        self.assertIsNone(self.dao.get_entry_text('missing'))
+
+    def test_top_words_match_a_single_database(self):
+        self.dao.save_entries(self.records, batch_size=7)
+        totals = self.expected_totals()
+
+        for limit in (1, 3, 10, 100):
+            with self.subTest(limit=limit):
+                expected = sorted(totals.items(), key=lambda item: (-item[1], item[0]))[:limit]
+                self.assertEqual(self.dao.get_top_words(limit), expected)
+        self.assertEqual(self.dao.get_top_words(0), [])
+
+    def test_point_lookups_are_summed(self):
+        self.dao.save_batch(self.records)
+
+        self.assertEqual(self.dao.get_word_count('word3'), self.expected_totals()['word3'])
+        self.assertEqual(self.dao.get_document_frequency('word3'), 37)
+        self.assertEqual(self.dao.get_entry_count(), len(self.records))
+        self.assertEqual(self.dao.get_word_count('missing'), 0)
+
+    def test_top_ngrams_are_merged(self):
+        self.dao.save_batch([EntryRecord(f'entry{i}', 'source', 'text', Counter({'a b': 1}),
+                                         Counter({'big cat': i, 'big dog': 2}))
+                             for i in range(1, 6)])
+
+        self.assertEqual(self.dao.get_top_ngrams(2), [('big cat', 15), ('big dog', 10)])
+        self.assertEqual(self.dao.get_ngram_count('big dog'), 10)
+
+    def test_checkpoint_is_recorded_after_every_shard_commits(self):
+        self.dao.start_file('hash', 'file.csv', 100)
+        self.dao.save_batch(self.records[:10], FileCheckpoint('hash', 40))
+        self.assertEqual(self.dao.get_file_manifest('hash').checkpoint_offset, 40)
+
+        failing = shard_index(self.records[10].entry_id, 3)
+        self.connections[failing].execute("CREATE TRIGGER fail BEFORE INSERT ON entries "
+                                          "BEGIN SELECT RAISE(ABORT, 'disk full'); END")
+        with self.assertRaises(SQLiteError):
+            self.dao.save_batch(self.records[10:], FileCheckpoint('hash', 100))
+
+        self.assertEqual(self.dao.get_file_manifest('hash').checkpoint_offset, 40)
+        # The other shards committed their part, to be replaced when the batch is saved again
+        for record in self.records[10:]:
+            self.assertEqual(self.dao.get_entry_text(record.entry_id) is not None,
+                             shard_index(record.entry_id, 3) != failing)
+
+        # Saving the batch again replaces the committed parts without counting them twice
+        self.connections[failing].execute("DROP TRIGGER fail")
+        self.dao.save_batch(self.records[10:], FileCheckpoint('hash', 100))
+        self.assertEqual(self.dao.get_file_manifest('hash').checkpoint_offset, 100)
+        self.assertEqual(self.dao.get_entry_count(), len(self.records))
+        self.assertEqual(self.dao.get_word_count('word20'), self.expected_totals()['word20'])
+        self.assertEqual(self.dao.get_heavy_hitters().estimate('word20'), self.expected_totals()['word20'])
+
+    def test_top_words_ties_with_an_unseen_word(self):
+        ids = [[entry_id for entry_id in map(str, range(100)) if shard_index(entry_id, 3) == index][:4]
+               for index in range(2)]
+        # Shard 0 lists 'pp' and 'qq' first, shard 1 'pp' and 'ss', both hiding 'ab' which ties with 'qq'
+        for entry_id, word, count in [(ids[0][0], 'qq', 1), (ids[0][1], 'pp', 5), (ids[0][2], 'ab', 1),
+                                      (ids[1][0], 'ss', 1), (ids[1][1], 'qq', 1), (ids[1][2], 'pp', 5),
+                                      (ids[1][3], 'ab', 1)]:
+            self.dao.save_batch([EntryRecord(entry_id, 'source', word, Counter({word: count}))])
+
+        self.assertEqual(self.dao.get_top_words(2), [('pp', 10), ('ab', 2)])
+
+    def test_stopwords_and_heavy_hitters_span_every_shard(self):
+        self.dao.save_batch(self.records)
+
+        self.dao.add_stopwords_version(['word1'])
+
+        self.assertEqual(self.dao.get_stopwords().words, frozenset({'word1'}))
+        self.assertEqual(self.dao.get_word_count('word1'), 0)
+        self.assertNotIn('word1', [word for word, _ in self.dao.get_top_words(5)])
+        self.assertEqual(self.dao.rebuild_filtered_aggregates(), len(self.records))
+        self.assertEqual(self.dao.get_heavy_hitters().estimate('word2'), self.expected_totals()['word2'])
+
+    def test_requires_a_shard(self):
+        with self.assertRaises(ValueError):
+            ShardedTextProcessorDAO([])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,24 @@
+import unittest
+
+from app.storage.text_codec import compress_text, decompress_text
+
+
+class TestTextCodec(unittest.TestCase):
+
+    def test_round_trip(self):
+        text = "héllo wörld 😀 " * 100
+
+        compressed = compress_text(text)
+
+        self.assertIsInstance(compressed, bytes)
+        self.assertLess(len(compressed), len(text.encode('utf-8')))
+        self.assertEqual(decompress_text(compressed), text)
+
+    def test_short_texts_are_kept_as_text(self):
+        self.assertEqual(compress_text("hi"), "hi")
+        self.assertEqual(decompress_text("hi"), "hi")
+        self.assertIsNone(decompress_text(None))
+
+
+if __name__ == '__main__':
+    unittest.main()
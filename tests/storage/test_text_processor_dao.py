@@ -2,7 +2,9 @@ import unittest
 from unittest.mock import Mock, patch
 from collections import Counter
 from sqlite3 import Error as SQLiteError
-from app.storage.text_processor_dao import TextProcessorDAO
+from app.sketch.sketches import HeavyHitter, HeavyHitters
+from app.storage.database_client import DatabaseClient
+from app.storage.text_processor_dao import EntryRecord, FileCheckpoint, ManifestEntry, StopwordSet, TextProcessorDAO
 
 
 class TestTextProcessorDAO(unittest.TestCase):
@@ -17,18 +19,19 @@ class TestTextProcessorDAO(unittest.TestCase):
         entry_id = "test_id"
         source = "test_source"
         text = "test text"
+        self.mock_cursor.fetchall.return_value = []
 
         self.dao.save_entry(entry_id, source, text)
 
-        self.mock_cursor.execute.assert_called_once_with(
-            "INSERT OR REPLACE INTO entries VALUES (?, ?, ?)",
-            (entry_id, source, text)
-        )
+        statements = [call.args[0] for call in self.mock_cursor.executemany.call_args_list]
+        self.assertIn("INSERT OR IGNORE INTO texts (content_hash, original_text) VALUES (?, ?)", statements)
+        self.assertIn("INSERT OR REPLACE INTO entries (id, source, text_id) "
+                      "SELECT ?, ?, id FROM texts WHERE content_hash = ?", statements)
         self.mock_connection.commit.assert_called_once()
         self.mock_cursor.close.assert_called_once()
 
     def test_save_entry_error(self):
-        self.mock_cursor.execute.side_effect = SQLiteError("Test error")
+        self.mock_cursor.executemany.side_effect = SQLiteError("Test error")
 
         with self.assertRaises(SQLiteError) as context:
             self.dao.save_entry("test_id", "test_source", "test text")
@@ -37,24 +40,6 @@ class TestTextProcessorDAO(unittest.TestCase):
         self.mock_connection.rollback.assert_called_once()
         self.mock_cursor.close.assert_called_once()
 
-    def test_save_words_frequency_success(self):
-        entry_id = "test_id"
-        word_freq = Counter({"word1": 2, "word2": 1})
-
-        self.dao.save_words_frequency(entry_id, word_freq)
-
-        self.assertEqual(self.mock_cursor.execute.call_count, 2)
-        self.mock_cursor.execute.assert_any_call(
-            "INSERT INTO word_frequencies VALUES (?, ?, ?)",
-            ("test_id", "word1", 2)
-        )
-        self.mock_cursor.execute.assert_any_call(
-            "INSERT INTO word_frequencies VALUES (?, ?, ?)",
-            ("test_id", "word2", 1)
-        )
-        self.mock_connection.commit.assert_called_once()
-        self.mock_cursor.close.assert_called_once()
-
     def test_save_words_frequency_error(self):
         self.mock_cursor.execute.side_effect = SQLiteError("Test error")
 
@@ -64,3 +49,334 @@ class TestTextProcessorDAO(unittest.TestCase):
         self.assertIn("Error saving word frequencies", str(context.exception))
         self.mock_connection.rollback.assert_called_once()
         self.mock_cursor.close.assert_called_once()
+
+    def test_save_batch_error(self):
+        self.mock_cursor.executemany.side_effect = SQLiteError("Test error")
+
+        with self.assertRaises(SQLiteError) as context:
+            self.dao.save_batch([EntryRecord("id1", "source1", "text", Counter({"text": 1}))])
+
+        self.assertIn("Error saving batch", str(context.exception))
+        self.mock_connection.rollback.assert_called_once()
+        self.mock_connection.commit.assert_not_called()
+
+    def test_save_entries_commits_once_per_batch(self):
+        self.mock_cursor.fetchall.return_value = [("text", 1)]
+        self.mock_cursor.fetchone.return_value = (1,)
+        records = (EntryRecord(str(i), "source", "text", Counter({"text": 1})) for i in range(5))
+
+        saved = self.dao.save_entries(records, batch_size=2)
+
+        self.assertEqual(saved, 5)
+        self.assertEqual(self.mock_connection.commit.call_count, 3)
+
+    def test_save_entries_rolls_back_only_failed_batch(self):
+        records = [EntryRecord(str(i), "source", "text", Counter({"text": 1})) for i in range(6)]
+        with patch.object(self.dao, 'save_batch', side_effect=[None, SQLiteError("Test error"), None]):
+            saved = self.dao.save_entries(records, batch_size=2)
+
+        self.assertEqual(saved, 4)
+
+    def test_save_entries_invalid_batch_size(self):
+        with self.assertRaises(ValueError):
+            self.dao.save_entries([], batch_size=0)
+
+
+class TestTextProcessorDAOWithDatabase(unittest.TestCase):
+
+    def setUp(self):
+        self.conn = DatabaseClient(':memory:').create_database()
+        self.dao = TextProcessorDAO(self.conn)
+
+    def tearDown(self):
+        self.conn.close()
+
+    def get_frequencies(self, entry_id):
+        return dict(self.conn.execute(
+            "SELECT w.word, f.frequency FROM word_frequencies f JOIN words w ON w.id = f.word_id "
+            "WHERE f.entry_id = ?", (entry_id,)))
+
+    def get_entries(self):
+        return self.conn.execute("SELECT e.id, e.source, t.original_text FROM entries e "
+                                 "JOIN texts t ON t.id = e.text_id ORDER BY e.id").fetchall()
+
+    def test_duplicated_texts_are_stored_once(self):
+        self.dao.save_batch([
+            EntryRecord("id1", "source1", "Buy now!", Counter({"buy": 1, "now": 1})),
+            EntryRecord("id2", "source2", "Buy\n  now!", Counter({"buy": 1, "now": 1})),
+        ])
+        self.dao.save_entry("id3", "source3", " Buy now! ")
+
+        self.assertEqual(self.conn.execute("SELECT COUNT(*) FROM texts").fetchone()[0], 1)
+        self.assertEqual(self.get_entries(), [("id1", "source1", "Buy now!"), ("id2", "source2", "Buy now!"),
+                                              ("id3", "source3", "Buy now!")])
+
+    def test_texts_no_longer_referenced_are_deleted(self):
+        self.dao.save_batch([EntryRecord("id1", "source", "shared", Counter()),
+                             EntryRecord("id2", "source", "shared", Counter()),
+                             EntryRecord("id3", "source", "own", Counter())])
+
+        self.dao.save_batch([EntryRecord("id1", "source", "new", Counter()),
+                             EntryRecord("id3", "source", "new", Counter())])
+        self.assertEqual(self.conn.execute("SELECT original_text FROM texts ORDER BY id").fetchall(),
+                         [("shared",), ("new",)])
+
+        self.dao.save_entry("id2", "source", "new")
+        self.assertEqual(self.conn.execute("SELECT original_text FROM texts").fetchall(), [("new",)])
+
+    def test_precomputed_digests_are_not_computed_again(self):
+        with patch('app.storage.text_processor_dao.text_digest') as text_digest:
+            self.dao.save_batch([EntryRecord("id1", "source", "Buy now!", Counter(), digest=b'digest')])
+
+        text_digest.assert_not_called()
+        self.assertEqual(self.conn.execute("SELECT content_hash FROM texts").fetchall(), [(b'digest',)])
+
+    def test_compressed_texts_are_read_back_transparently(self):
+        dao = TextProcessorDAO(self.conn, compress_texts=True)
+        long_text = "buy now " * 50
+        dao.save_batch([EntryRecord("id1", "source", long_text, Counter({"buy": 50, "now": 50})),
+                        EntryRecord("id2", "source", "short", Counter({"short": 1}))])
+
+        self.assertEqual(self.conn.execute("SELECT typeof(original_text) FROM texts ORDER BY id").fetchall(),
+                         [("blob",), ("text",)])
+        self.assertEqual(dao.get_entry_text("id1"), long_text)
+        self.assertEqual(dao.get_entry_text("id2"), "short")
+        self.assertIsNone(dao.get_entry_text("missing"))
+        self.assertEqual(self.conn.execute("SELECT decompress_text(original_text) FROM texts ORDER BY id").fetchall(),
+                         [(long_text,), ("short",)])
+
+    def test_heavy_hitters_are_stored_with_each_batch(self):
+        dao = TextProcessorDAO(self.conn, heavy_hitters=True)
+        dao.save_batch([EntryRecord("id1", "source", "apple pear", Counter({"apple": 2, "pear": 1})),
+                        EntryRecord("id2", "source", "apple", Counter({"apple": 1}))])
+        dao.save_words_frequency("id3", Counter({"plum": 1}))
+
+        # A new DAO reads back the committed sketches
+        heavy_hitters = TextProcessorDAO(self.conn).get_heavy_hitters()
+        self.assertEqual(heavy_hitters.top(2), [HeavyHitter("apple", 3, 3), HeavyHitter("pear", 1, 1)])
+        self.assertEqual(heavy_hitters.estimate("plum"), 1)
+        self.assertEqual(heavy_hitters.top_words.total, 5)
+
+        # A re-saved entry is not counted again
+        dao.save_batch([EntryRecord("id2", "source", "apple", Counter({"apple": 1}))])
+        dao.save_words_frequency("id1", Counter({"apple": 2, "pear": 1}))
+        dao.save_words_frequency("id3", Counter({"plum": 1}))
+        self.assertEqual(dao.get_heavy_hitters().estimate("apple"), 3)
+        self.assertEqual(dao.get_heavy_hitters().estimate("plum"), 1)
+        self.assertEqual(dao.get_heavy_hitters().top_words.total, 5)
+
+    def test_heavy_hitters_of_failed_batch_are_discarded(self):
+        dao = TextProcessorDAO(self.conn, heavy_hitters=True)
+        dao.save_batch([EntryRecord("id1", "source", "apple", Counter({"apple": 1}))])
+        self.conn.execute("CREATE TRIGGER fail BEFORE INSERT ON entries WHEN NEW.id = 'bad' "
+                          "BEGIN SELECT RAISE(ABORT, 'rejected'); END")
+
+        with self.assertRaises(SQLiteError):
+            dao.save_batch([EntryRecord("bad", "source", "apple", Counter({"apple": 5}))])
+
+        self.assertEqual(dao.get_heavy_hitters().top(), [HeavyHitter("apple", 1, 1)])
+
+    def test_heavy_hitters_are_not_stored_by_default(self):
+        self.dao.save_batch([EntryRecord("id1", "source", "apple", Counter({"apple": 1}))])
+
+        self.assertEqual(self.conn.execute("SELECT COUNT(*) FROM sketches").fetchone()[0], 0)
+
+    def test_merge_heavy_hitters(self):
+        other = HeavyHitters()
+        other.update_counts(Counter({"apple": 4}))
+        self.dao.merge_heavy_hitters(other)
+        self.dao.merge_heavy_hitters(other)
+
+        self.assertEqual(TextProcessorDAO(self.conn).get_heavy_hitters().top(), [HeavyHitter("apple", 8, 8)])
+
+    def test_save_words_frequency_success(self):
+        self.dao.save_words_frequency("test_id", Counter({"word1": 2, "word2": 1}))
+
+        self.assertEqual(self.get_frequencies("test_id"), {"word1": 2, "word2": 1})
+
+    def test_save_batch_success(self):
+        records = [
+            EntryRecord("id1", "source1", "text one", Counter({"text": 1, "one": 1})),
+            EntryRecord("id2", "source2", "text two", Counter({"text": 1, "two": 1})),
+        ]
+
+        self.dao.save_batch(records)
+
+        self.assertEqual(self.get_entries(), [("id1", "source1", "text one"), ("id2", "source2", "text two")])
+        self.assertEqual(self.get_frequencies("id1"), {"text": 1, "one": 1})
+        self.assertEqual(self.get_frequencies("id2"), {"text": 1, "two": 1})
+        # Each word is stored once in the vocabulary
+        self.assertEqual(self.conn.execute("SELECT COUNT(*) FROM words").fetchone()[0], 3)
+
+    def test_word_ids_are_reused_across_dao_instances(self):
+        self.dao.save_words_frequency("id1", Counter({"shared": 1}))
+        TextProcessorDAO(self.conn).save_words_frequency("id2", Counter({"shared": 3, "new": 1}))
+
+        self.assertEqual(self.conn.execute("SELECT COUNT(*) FROM words").fetchone()[0], 2)
+        self.assertEqual(self.get_frequencies("id2"), {"shared": 3, "new": 1})
+
+    def test_failed_batch_does_not_cache_word_ids(self):
+        self.conn.execute("CREATE TRIGGER fail_insert BEFORE INSERT ON word_frequencies WHEN NEW.frequency = 99 "
+                          "BEGIN SELECT RAISE(ABORT, 'Test error'); END")
+        with self.assertRaises(SQLiteError):
+            self.dao.save_batch([EntryRecord("id1", "source", "text", Counter({"ghost": 99}))])
+
+        self.dao.save_batch([EntryRecord("id2", "source", "text", Counter({"ghost": 2}))])
+
+        self.assertEqual(self.get_frequencies("id2"), {"ghost": 2})
+
+    def test_word_totals_are_maintained_incrementally(self):
+        self.dao.save_batch([
+            EntryRecord("id1", "source", "text", Counter({"apple": 3, "pear": 1})),
+            EntryRecord("id2", "source", "text", Counter({"apple": 1, "plum": 2})),
+        ])
+
+        self.assertEqual(self.dao.get_word_count("apple"), 4)
+        self.assertEqual(self.dao.get_document_frequency("apple"), 2)
+        self.assertEqual(self.dao.get_top_words(2), [("apple", 4), ("plum", 2)])
+        self.assertEqual(self.dao.get_word_count("unknown"), 0)
+        self.assertEqual(self.dao.get_document_frequency("unknown"), 0)
+
+    def test_reprocessed_entry_replaces_its_contribution(self):
+        self.dao.save_batch([EntryRecord("id1", "source", "text", Counter({"apple": 3, "pear": 1}))])
+        self.dao.save_words_frequency("id2", Counter({"apple": 1}))
+
+        self.dao.save_batch([EntryRecord("id1", "source", "text", Counter({"apple": 1, "plum": 5}))])
+
+        self.assertEqual(self.get_frequencies("id1"), {"apple": 1, "plum": 5})
+        self.assertEqual(self.dao.get_word_count("apple"), 2)
+        self.assertEqual(self.dao.get_document_frequency("apple"), 2)
+        self.assertEqual(self.dao.get_word_count("pear"), 0)
+        self.assertEqual(self.dao.get_top_words(10), [("plum", 5), ("apple", 2)])
+        # Only 'id1' has an entry row, saved twice
+        self.assertEqual(self.dao.get_entry_count(), 1)
+
+    def test_repeated_entry_in_batch_keeps_last_occurrence(self):
+        self.dao.save_batch([
+            EntryRecord("id1", "source", "first", Counter({"apple": 3})),
+            EntryRecord("id2", "source", "other", Counter({"pear": 1})),
+            EntryRecord("id1", "source", "second", Counter({"apple": 1})),
+        ])
+
+        self.assertEqual(self.get_frequencies("id1"), {"apple": 1})
+        self.assertEqual(self.dao.get_word_count("apple"), 1)
+        self.assertEqual(self.dao.get_document_frequency("apple"), 1)
+        self.assertEqual(self.dao.get_entry_count(), 2)
+        # The text of the first occurrence is never stored
+        self.assertEqual(self.conn.execute("SELECT original_text FROM texts ORDER BY original_text").fetchall(),
+                         [("other",), ("second",)])
+
+    def get_ngram_totals(self):
+        return dict(self.conn.execute("SELECT g.ngram, t.total_count FROM ngram_totals t "
+                                      "JOIN ngrams g ON g.id = t.ngram_id"))
+
+    def test_ngram_frequencies_are_saved_with_the_batch(self):
+        self.dao.save_batch([
+            EntryRecord("id1", "source", "new york new york", Counter({"new": 2, "york": 2}),
+                        Counter({"new york": 2, "york new": 1, "new york new": 1})),
+            EntryRecord("id2", "source", "new york city", Counter({"new": 1, "york": 1, "city": 1}),
+                        Counter({"new york": 1, "york city": 1, "new york city": 1})),
+            EntryRecord("id3", "source", "city", Counter({"city": 1})),
+        ])
+
+        self.assertEqual(self.dao.get_top_ngrams(2), [("new york", 3), ("york new", 1)])
+        self.assertEqual(self.dao.get_top_ngrams(1, n=3), [("new york new", 1)])
+        self.assertEqual(self.conn.execute("SELECT document_count FROM ngram_totals t JOIN ngrams g "
+                                           "ON g.id = t.ngram_id WHERE g.ngram = 'new york'").fetchone(), (2,))
+
+        # A re-saved entry replaces its n-grams
+        self.dao.save_batch([EntryRecord("id1", "source", "york city", Counter({"york": 1, "city": 1}),
+                                         Counter({"york city": 1}))])
+        self.assertEqual(self.get_ngram_totals(), {"new york": 1, "york new": 0, "new york new": 0,
+                                                   "york city": 2, "new york city": 1})
+
+    def test_ngrams_containing_an_active_stopword_are_excluded(self):
+        self.dao.save_batch([
+            EntryRecord("id1", "source", "new york city", Counter({"new": 1, "york": 1, "city": 1}),
+                        Counter({"new york": 1, "york city": 1, "new york city": 1})),
+            EntryRecord("id2", "source", "york city", Counter({"york": 1, "city": 1}), Counter({"york city": 1})),
+        ])
+        self.dao.add_stopwords_version(self.dao.get_stopwords().words | {"new"})
+
+        self.assertEqual(self.dao.get_top_ngrams(5), [("york city", 2)])
+        self.assertEqual(self.dao.get_ngram_count("new york"), 0)
+        self.assertEqual(self.dao.get_ngram_count("york city"), 2)
+
+    def test_ngrams_are_pruned_periodically(self):
+        dao = TextProcessorDAO(self.conn, ngram_min_count=2, ngram_prune_interval=2)
+
+        def save(entry_id, *ngrams):
+            dao.save_batch([EntryRecord(entry_id, "source", "text", Counter(), Counter(ngrams))])
+
+        save("id1", "rare one", "common phrase")
+        save("id2", "common phrase", "late one")
+        # The first pruning only drops the n-grams older than the DAO: the rare ones get another interval
+        self.assertEqual(set(self.get_ngram_totals()), {"rare one", "common phrase", "late one"})
+
+        save("id3", "newest one")
+        save("id4", "common phrase")
+        self.assertEqual(self.get_ngram_totals(), {"common phrase": 3, "newest one": 1})
+        self.assertEqual(self.conn.execute("SELECT COUNT(*) FROM ngram_frequencies").fetchone()[0], 4)
+
+        # A pruned n-gram starts over
+        save("id5", "rare one")
+        self.assertEqual(self.get_ngram_totals()["rare one"], 1)
+
+    def test_ngram_vocabulary_is_capped(self):
+        dao = TextProcessorDAO(self.conn, ngram_min_count=1, ngram_max_vocabulary=2, ngram_prune_interval=1)
+        dao.save_batch([EntryRecord("id1", "source", "text", Counter(),
+                                    Counter({"first one": 3, "second one": 2, "third one": 1}))])
+
+        self.assertEqual(self.get_ngram_totals(), {"first one": 3, "second one": 2})
+        self.assertEqual(self.conn.execute("SELECT COUNT(*) FROM ngrams").fetchone()[0], 2)
+        with self.assertRaises(ValueError):
+            TextProcessorDAO(self.conn, ngram_prune_interval=0)
+
+    def get_entry_word_counts(self):
+        return self.conn.execute("SELECT * FROM entry_word_counts ORDER BY entry_id").fetchall()
+
+    def test_raw_counts_are_filtered_at_query_time(self):
+        self.dao.save_batch([EntryRecord("id1", "source", "the apple", Counter({"the": 3, "apple": 1}))])
+
+        self.assertEqual(self.get_frequencies("id1"), {"the": 3, "apple": 1})
+        self.assertEqual(self.dao.get_top_words(10), [("apple", 1)])
+        self.assertEqual(self.dao.get_word_count("the"), 0)
+        self.assertEqual(self.get_entry_word_counts(), [("id1", 1, 1, 1)])
+
+    def test_new_stopwords_version_and_rebuild(self):
+        self.dao.save_batch([EntryRecord(f"id{i}", "source", "text", Counter({"the": 2, "apple": 1, "pear": i}))
+                             for i in range(1, 6)])
+
+        version = self.dao.add_stopwords_version(["Apple", "the"])
+
+        self.assertEqual(self.dao.get_stopwords(), StopwordSet(version, frozenset({"apple", "the"})))
+        self.assertEqual(self.dao.get_top_words(10), [("pear", 15)])
+        self.assertEqual(self.dao.get_word_count("apple"), 0)
+        self.assertEqual(self.dao.rebuild_filtered_aggregates(chunk_size=2), 5)
+        self.assertEqual(self.get_entry_word_counts(), [(f"id{i}", i, 1, version) for i in range(1, 6)])
+        self.assertEqual(self.dao.rebuild_filtered_aggregates(), 0)
+        with self.assertRaises(ValueError):
+            self.dao.rebuild_filtered_aggregates(chunk_size=0)
+
+    def test_file_manifest_checkpoints(self):
+        self.assertIsNone(self.dao.get_file_manifest("hash"))
+
+        self.dao.start_file("hash", "input.csv", 100)
+        self.dao.save_batch([EntryRecord("id1", "source", "text", Counter({"text": 1}))], FileCheckpoint("hash", 40))
+        self.assertEqual(self.dao.get_file_manifest("hash"), ManifestEntry("hash", "input.csv", 100, 40, False))
+        self.assertEqual(self.dao.count_completed_files(), 0)
+
+        self.dao.complete_file("hash")
+        self.assertEqual(self.dao.get_file_manifest("hash"), ManifestEntry("hash", "input.csv", 100, 100, True))
+        self.assertEqual(self.dao.count_completed_files(), 1)
+
+    def test_failed_batch_does_not_advance_checkpoint(self):
+        self.dao.start_file("hash", "input.csv", 100)
+        self.conn.execute("CREATE TRIGGER fail_insert BEFORE INSERT ON word_frequencies WHEN NEW.frequency = 99 "
+                          "BEGIN SELECT RAISE(ABORT, 'Test error'); END")
+
+        with self.assertRaises(SQLiteError):
+            self.dao.save_batch([EntryRecord("id1", "source", "text", Counter({"text": 99}))],
+                                FileCheckpoint("hash", 40))
+
+        self.assertEqual(self.dao.get_file_manifest("hash").checkpoint_offset, 0)
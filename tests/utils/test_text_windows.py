@@ -0,0 +1,55 @@
+import random
+import unittest
+
+from app.utils.text_hash import text_digest
+from app.utils.text_windows import text_windows
+
+
+class TestTextWindows(unittest.TestCase):
+
+    def test_windows_end_after_whitespace(self):
+        text = "one two  three\nfour five"
+
+        windows = list(text_windows(text, 6))
+
+        self.assertEqual(windows, ["one ", "two  ", "three\n", "four ", "five"])
+
+    def test_runs_longer_than_a_window_are_kept_whole(self):
+        self.assertEqual(list(text_windows("a verylongword b", 3)), ["a ", "verylongword ", "b"])
+        self.assertEqual(list(text_windows("verylongword", 3)), ["verylongword"])
+
+    def test_short_text_is_not_copied(self):
+        text = "short text"
+        self.assertIs(next(text_windows(text, 100)), text)
+        self.assertEqual(list(text_windows("", 5)), [])
+
+    def test_random_texts(self):
+        rng = random.Random(5)
+        for _ in range(300):
+            text = ''.join(rng.choice("ab \n\t　.") for _ in range(rng.randint(0, 80)))
+            window_size = rng.randint(1, 10)
+            windows = list(text_windows(text, window_size))
+            self.assertEqual(''.join(windows), text)
+            for window in windows[:-1]:
+                self.assertTrue(window[-1].isspace(), repr(windows))
+
+    def test_invalid_window_size(self):
+        with self.assertRaises(ValueError):
+            list(text_windows("text", 0))
+
+
+class TestTextDigest(unittest.TestCase):
+
+    def test_windowed_digest_matches_whole_text(self):
+        rng = random.Random(9)
+        for _ in range(200):
+            text = ''.join(rng.choice("ab \n\t") for _ in range(rng.randint(0, 60)))
+            self.assertEqual(text_digest(text, rng.randint(1, 8)), text_digest(text, 1000), repr(text))
+
+    def test_whitespace_insensitive(self):
+        self.assertEqual(text_digest("  hello \n world "), text_digest("hello world"))
+        self.assertNotEqual(text_digest("hello world"), text_digest("helloworld"))
+
+
+if __name__ == '__main__':
+    unittest.main()
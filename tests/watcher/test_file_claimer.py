@@ -0,0 +1,151 @@
+import multiprocessing
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from unittest.mock import patch
+
+from app.metrics.metrics import Metrics
+from app.watcher.file_claimer import CLAIMS_FOLDER, HEARTBEAT_FILE, FileClaimer
+
+
+def drain_folder(folder, done_folder, worker_id):
+    """Claim files until none is left, moving each one to `done_folder`, as separate instances would."""
+    processed = []
+    with FileClaimer(folder, worker_id, lease_seconds=30, heartbeat_interval=0.05) as claimer:
+        while True:
+            reclaimed = claimer.reclaim_expired()
+            names = sorted(name for name in os.listdir(folder) if name.endswith('.csv'))
+            claimed = list(claimer.claim_files(os.path.join(folder, name) for name in names))
+            for claimed_path in claimed:
+                processed.append(os.path.basename(claimed_path))
+                shutil.move(claimed_path, os.path.join(done_folder, os.path.basename(claimed_path)))
+            if not claimed and not reclaimed:
+                return processed
+
+
+class TestFileClaimer(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.done_folder = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+        shutil.rmtree(self.done_folder)
+
+    def create_files(self, folder, count):
+        os.makedirs(folder, exist_ok=True)
+        for index in range(count):
+            with open(os.path.join(folder, f'input{index:03}.csv'), 'w') as file:
+                file.write(f'{1000000 + index}, "source", "text"\n')
+
+    def expire(self, worker_id):
+        heartbeat_path = os.path.join(self.folder, CLAIMS_FOLDER, worker_id, HEARTBEAT_FILE)
+        old = time.time() - 3600
+        os.utime(heartbeat_path, (old, old))
+
+    def test_a_file_is_claimed_once(self):
+        self.create_files(self.folder, 1)
+        file_path = os.path.join(self.folder, 'input000.csv')
+        with FileClaimer(self.folder, 'first') as first, FileClaimer(self.folder, 'second') as second:
+            claimed_path = first.claim(file_path)
+
+            self.assertEqual(claimed_path, os.path.join(self.folder, CLAIMS_FOLDER, 'first', 'input000.csv'))
+            self.assertIsNone(second.claim(file_path))
+            self.assertEqual(first.claimed_files(), [claimed_path])
+            self.assertEqual(second.claimed_files(), [])
+
+    def test_stop_releases_the_files_left_claimed(self):
+        self.create_files(self.folder, 3)
+        with FileClaimer(self.folder, 'worker') as claimer:
+            files = claimer.claim_files(os.path.join(self.folder, f'input{index:03}.csv') for index in range(3))
+            shutil.move(next(files), self.done_folder)
+            next(files)
+
+        self.assertEqual(sorted(os.listdir(self.folder)), [CLAIMS_FOLDER, 'input001.csv', 'input002.csv'])
+        self.assertEqual(os.listdir(os.path.join(self.folder, CLAIMS_FOLDER)), [])
+
+    def test_restarted_instance_resumes_its_claims(self):
+        self.create_files(self.folder, 3)
+        os.makedirs(os.path.join(self.folder, CLAIMS_FOLDER, 'worker'))
+        os.rename(os.path.join(self.folder, 'input002.csv'),
+                  os.path.join(self.folder, CLAIMS_FOLDER, 'worker', 'input002.csv'))
+
+        with FileClaimer(self.folder, 'worker') as claimer:
+            claimed = [os.path.basename(path) for path in claimer.claim_files(
+                os.path.join(self.folder, name) for name in ['input000.csv', 'input001.csv'])]
+
+        self.assertEqual(claimed, ['input002.csv', 'input000.csv', 'input001.csv'])
+
+    def test_expired_lease_is_reclaimed(self):
+        self.create_files(self.folder, 2)
+        with FileClaimer(self.folder, 'dead', lease_seconds=5, heartbeat_interval=1) as dead, \
+                FileClaimer(self.folder, 'alive', lease_seconds=5, heartbeat_interval=1) as alive:
+            list(dead.claim_files(os.path.join(self.folder, name) for name in ['input000.csv', 'input001.csv']))
+            self.assertEqual(alive.reclaim_expired(), 0)
+
+            self.expire('dead')
+
+            self.assertEqual(alive.reclaim_expired(), 2)
+            self.assertEqual(dead.claimed_files(), [])
+            self.assertTrue(os.path.exists(os.path.join(self.folder, 'input001.csv')))
+            self.assertEqual(os.listdir(os.path.join(self.folder, CLAIMS_FOLDER)), ['alive'])
+
+    def test_release_never_replaces_a_new_file(self):
+        self.create_files(self.folder, 2)
+        metrics = Metrics(enabled=True)
+        with FileClaimer(self.folder, 'worker', metrics=metrics) as claimer:
+            claimed = list(claimer.claim_files(os.path.join(self.folder, name)
+                                               for name in ['input000.csv', 'input001.csv']))
+            # A producer writes a new file under the name of a claimed one
+            with open(os.path.join(self.folder, 'input000.csv'), 'w') as file:
+                file.write('new')
+
+            self.assertFalse(claimer.release(claimed[0]))
+            with patch('os.link', side_effect=PermissionError('no hard links')):
+                self.assertFalse(claimer.release(claimed[0]))
+                self.assertTrue(claimer.release(claimed[1]))
+            self.assertTrue(os.path.exists(claimed[0]))
+            with open(os.path.join(self.folder, 'input000.csv')) as file:
+                self.assertEqual(file.read(), 'new')
+            self.assertEqual(claimer.claimed_files(), [claimed[0]])
+            os.remove(claimed[0])
+
+        self.assertEqual(metrics.counters, {'claims_not_released': 2, 'claims_released': 1})
+
+    def test_heartbeat_renews_the_lease(self):
+        with FileClaimer(self.folder, 'worker', lease_seconds=5, heartbeat_interval=0.05):
+            self.expire('worker')
+            time.sleep(0.3)
+            heartbeat_path = os.path.join(self.folder, CLAIMS_FOLDER, 'worker', HEARTBEAT_FILE)
+            self.assertLess(time.time() - os.stat(heartbeat_path).st_mtime, 5)
+
+    def test_invalid_heartbeat_interval(self):
+        with self.assertRaises(ValueError):
+            FileClaimer(self.folder, lease_seconds=5, heartbeat_interval=5)
+
+    def test_processes_share_the_files_and_the_ones_of_a_crashed_instance(self):
+        self.create_files(self.folder, 60)
+        # An instance that crashed holding a few files
+        crashed_folder = os.path.join(self.folder, CLAIMS_FOLDER, 'crashed')
+        os.makedirs(crashed_folder)
+        for name in ['input000.csv', 'input001.csv', 'input002.csv']:
+            os.rename(os.path.join(self.folder, name), os.path.join(crashed_folder, name))
+        open(os.path.join(crashed_folder, HEARTBEAT_FILE), 'w').close()
+        self.expire('crashed')
+
+        with multiprocessing.get_context('spawn').Pool(4) as pool:
+            results = pool.starmap(drain_folder, [(self.folder, self.done_folder, f'worker{index}')
+                                                  for index in range(4)])
+
+        processed = [name for result in results for name in result]
+        self.assertEqual(len(processed), 60)
+        self.assertEqual(sorted(processed), sorted(os.listdir(self.done_folder)))
+        self.assertEqual(os.listdir(self.folder), [CLAIMS_FOLDER])
+        self.assertEqual(os.listdir(os.path.join(self.folder, CLAIMS_FOLDER)), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,105 @@
+import os
+import shutil
+import sys
+import tempfile
+import time
+import unittest
+
+from app.watcher.folder_watcher import FolderWatcher
+
+
+class FolderWatcherTestMixin:
+    use_inotify = False
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.staging = tempfile.mkdtemp(dir=self.folder)
+        self.watcher = FolderWatcher(self.folder, lambda name: name.endswith('.csv'), settle_seconds=0.2,
+                                     poll_interval=0.05, use_inotify=self.use_inotify)
+
+    def tearDown(self):
+        self.watcher.close()
+        shutil.rmtree(self.folder)
+
+    def wait_ready(self, timeout=2.0):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            ready = self.watcher.wait_ready(0.05)
+            if ready:
+                return ready
+        return []
+
+    def test_file_is_ready_once_it_stops_growing(self):
+        file_path = os.path.join(self.folder, 'input.csv')
+        with open(file_path, 'w') as file:
+            file.write('1000001, "source", "partial')
+            file.flush()
+            self.assertEqual(self.watcher.wait_ready(0.1), [])
+            file.write(' text"\n')
+        started = time.monotonic()
+
+        self.assertEqual(self.wait_ready(), [file_path])
+        self.assertGreaterEqual(time.monotonic() - started, 0.15)
+
+    def test_renamed_file_is_ready(self):
+        staged = os.path.join(self.staging, 'input.csv')
+        with open(staged, 'w') as file:
+            file.write('1000001, "source", "text"\n')
+        file_path = os.path.join(self.folder, 'input.csv')
+        os.rename(staged, file_path)
+
+        self.assertEqual(self.wait_ready(), [file_path])
+
+    def test_ignores_rejected_files(self):
+        with open(os.path.join(self.folder, 'input.tmp'), 'w') as file:
+            file.write('partial')
+
+        self.assertEqual(self.wait_ready(0.5), [])
+
+    def test_done_file_is_not_reported_again_until_changed(self):
+        file_path = os.path.join(self.folder, 'input.csv')
+        with open(file_path, 'w') as file:
+            file.write('1000001, "source", "text"\n')
+        self.assertEqual(self.wait_ready(), [file_path])
+        self.watcher.mark_done(file_path)
+        self.watcher._last_scan = float('-inf')
+
+        self.assertEqual(self.wait_ready(0.5), [])
+
+        with open(file_path, 'a') as file:
+            file.write('1000002, "source", "more text"\n')
+        self.assertEqual(self.wait_ready(), [file_path])
+
+    def test_max_pending_defers_files_to_later_scans(self):
+        self.watcher.max_pending = 1
+        for name in ('a.csv', 'b.csv'):
+            with open(os.path.join(self.folder, name), 'w') as file:
+                file.write('1000001, "source", "text"\n')
+
+        first = self.wait_ready()
+        self.watcher.mark_done(first[0])
+        self.watcher._last_scan = float('-inf')
+        second = self.wait_ready()
+
+        self.assertEqual(len(first), 1)
+        self.assertEqual(len(second), 1)
+        self.assertNotEqual(first, second)
+
+
+class TestFolderWatcherPolling(FolderWatcherTestMixin, unittest.TestCase):
+    use_inotify = False
+
+    def test_uses_polling(self):
+        self.assertFalse(self.watcher.uses_inotify)
+
+
+@unittest.skipUnless(sys.platform.startswith('linux'), "inotify is only available on Linux")
+class TestFolderWatcherInotify(FolderWatcherTestMixin, unittest.TestCase):
+    use_inotify = True
+
+    def test_uses_inotify(self):
+        self.assertTrue(self.watcher.uses_inotify)
+
+
+if __name__ == '__main__':
+    unittest.main()